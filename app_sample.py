@@ -7,7 +7,6 @@ Licensed under the Apache License, Version 2.0
 See the file "LICENSE" for the full license governing this code.
 """
 import datetime
-import threading
 import uuid
 
 from msb_client.ComplexDataFormat import ComplexDataFormat
@@ -290,24 +289,8 @@ if __name__ == "__main__":
         ["EVENT1", "EVENT2"],
     )
 
-    # helper function which will repeat the passed function in the defined interval in seconds,
-    # this example doesn't check for race condition
-    def set_interval(func, sec):
-        def func_wrapper():
-            set_interval(func, sec)
-            func()
-
-        t = threading.Timer(sec, func_wrapper)
-        t.start()
-        return t
-
-    def send_data():
-        # myMsbClient.publish("EVENT1", "Hello World!")
-
-        # myMsbClient.publish('EVENT2', [1,2,4,5])
-
-        # myMsbClient.publish('DATEEVENT', datetime.datetime.now())
-
+    # supplier of the value of EVENT5, called by the scheduler of the client
+    def read_device():
         # pepare the complex ovbject based on a complex data format
         # use it as event value
         myModuleObj = {}
@@ -316,7 +299,7 @@ if __name__ == "__main__":
         myDeviceObj['deviceName'] = 'Device 1'
         myDeviceObj['deviceWeight'] = 1.3
         myDeviceObj['submodules'] = [myModuleObj]
-        myMsbClient.publish('EVENT5', myDeviceObj)
+        return myDeviceObj
 
     # print the generated self description for debug purposes. This function has to be called after all events,
     # functions and parameters have been added or else the output will be incomplete.
@@ -335,6 +318,7 @@ if __name__ == "__main__":
     # disconnect client from MSB
     # myMsbClient.disconnect()
 
-    # call send_data() function every 5 seconds
-    # be aware of racing conditions which might be created here
-    set_interval(send_data, 5)
+    # publish EVENT5 with the value of read_device() every 5 seconds
+    # (a run is skipped if read_device() of the previous run did not return yet)
+    myMsbClient.schedule('EVENT5', 5, read_device)
+    # myMsbClient.schedule('EVENT1', 1, lambda: "Hello World!")
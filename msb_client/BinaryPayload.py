@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import base64
+import binascii
+import threading
+import time
+
+from .ComplexDataFormat import ComplexDataFormat
+from .DataType import DataType
+
+# default size of the chunks of large blobs (before base64 encoding)
+CHUNK_SIZE = 256 * 1024
+
+BYTES_TYPES = (bytes, bytearray, memoryview)
+
+
+def isBytesLike(value):
+    """Checks if the value is bytes, a bytearray or a memoryview."""
+    return isinstance(value, BYTES_TYPES)
+
+
+def encodeBytes(value):
+    """Encodes bytes, a bytearray or a memoryview as json string (base64).
+
+    The data is encoded directly from the buffer without intermediate copies.
+
+    Args:
+        value (:obj:): The binary data
+    Returns:
+        str: The json string
+    """
+    return '"' + binascii.b2a_base64(value, newline=False).decode("ascii") + '"'
+
+
+def decodeBytes(value):
+    """Decodes a base64 string (e.g. the value of an incoming function call) to bytes.
+
+    Args:
+        value (str, bytes): The base64 encoded data
+    Returns:
+        bytes: The binary data
+    """
+    return base64.b64decode(value)
+
+
+def createChunkDataFormat(name):
+    """Creates the complex data format of the chunks of a blob.
+
+    Chunks have the index, the number of chunks and the (base64 encoded) data of the chunk.
+    The chunks of a blob are sent with the same correlation id.
+
+    Args:
+        name (str): The name of the data format
+    """
+    chunk = ComplexDataFormat(name)
+    chunk.addProperty("index", DataType.INT32, False)
+    chunk.addProperty("count", DataType.INT32, False)
+    chunk.addProperty("data", DataType.BYTE, False)
+    return chunk
+
+
+def splitChunks(blob, chunkSize=CHUNK_SIZE):
+    """Splits a blob into chunks without copying the data.
+
+    Args:
+        blob (:obj:): The binary data (bytes, bytearray or memoryview)
+        chunkSize (int): The max size of a chunk in bytes
+    Returns:
+        list: The chunks as memoryviews (at least one chunk, also for empty blobs)
+    """
+    if chunkSize <= 0:
+        raise Exception("Chunk size must be positive: " + str(chunkSize))
+    view = memoryview(blob).cast("B")
+    return [view[i:i + chunkSize] for i in range(0, max(len(view), 1), chunkSize)]
+
+
+def encodeChunk(index, count, chunk):
+    """Encodes a chunk as json object (see :func:`createChunkDataFormat`)."""
+    return '{"index":' + str(index) + ',"count":' + str(count) + ',"data":' + encodeBytes(chunk) + "}"
+
+
+class ChunkAssembler:
+    """Reassembles blobs from chunks received in any order, identified by their correlation id."""
+
+    def __init__(self, timeout=60.0):
+        """Initializes a new chunk assembler.
+
+        Args:
+            timeout (float): Incomplete blobs without new chunks are dismissed after this time in s
+        """
+        self.timeout = timeout
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def add(self, correlationId, chunk):
+        """Adds a chunk.
+
+        Args:
+            correlationId (str): The correlation id of the blob
+            chunk (dict): The chunk with index, count and (base64 encoded) data
+        Returns:
+            bytes: The blob if all chunks were received, otherwise None
+        """
+        index, count = int(chunk["index"]), int(chunk["count"])
+        if not 0 <= index < count:
+            raise Exception("Invalid chunk index " + str(index) + " of " + str(count))
+        data = chunk["data"]
+        if not isBytesLike(data):
+            data = decodeBytes(data)
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            chunks = self.pending.get(correlationId)
+            if chunks is None:
+                chunks = self.pending[correlationId] = [count, {}, now]
+            chunks[1][index] = data
+            chunks[2] = now
+            if len(chunks[1]) < chunks[0]:
+                return None
+            del self.pending[correlationId]
+        return b"".join(chunks[1][i] for i in range(chunks[0]))
+
+    def _expire(self, now):
+        for correlationId in [c for c, chunks in self.pending.items() if now - chunks[2] > self.timeout]:
+            del self.pending[correlationId]
+
+    def getPending(self):
+        """Get the number of received chunks per incomplete blob.
+
+        Returns:
+            dict: correlationId -> (received chunks, number of chunks)
+        """
+        with self.lock:
+            return {c: (len(chunks[1]), chunks[0]) for c, chunks in self.pending.items()}
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+
+Delta encoding of complex event values as json merge patches (RFC 7386): a patch contains the changed
+properties, nested objects recursively, arrays and simple values as a whole and null for removed properties.
+Changes a merge patch cannot express (properties set to null, objects replacing other values) are sent as
+full values (keyframes).
+"""
+
+import json
+import threading
+
+REF_PREFIX = "#/definitions/"
+
+
+def compileDiffPlan(dataFormat):
+    """Get the declared properties of the objects of a complex data format as nested plan of the diff.
+
+    Args:
+        dataFormat (dict): The (complex) data format of the event including all definitions
+    Returns:
+        dict: Per declared property of the root object the plan of the property value
+            (a dict for objects with declared properties, None for values compared as a whole)
+            or None if the root is not an object with declared properties
+    """
+    plans = {}
+
+    def plan(schema):
+        ref = schema.get("$ref")
+        if ref is not None:
+            name = ref[len(REF_PREFIX):] if ref.startswith(REF_PREFIX) else ref
+            if name not in plans:
+                # placeholder for recursive definitions, filled below
+                plans[name] = {}
+                properties = plan(dataFormat.get(name, {}))
+                if properties is None:
+                    plans[name] = None
+                else:
+                    plans[name].update(properties)
+            return plans[name]
+        if "properties" not in schema:
+            return None
+        return {name: plan(propertySchema) for name, propertySchema in schema["properties"].items()}
+
+    return plan(dataFormat["dataObject"])
+
+
+def diff(old, new, plan):
+    """Computes the merge patch from the old to the new value of an object.
+
+    The declared properties of the plan and the other properties are compared recursively, arrays and simple
+    values as a whole.
+
+    Args:
+        old (dict): The last value (json compatible)
+        new (dict): The new value (json compatible)
+        plan (dict): The plan of the object (see :func:`compileDiffPlan`)
+    Returns:
+        dict: The patch, empty if nothing changed, None if the change cannot be expressed as merge patch
+            (a property set to null or an object replacing another value), the full value has to be sent
+    """
+    patch = {}
+    seenNew = 0
+    seenOld = 0
+    for name, child in plan.items():
+        if name in new:
+            seenNew += 1
+            if name in old:
+                seenOld += 1
+                if not _diffProperty(patch, name, old[name], new[name], child):
+                    return None
+            elif not _setProperty(patch, name, new[name]):
+                return None
+        elif name in old:
+            seenOld += 1
+            patch[name] = None
+    if seenNew != len(new) or seenOld != len(old):
+        # properties not declared in the data format
+        for name, value in new.items():
+            if name in plan:
+                continue
+            if name in old:
+                if not _diffProperty(patch, name, old[name], value, None):
+                    return None
+            elif not _setProperty(patch, name, value):
+                return None
+        for name in old:
+            if name not in plan and name not in new:
+                patch[name] = None
+    return patch
+
+
+def _setProperty(patch, name, value):
+    # null removes a property and objects are merged into the last value, both cannot be set by a patch
+    if value is None or type(value) is dict:
+        return False
+    patch[name] = value
+    return True
+
+
+def _diffProperty(patch, name, last, value, plan):
+    if type(value) is dict and type(last) is dict:
+        changes = diff(last, value, plan or {})
+        if changes is None:
+            return False
+        if changes:
+            patch[name] = changes
+        return True
+    if value != last or type(value) is not type(last):
+        return _setProperty(patch, name, value)
+    return True
+
+
+def applyPatch(value, patch):
+    """Applies a merge patch to a value (RFC 7386), the value is not modified.
+
+    Args:
+        value (:obj:): The last value
+        patch (:obj:): The patch
+    Returns:
+        The patched value
+    """
+    if type(patch) is not dict:
+        return patch
+    result = dict(value) if type(value) is dict else {}
+    for name, change in patch.items():
+        if change is None:
+            result.pop(name, None)
+        else:
+            result[name] = applyPatch(result.get(name), change)
+    return result
+
+
+class DeltaEncoder:
+    """Encodes the values of a complex event as patches of the last value, with periodic full keyframes.
+
+    Every event carries a sequence number ("deltaSequence"), patches are marked with "delta": true.
+    """
+
+    def __init__(self, dataFormat, keyframeEvery=100):
+        """Initializes a new delta encoder.
+
+        Args:
+            dataFormat (dict): The (complex) data format of the event including all definitions
+            keyframeEvery (int): Every this number of events a full value is sent (1 sends only keyframes)
+        """
+        self.plan = compileDiffPlan(dataFormat)
+        if self.plan is None:
+            raise Exception("Delta encoding requires an object data format with declared properties")
+        self.keyframeEvery = keyframeEvery
+        self.last = None
+        self.sequence = 0
+        self.sinceKeyframe = 0
+        self.keyframes = 0
+        self.patches = 0
+        self.fullBytes = 0
+        self.sentBytes = 0
+        self.lock = threading.Lock()
+
+    def encode(self, rawDataObject):
+        """Encodes the next value.
+
+        Args:
+            rawDataObject (str): The json encoded full value
+        Returns:
+            tuple: The json encoded value or patch to send and the delta fields (sequence, isPatch) of the event
+        """
+        new = json.loads(rawDataObject)
+        with self.lock:
+            self.sequence += 1
+            last = self.last
+            self.last = new
+            self.fullBytes += len(rawDataObject)
+            changes = None
+            if (
+                last is not None
+                and type(new) is dict
+                and type(last) is dict
+                and self.sinceKeyframe + 1 < self.keyframeEvery
+            ):
+                changes = diff(last, new, self.plan)
+            if changes is None:
+                self.sinceKeyframe = 0
+                self.keyframes += 1
+                self.sentBytes += len(rawDataObject)
+                return rawDataObject, (self.sequence, False)
+            self.sinceKeyframe += 1
+            self.patches += 1
+            patch = json.dumps(changes, separators=(",", ":"))
+            self.sentBytes += len(patch)
+            return patch, (self.sequence, True)
+
+    def reset(self):
+        """Sends a keyframe next (e.g. after a connection loss, consumers may have missed patches)."""
+        with self.lock:
+            self.last = None
+
+    def getStats(self):
+        with self.lock:
+            return {
+                "keyframes": self.keyframes,
+                "patches": self.patches,
+                "fullBytes": self.fullBytes,
+                "sentBytes": self.sentBytes,
+                "ratio": self.sentBytes / self.fullBytes if self.fullBytes else None,
+            }
+
+
+class DeltaDecoder:
+    """Restores the full values of delta encoded events for consumers (per uuid and event id).
+
+    Patches are applied to the last value, redelivered duplicates are ignored.
+    After a missed event the values are unknown until the next keyframe.
+    Keyframes with a lower sequence (e.g. after a restart of the client) replace the last value.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.gaps = 0
+
+    def decode(self, event):
+        """Get the full value of a received event.
+
+        Args:
+            event (dict): The event (with uuid, eventId, dataObject and the delta fields)
+        Returns:
+            The full value or None if it is unknown (missed events, duplicate)
+        """
+        sequence = event.get("deltaSequence")
+        if sequence is None:
+            return event.get("dataObject")
+        key = (event.get("uuid"), event.get("eventId"))
+        last = self.values.get(key)
+        if not event.get("delta"):
+            if last is not None and sequence <= last[0] and event.get("redelivered"):
+                return None
+            value = event.get("dataObject")
+        else:
+            if last is None or sequence <= last[0]:
+                return None
+            if sequence != last[0] + 1 or last[1] is None:
+                # a patch was missed, wait for the next keyframe
+                if last[1] is not None:
+                    self.gaps += 1
+                self.values[key] = (sequence, None)
+                return None
+            value = applyPatch(last[1], event.get("dataObject"))
+        self.values[key] = (sequence, value)
+        return value
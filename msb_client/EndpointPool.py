@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import threading
+import time
+
+
+class Endpoint:
+    """Connection statistics of a single MSB websocket endpoint."""
+
+    def __init__(self, url):
+        """Initializes a new endpoint.
+
+        Args:
+            url (str): The url of the MSB (http(s)://host:port or ws(s)://host:port)
+        """
+        self.url = url
+        self.latency = None
+        self.connects = 0
+        self.failures = 0
+        self.consecutiveFailures = 0
+        self.lastFailure = None
+
+    def isHealthy(self, now, cooldown):
+        """Checks if the endpoint can be used for the next connection attempt.
+
+        An endpoint that failed is skipped for a cooldown which grows with the number of consecutive failures.
+
+        Args:
+            now (float): The current monotonic time in s
+            cooldown (float): The base cooldown in s after a failed connection attempt
+        """
+        if self.consecutiveFailures == 0:
+            return True
+        return now - self.lastFailure >= cooldown * min(self.consecutiveFailures, 6)
+
+    def getStats(self):
+        return {
+            "url": self.url,
+            "latency": self.latency,
+            "connects": self.connects,
+            "failures": self.failures,
+            "consecutiveFailures": self.consecutiveFailures,
+        }
+
+
+class EndpointPool:
+    """Manages a list of MSB endpoints and selects the fastest healthy one for (re)connects."""
+
+    def __init__(self, urls=None, cooldown=10, smoothing=0.3):
+        """Initializes a new endpoint pool.
+
+        Args:
+            urls (str, list): A single url, a comma separated list of urls or a list of urls
+            cooldown (float): The base time in s an endpoint is skipped after a failed connection attempt
+            smoothing (float): The weight of a new latency sample in the moving average (0..1)
+        """
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.endpoints = []
+        self.current = None
+        self.lock = threading.Lock()
+        self.setUrls(urls)
+
+    @staticmethod
+    def parseUrls(urls):
+        """Splits the url definition into a list of urls.
+
+        Args:
+            urls (str, list): A single url, a comma separated list of urls or a list of urls
+        Returns:
+            list: The list of (stripped) urls
+        """
+        if urls is None:
+            return []
+        if isinstance(urls, str):
+            urls = urls.split(",")
+        return [url.strip() for url in urls if url and url.strip()]
+
+    def setUrls(self, urls):
+        """Replaces the endpoints of the pool, statistics of already known urls are kept.
+
+        Args:
+            urls (str, list): A single url, a comma separated list of urls or a list of urls
+        """
+        with self.lock:
+            known = {endpoint.url: endpoint for endpoint in self.endpoints}
+            self.endpoints = [known.get(url, Endpoint(url)) for url in self.parseUrls(urls)]
+            if self.current not in self.endpoints:
+                self.current = None
+
+    def getUrls(self):
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def select(self):
+        """Selects the endpoint for the next connection attempt.
+
+        Healthy endpoints are preferred, among them the one with the lowest measured connect latency.
+        Healthy endpoints without measurement are only selected if no measured endpoint is healthy,
+        in their configured order.
+        If no endpoint is healthy, the one that failed first is retried.
+
+        Returns:
+            str: The url of the selected endpoint or None if the pool is empty
+        """
+        with self.lock:
+            if not self.endpoints:
+                return None
+            now = time.monotonic()
+            healthy = [e for e in self.endpoints if e.isHealthy(now, self.cooldown)]
+            if healthy:
+                self.current = min(
+                    healthy,
+                    key=lambda e: (e.latency is None, e.latency or 0, self.endpoints.index(e))
+                )
+            else:
+                self.current = min(self.endpoints, key=lambda e: e.lastFailure)
+            return self.current.url
+
+    def hasHealthyAlternative(self):
+        """Checks if there is another healthy endpoint than the current one to fail over to immediately."""
+        with self.lock:
+            now = time.monotonic()
+            return any(
+                e is not self.current and e.isHealthy(now, self.cooldown)
+                for e in self.endpoints
+            )
+
+    def reportSuccess(self, latency):
+        """Records a successful connection to the current endpoint.
+
+        Args:
+            latency (float): The time in s from the connection attempt until the socket was open
+        """
+        with self.lock:
+            endpoint = self.current
+            if endpoint is None:
+                return
+            endpoint.connects += 1
+            endpoint.consecutiveFailures = 0
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.smoothing * (latency - endpoint.latency)
+
+    def reportFailure(self):
+        """Records a failed connection attempt or a lost connection for the current endpoint."""
+        with self.lock:
+            endpoint = self.current
+            if endpoint is None:
+                return
+            endpoint.failures += 1
+            endpoint.consecutiveFailures += 1
+            endpoint.lastFailure = time.monotonic()
+
+    def getStats(self):
+        """Get the connection statistics of all endpoints.
+
+        Returns:
+            list: One dict per endpoint with url, latency (s), connects and failures
+        """
+        with self.lock:
+            return [endpoint.getStats() for endpoint in self.endpoints]
@@ -15,6 +15,7 @@ import datetime
 from .ComplexDataFormat import ComplexDataFormat
 from .DataFormat import DataFormat
 from .DataType import DataType, convertDataType
+from .RateLimiter import DROP, RateLimiter
 
 
 class Event:
@@ -28,6 +29,9 @@ class Event:
         event_dataFormat,
         priority=0,
         isArray=False,
+        rateLimit=None,
+        burst=None,
+        rateLimitAction=DROP,
     ):
         """Initializes a new event.
 
@@ -38,6 +42,9 @@ class Event:
             event_dataFormat (:obj:): The data type of the event (of class DataFormat, DataType or ComplexDataFormat)
             priority (str, int): The priority of the event (LOW,MEDIUM,HIGH) or (0,1,2)
             isArray (bool): Specifies if the event handles an object array or just an object of the data
+            rateLimit (float): The max number of published events per second (None for no limit)
+            burst (int): The max number of events published at once (see :class:`RateLimiter`)
+            rateLimitAction (str): The action for events exceeding the limit (drop, conflate, queue or raise)
         """
         self.eventId = eventId
         self.name = event_name
@@ -81,6 +88,18 @@ class Event:
             except Exception:
                 self.dataFormat = DataFormat(event_dataFormat, isArray).getDataFormat()
             self.df = event_dataFormat
+        if rateLimit is not None:
+            self.rateLimiter = RateLimiter(rateLimit, burst, rateLimitAction)
 
     id = 0
     dataObject = 0
+    # generated json encoder of complex data formats (see :func:`compileSerializer`)
+    serializer = None
+    # generated checks of complex data formats (see :func:`compileValidator`)
+    validator = None
+    # precomputed static part of the sent events (see :class:`EventEnvelope`)
+    envelope = None
+    # token bucket limiting the published events (see :class:`RateLimiter`)
+    rateLimiter = None
+    # delta encoding of complex values (see :class:`DeltaEncoder`)
+    deltaEncoder = None
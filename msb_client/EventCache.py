@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import array
+import collections
+import heapq
+import sys
+import threading
+import time
+import zlib
+
+from .Priority import getPriority
+
+# separator of the events in a compressed block, control characters are escaped in json
+SEPARATOR = "\x1e"
+
+# memory of an empty string, subtracted to get the memory of the characters
+_STR_OVERHEAD = sys.getsizeof("")
+
+
+def _size(msg):
+    return sys.getsizeof(msg)
+
+
+class _Block:
+    """Compressed events with their sequences and cache times (and the futures of tracked events).
+
+    Events dismissed from the front of a block are skipped without decompressing it, each of them releases
+    its share of the memory of the block (the block is freed with its last event).
+    """
+
+    __slots__ = ("data", "futures", "sequences", "times", "rawBytes", "bytes", "start")
+
+    def __init__(self, data, futures, sequences, times, rawBytes):
+        self.data = data
+        self.futures = futures
+        self.sequences = sequences
+        self.times = times
+        self.rawBytes = rawBytes
+        self.bytes = _size(data) + sequences.itemsize * len(sequences) + times.itemsize * len(times)
+        # number of events dismissed from the front
+        self.start = 0
+
+    def __len__(self):
+        return len(self.sequences) - self.start
+
+    def remainingFutures(self):
+        return self.futures[self.start:] if self.futures else [None] * len(self)
+
+
+class _Partition:
+    """The cached events of one event id and priority, in the order they were cached.
+
+    Entries are tuples of the serialized event, its future (or None), its sequence in the cache and its cache time.
+    """
+
+    __slots__ = ("eventId", "priority", "head", "blocks", "tail", "tailBytes", "count")
+
+    def __init__(self, eventId, priority):
+        self.eventId = eventId
+        self.priority = priority
+        # uncompressed entries before the blocks (requeued or taken from a block by the replay)
+        self.head = collections.deque()
+        self.blocks = collections.deque()
+        # uncompressed entries of the open block
+        self.tail = []
+        self.tailBytes = 0
+        self.count = 0
+
+    def firstSequence(self):
+        if self.head:
+            return self.head[0][2]
+        if self.blocks:
+            block = self.blocks[0]
+            return block.sequences[block.start]
+        return self.tail[0][2]
+
+    def firstTime(self):
+        if self.head:
+            return self.head[0][3]
+        if self.blocks:
+            block = self.blocks[0]
+            return block.times[block.start]
+        return self.tail[0][3]
+
+    def iterate(self, head, blocks, tail):
+        for entry in head:
+            yield entry[2], entry[0]
+        for block in blocks:
+            yield from zip(block.sequences[block.start:], _decompress(block)[block.start:])
+        for entry in tail:
+            yield entry[2], entry[0]
+
+
+def _decompress(block):
+    return zlib.decompress(block.data).decode("utf-8").split(SEPARATOR)
+
+
+class EventCache:
+    """FIFO of the events published while not connected, bounded by number of events and bytes.
+
+    The events are partitioned by event id and priority. New events of a partition are collected uncompressed
+    until they reach the block size, then they are compressed together into a block. The replay takes the
+    oldest event of all partitions and decompresses one block at a time.
+
+    Events older than the time to live of their event are dropped by the replay and by :func:`expire`.
+    If the cache or the quota of an event or priority is full, expired events are dismissed first,
+    then the oldest events of the lowest priority (of the event or priority exceeding its quota).
+
+    The cache can be read like a list of the serialized events.
+    """
+
+    def __init__(
+        self,
+        maxEvents=1000,
+        maxBytes=0,
+        compression=True,
+        blockSize=65536,
+        compressionLevel=6,
+        onDismiss=None,
+        clock=time.monotonic,
+    ):
+        """Initializes a new event cache.
+
+        Args:
+            maxEvents (int): The max number of events
+            maxBytes (int): The max memory in bytes used by the cached events (0 disables the limit)
+            compression (bool): Compress the events in blocks
+            blockSize (int): The size in bytes of the uncompressed events of a block (per partition)
+            compressionLevel (int): The zlib compression level (1 to 9)
+            onDismiss (:func:): Called with the futures of dismissed events (None for events without future)
+                and True if they expired or False if they were evicted, without holding the lock of the cache
+            clock (:func:): The clock of the cache times (seconds)
+        """
+        self.maxEvents = maxEvents
+        self.maxBytes = maxBytes
+        self.compression = compression
+        self.blockSize = blockSize
+        self.compressionLevel = compressionLevel
+        self.onDismiss = onDismiss
+        self.clock = clock
+        self.partitions = {}
+        # time to live in s per event id (None for all other events)
+        self.timesToLive = {}
+        # max number of events per event id and per priority
+        self.eventQuotas = {}
+        self.priorityQuotas = {}
+        self.eventCounts = collections.Counter()
+        self.priorityCounts = collections.Counter()
+        # sequences of events pushed to the front are negative
+        self.sequence = 0
+        self.frontSequence = 0
+        self.count = 0
+        # memory used by the events
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Iterates the serialized events, the blocks are decompressed one at a time."""
+        with self.lock:
+            iterators = [
+                partition.iterate(list(partition.head), list(partition.blocks), list(partition.tail))
+                for partition in self.partitions.values()
+            ]
+        for sequence, msg in heapq.merge(*iterators, key=lambda item: item[0]):
+            yield msg
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (list, EventCache)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def setTimeToLive(self, timeToLive, eventId=None):
+        """Sets the time to live of cached events.
+
+        Args:
+            timeToLive (float): The time in s (None removes it)
+            eventId (str): Set the time of this event, otherwise the time of all other events
+        """
+        with self.lock:
+            if timeToLive is None:
+                self.timesToLive.pop(eventId, None)
+            else:
+                self.timesToLive[eventId] = timeToLive
+
+    def setQuota(self, maxEvents, eventId=None, priority=None):
+        """Sets the max number of cached events of an event or of a priority.
+
+        Args:
+            maxEvents (int): The max number of events (None removes the quota)
+            eventId (str): Set the quota of this event
+            priority (str, int): Set the quota of this priority (LOW,MEDIUM,HIGH) or (0,1,2)
+        """
+        if (eventId is None) == (priority is None):
+            raise Exception("A quota is set either for an event or for a priority")
+        quotas, key = (self.eventQuotas, eventId) if eventId is not None else (
+            self.priorityQuotas, getPriority(priority))
+        with self.lock:
+            if maxEvents is None:
+                quotas.pop(key, None)
+            else:
+                quotas[key] = maxEvents
+
+    def append(self, msg, future=None, eventId=None, priority=0):
+        """Adds an event, expired and old events are dismissed if the cache or a quota is full.
+
+        Args:
+            msg (str): The serialized event
+            future (PublishFuture): The future of the event
+            eventId (str): The event id
+            priority (str, int): The priority of the event
+        """
+        dismissed = ([], [])
+        with self.lock:
+            partition = self._partition(eventId, priority)
+            self._add(partition, (msg, future, self.sequence, self.clock()))
+            self.sequence += 1
+            self._enforceLimits(partition, dismissed)
+        self._notify(dismissed)
+
+    def push(self, entries, front=False):
+        """Adds events without dismissing events (e.g. events put back after a connection loss).
+
+        Args:
+            entries (list): The serialized events with their futures, event ids, priorities and cache times
+                (None for the current time)
+            front (bool): Add the events before the cached events (otherwise after them)
+        """
+        with self.lock:
+            now = self.clock()
+            if front:
+                self.frontSequence -= len(entries)
+                sequence = self.frontSequence
+            else:
+                sequence = self.sequence
+                self.sequence += len(entries)
+            added = []
+            for msg, future, eventId, priority, cacheTime in entries:
+                partition = self._partition(eventId, priority)
+                entry = (msg, future, sequence, now if cacheTime is None else cacheTime)
+                sequence += 1
+                if front:
+                    added.append((partition, entry))
+                else:
+                    self._add(partition, entry)
+            # the pushed events are older than the cached events of their partitions
+            for partition, entry in reversed(added):
+                partition.head.appendleft(entry)
+                self._count(partition, 1, _size(entry[0]))
+
+    def _partition(self, eventId, priority):
+        priority = getPriority(priority)
+        partition = self.partitions.get((eventId, priority))
+        if partition is None:
+            partition = self.partitions[(eventId, priority)] = _Partition(eventId, priority)
+        return partition
+
+    def _count(self, partition, count, size):
+        partition.count += count
+        self.count += count
+        self.bytes += size
+        self.eventCounts[partition.eventId] += count
+        self.priorityCounts[partition.priority] += count
+        if not partition.count:
+            del self.partitions[(partition.eventId, partition.priority)]
+            if not self.eventCounts[partition.eventId]:
+                del self.eventCounts[partition.eventId]
+            if not self.priorityCounts[partition.priority]:
+                del self.priorityCounts[partition.priority]
+
+    def _add(self, partition, entry):
+        partition.tail.append(entry)
+        size = _size(entry[0])
+        partition.tailBytes += size - _STR_OVERHEAD
+        self._count(partition, 1, size)
+        if self.compression and partition.tailBytes >= self.blockSize:
+            self._seal(partition)
+
+    def _seal(self, partition):
+        tail = partition.tail
+        msgs = [entry[0] for entry in tail]
+        raw = SEPARATOR.join(msgs).encode("utf-8")
+        futures = [entry[1] for entry in tail]
+        block = _Block(
+            zlib.compress(raw, self.compressionLevel),
+            futures if any(future is not None for future in futures) else None,
+            array.array("q", [entry[2] for entry in tail]),
+            array.array("d", [entry[3] for entry in tail]),
+            len(raw),
+        )
+        self.bytes += block.bytes - sum(_size(msg) for msg in msgs)
+        partition.blocks.append(block)
+        partition.tail = []
+        partition.tailBytes = 0
+
+    def _first(self, partition):
+        """Get the oldest entry of a partition, a block is decompressed if needed."""
+        if not partition.head:
+            if partition.blocks:
+                block = partition.blocks.popleft()
+                start = block.start
+                msgs = _decompress(block)[start:]
+                partition.head.extend(zip(msgs, block.remainingFutures(), block.sequences[start:], block.times[start:]))
+                self.bytes += sum(_size(msg) for msg in msgs) - block.bytes
+            else:
+                partition.head.extend(partition.tail)
+                partition.tail = []
+                partition.tailBytes = 0
+        return partition.head[0]
+
+    def _popleft(self, partition):
+        entry = self._first(partition)
+        partition.head.popleft()
+        self._count(partition, -1, -_size(entry[0]))
+        return entry
+
+    def _dismissFirst(self, partition):
+        """Removes the oldest entry of a partition without decompressing its block.
+
+        Returns:
+            PublishFuture: The future of the entry (or None)
+        """
+        if partition.head or not partition.blocks:
+            return self._popleft(partition)[1]
+        block = partition.blocks[0]
+        future = block.futures[block.start] if block.futures else None
+        block.start += 1
+        # the share of the block's memory, the rest of it is released with the last event
+        size = block.bytes // (len(block) + 1) if block else block.bytes
+        block.bytes -= size
+        if not block:
+            partition.blocks.popleft()
+        self._count(partition, -1, -size)
+        return future
+
+    def _oldest(self, partitions):
+        return min(partitions, key=_Partition.firstSequence, default=None)
+
+    def _timeToLive(self, partition):
+        timeToLive = self.timesToLive.get(partition.eventId)
+        return self.timesToLive.get(None) if timeToLive is None else timeToLive
+
+    def _expirePartition(self, partition, now, futures):
+        """Removes the expired events from the front of a partition, whole blocks without decompressing."""
+        timeToLive = self._timeToLive(partition)
+        if timeToLive is None:
+            return
+        deadline = now - timeToLive
+        while partition.count:
+            if not partition.head and partition.blocks and partition.blocks[0].times[-1] <= deadline:
+                block = partition.blocks.popleft()
+                futures.extend(block.remainingFutures())
+                self._count(partition, -len(block), -block.bytes)
+            elif partition.firstTime() <= deadline:
+                futures.append(self._dismissFirst(partition))
+            else:
+                break
+
+    def _expireAll(self, futures):
+        if self.timesToLive:
+            now = self.clock()
+            for partition in list(self.partitions.values()):
+                self._expirePartition(partition, now, futures)
+        return futures
+
+    def _overflow(self, partition):
+        """Get the partitions to dismiss an event from (or None if no limit is exceeded)."""
+        quota = self.eventQuotas.get(partition.eventId)
+        if quota is not None and self.eventCounts[partition.eventId] > quota:
+            group = [p for p in self.partitions.values() if p.eventId == partition.eventId]
+            lowest = min(p.priority for p in group)
+            return [p for p in group if p.priority == lowest]
+        quota = self.priorityQuotas.get(partition.priority)
+        if quota is not None and self.priorityCounts[partition.priority] > quota:
+            return [p for p in self.partitions.values() if p.priority == partition.priority]
+        if self.count and (self.count > self.maxEvents or (self.maxBytes and self.bytes > self.maxBytes)):
+            lowest = min(self.priorityCounts)
+            return [p for p in self.partitions.values() if p.priority == lowest]
+        return None
+
+    def _enforceLimits(self, partition, dismissed):
+        evicted, expired = dismissed
+        checkedExpiry = False
+        while True:
+            group = self._overflow(partition)
+            if group is None:
+                break
+            if not checkedExpiry:
+                checkedExpiry = True
+                if self._expireAll(expired):
+                    continue
+            evicted.append(self._dismissFirst(self._oldest(group)))
+        self.evictions += len(evicted)
+        self.expirations += len(expired)
+
+    def _notify(self, dismissed):
+        evicted, expired = dismissed
+        if self.onDismiss is not None:
+            if evicted:
+                self.onDismiss(evicted, False)
+            if expired:
+                self.onDismiss(expired, True)
+
+    def peek(self):
+        """Get the oldest entry, expired events are dropped (a block is decompressed if needed).
+
+        Returns:
+            tuple: The serialized event, its future, sequence and cache time or None if the cache is empty
+        """
+        expired = []
+        with self.lock:
+            now = self.clock()
+            while True:
+                partition = self._oldest(self.partitions.values())
+                if partition is None:
+                    entry = None
+                    break
+                timeToLive = self._timeToLive(partition)
+                if timeToLive is not None and partition.firstTime() <= now - timeToLive:
+                    self._expirePartition(partition, now, expired)
+                    continue
+                entry = self._first(partition)
+                break
+            self.expirations += len(expired)
+        self._notify(([], expired))
+        return entry
+
+    def remove(self, entry):
+        """Removes the oldest entry after it was sent, unless it was dismissed meanwhile.
+
+        Args:
+            entry (tuple): The entry returned by :func:`peek`
+        """
+        with self.lock:
+            for partition in self.partitions.values():
+                if partition.head and partition.head[0] is entry:
+                    self._popleft(partition)
+                    return
+
+    def expire(self):
+        """Removes the expired events (called periodically)."""
+        with self.lock:
+            expired = self._expireAll([])
+            self.expirations += len(expired)
+        self._notify(([], expired))
+
+    def clear(self):
+        """Removes all events.
+
+        Returns:
+            list: The futures of the removed events
+        """
+        with self.lock:
+            futures = []
+            for partition in self.partitions.values():
+                futures.extend(entry[1] for entry in partition.head)
+                for block in partition.blocks:
+                    futures.extend(block.remainingFutures())
+                futures.extend(entry[1] for entry in partition.tail)
+            self.partitions.clear()
+            self.eventCounts.clear()
+            self.priorityCounts.clear()
+            self.count = 0
+            self.bytes = 0
+            return [future for future in futures if future is not None]
+
+    def getStats(self):
+        """Get the number of events, the memory they use and the compression ratio.
+
+        Returns:
+            dict: The number of events (in total, per event id and per priority) and blocks, the memory in bytes
+                (total and per event), the uncompressed size of the compressed events and the number of
+                dismissed events (evicted and expired)
+        """
+        with self.lock:
+            blocks = [block for partition in self.partitions.values() for block in partition.blocks]
+            compressedBytes = sum(len(block.data) for block in blocks)
+            rawBytes = sum(block.rawBytes for block in blocks)
+            return {
+                "events": self.count,
+                "eventsByEventId": dict(self.eventCounts),
+                "eventsByPriority": dict(self.priorityCounts),
+                "blocks": len(blocks),
+                "bytes": self.bytes,
+                "bytesPerEvent": self.bytes / self.count if self.count else None,
+                "compressionRatio": compressedBytes / rawBytes if rawBytes else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import json
+import time
+
+
+class TimestampFormatter:
+    """Formats the current time as date-time string (e.g. 2019-01-01T12:00:00.123Z).
+
+    The date and time up to the second is cached, so only the milliseconds are formatted per call.
+    """
+
+    def __init__(self):
+        self.cache = (None, None)
+
+    def now(self):
+        """Get the current time as date-time string with milliseconds.
+
+        Returns:
+            str: The current time in UTC
+        """
+        t = time.time()
+        second = int(t)
+        cachedSecond, prefix = self.cache
+        if second != cachedSecond:
+            prefix = time.strftime("%Y-%m-%dT%H:%M:%S.", time.gmtime(second))
+            self.cache = (second, prefix)
+        return prefix + "%03dZ" % int((t - second) * 1000)
+
+
+class EventEnvelope:
+    """The precomputed static part (uuid, eventId, priority) of the events sent for an event definition."""
+
+    __slots__ = ("uuid", "eventId", "priority", "prefix")
+
+    def __init__(self, uuid, eventId, priority):
+        """Initializes a new event envelope.
+
+        Args:
+            uuid (str): The uuid of the client
+            eventId (str): The event id
+            priority (str, int): The priority of the event
+        """
+        self.uuid = uuid
+        self.eventId = eventId
+        self.priority = priority
+        self.prefix = (
+            '{"uuid":' + json.dumps(uuid)
+            + ',"eventId":' + json.dumps(eventId)
+            + ',"priority":' + json.dumps(priority)
+            + ',"postDate":'
+        )
+
+    def matches(self, uuid, priority):
+        """Checks if the envelope is still valid for the uuid and priority."""
+        return self.uuid == uuid and self.priority == priority
+
+    def encode(self, postDate, dataObject=None, correlationId=None, sequence=None, delta=None, deliveryId=None):
+        """Encodes an event.
+
+        Args:
+            postDate (str): The json encoded post date
+            dataObject (str): The json encoded value (None to send the event without value)
+            correlationId (str): The correlation id of the event
+            sequence (tuple): The sequence index and count of a part of a split event
+            delta (tuple): The delta sequence and if the value is a patch of a delta encoded event
+            deliveryId (str): The unique id of the event for deduplication (letters and digits only)
+        Returns:
+            str: The event as json
+        """
+        msg = self.prefix + postDate
+        if correlationId is not None:
+            msg += ',"correlationId":' + json.dumps(correlationId)
+        if deliveryId is not None:
+            msg += ',"deliveryId":"' + deliveryId + '"'
+        if sequence is not None:
+            msg += ',"sequenceIndex":' + str(sequence[0]) + ',"sequenceCount":' + str(sequence[1])
+        if delta is not None:
+            msg += ',"deltaSequence":' + str(delta[0])
+            if delta[1]:
+                msg += ',"delta":true'
+        if dataObject is not None:
+            msg += ',"dataObject":' + dataObject
+        return msg + "}"
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import logging
+import threading
+import time
+
+# max length of payloads in log messages
+PREVIEW_LENGTH = 200
+
+
+class Preview:
+    """Lazy, truncated string representation of a (large) payload for log messages.
+
+    The payload is only converted when the log record is emitted.
+    """
+
+    __slots__ = ("value", "length")
+
+    def __init__(self, value, length=None):
+        """Initializes a new preview.
+
+        Args:
+            value (:obj:): The payload (e.g. the json message or the event value)
+            length (int): The max length of the preview (default: PREVIEW_LENGTH)
+        """
+        self.value = value
+        self.length = length
+
+    def __str__(self):
+        length = PREVIEW_LENGTH if self.length is None else self.length
+        value = self.value
+        if isinstance(value, (list, tuple)) and len(value) > length:
+            # avoid the conversion of huge arrays, which are truncated anyway
+            text = str(value[:length])[:-1] + ", ...]"
+            return text[:length] + "... (" + str(len(value)) + " items)"
+        text = value if isinstance(value, str) else str(value)
+        if len(text) <= length:
+            return text
+        return text[:length] + "... (" + str(len(text)) + " chars)"
+
+
+class RateLimitedLog:
+    """Limits repeated log messages (with the same message template) to a burst per interval.
+
+    Suppressed messages are counted and reported with the next logged message of the template.
+    """
+
+    def __init__(self, logger, burst=10, interval=10.0):
+        """Initializes a new rate limited log.
+
+        Args:
+            logger (:obj:logging.Logger): The logger
+            burst (int): The max number of messages per template and interval (0 disables the limit)
+            interval (float): The interval in s
+        """
+        self.logger = logger
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def log(self, level, msg, *args, **kwargs):
+        """Logs the message (lazy %-style arguments) unless the template exceeded its burst.
+
+        Args:
+            level (int): The log level
+            msg (str): The message template
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        if self.burst:
+            now = time.monotonic()
+            with self.lock:
+                window = self.windows.get(msg)
+                if window is None or now - window[0] >= self.interval:
+                    suppressed = window[2] if window is not None else 0
+                    window = self.windows[msg] = [now, 0, 0]
+                else:
+                    suppressed = 0
+                if window[1] >= self.burst:
+                    window[2] += 1
+                    return
+                window[1] += 1
+            if suppressed:
+                msg = msg + " (%d similar messages suppressed)"
+                args = args + (suppressed,)
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+    def exception(self, msg, *args, **kwargs):
+        kwargs.setdefault("exc_info", True)
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def reset(self):
+        """Forgets all suppressed messages."""
+        with self.lock:
+            self.windows = {}
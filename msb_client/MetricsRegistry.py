@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# default histogram buckets (in s) from 10 us to 10 s
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# histogram buckets for numbers of events
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class Counter:
+    """A monotonically increasing value."""
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def getSample(self):
+        return {"value": self.value}
+
+
+class Gauge:
+    """A value that can go up and down."""
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def getSample(self):
+        return {"value": self.value}
+
+
+class Histogram:
+    """Counts observed values in buckets and tracks their sum."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[idx] += 1
+            self.sum += value
+            self.count += 1
+
+    def getSample(self):
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = {}
+        running = 0
+        for bound, n in zip(self.buckets, counts):
+            running += n
+            cumulative[bound] = running
+        cumulative[float("inf")] = count
+        return {"count": count, "sum": total, "buckets": cumulative}
+
+
+class MetricFamily:
+    """A named metric with optional labels, each label combination holds its own metric."""
+
+    def __init__(self, name, documentation, kind, labelNames=(), **kwargs):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelNames = tuple(labelNames)
+        self.kwargs = kwargs
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *labelValues):
+        """Get the metric of a label combination.
+
+        Args:
+            labelValues (str): The label values in the order of the label names
+        Returns:
+            The :class:`Counter`, :class:`Gauge` or :class:`Histogram` of the label combination
+        """
+        child = self.children.get(labelValues)
+        if child is None:
+            with self.lock:
+                child = self.children.get(labelValues)
+                if child is None:
+                    if len(labelValues) != len(self.labelNames):
+                        raise Exception(
+                            "Metric " + self.name + " expects labels " + str(self.labelNames)
+                        )
+                    child = _METRIC_TYPES[self.kind](**self.kwargs)
+                    self.children[labelValues] = child
+        return child
+
+    # shortcuts for metrics without labels
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def getSamples(self):
+        samples = []
+        for labelValues, child in list(self.children.items()):
+            sample = child.getSample()
+            sample["labels"] = dict(zip(self.labelNames, labelValues))
+            samples.append(sample)
+        return samples
+
+
+_METRIC_TYPES = {
+    "counter": Counter,
+    "gauge": Gauge,
+    "histogram": Histogram,
+}
+
+
+def _formatLabels(labels, extra=None):
+    items = list(labels.items())
+    if extra is not None:
+        items.append(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(
+        k + '="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in items
+    ) + "}"
+
+
+def _formatValue(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Registry of metric families with snapshot and prometheus text exposition."""
+
+    def __init__(self):
+        self.families = {}
+        self.lock = threading.Lock()
+        self.httpServer = None
+
+    def _register(self, name, documentation, kind, labelNames, **kwargs):
+        with self.lock:
+            if name not in self.families:
+                self.families[name] = MetricFamily(name, documentation, kind, labelNames, **kwargs)
+            return self.families[name]
+
+    def counter(self, name, documentation, labelNames=()):
+        return self._register(name, documentation, "counter", labelNames)
+
+    def gauge(self, name, documentation, labelNames=()):
+        return self._register(name, documentation, "gauge", labelNames)
+
+    def histogram(self, name, documentation, labelNames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(name, documentation, "histogram", labelNames, buckets=buckets)
+
+    def getSnapshot(self):
+        """Get the current values of all metrics.
+
+        Returns:
+            dict: Per metric name the type, help text and the samples of all label combinations
+        """
+        return {
+            name: {
+                "type": family.kind,
+                "help": family.documentation,
+                "samples": family.getSamples(),
+            }
+            for name, family in list(self.families.items())
+        }
+
+    def toPrometheus(self):
+        """Renders all metrics in the prometheus text exposition format (version 0.0.4).
+
+        Returns:
+            str: The metrics as text
+        """
+        lines = []
+        for name, family in sorted(self.families.items()):
+            lines.append("# HELP " + name + " " + family.documentation)
+            lines.append("# TYPE " + name + " " + family.kind)
+            for sample in family.getSamples():
+                labels = sample["labels"]
+                if family.kind == "histogram":
+                    for bound, count in sample["buckets"].items():
+                        lines.append(
+                            name + "_bucket" + _formatLabels(labels, ("le", _formatValue(bound)))
+                            + " " + str(count)
+                        )
+                    lines.append(name + "_sum" + _formatLabels(labels) + " " + _formatValue(sample["sum"]))
+                    lines.append(name + "_count" + _formatLabels(labels) + " " + str(sample["count"]))
+                else:
+                    lines.append(name + _formatLabels(labels) + " " + _formatValue(sample["value"]))
+        return "\n".join(lines) + "\n"
+
+    def startHttpServer(self, port=9464, host="127.0.0.1"):
+        """Starts a local http server providing the metrics in prometheus text format on /metrics.
+
+        Args:
+            port (int): The port of the http server (0 selects a free port)
+            host (str): The interface the http server is bound to
+        Returns:
+            int: The port the http server is listening on
+        """
+        if self.httpServer is not None:
+            return self.httpServer.server_address[1]
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.toPrometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpServer = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.httpServer.daemon_threads = True
+        t = threading.Thread(target=self.httpServer.serve_forever)
+        t.daemon = True
+        t.start()
+        return self.httpServer.server_address[1]
+
+    def stopHttpServer(self):
+        """Stops the metrics http server."""
+        if self.httpServer is not None:
+            self.httpServer.shutdown()
+            self.httpServer.server_close()
+            self.httpServer = None
+
+
+class ClientMetrics(MetricsRegistry):
+    """The metrics recorded by the msb client."""
+
+    def __init__(self):
+        MetricsRegistry.__init__(self)
+        # publishing
+        self.published = self.counter(
+            "msb_events_published_total", "Number of events passed to publish", ["eventId"])
+        self.publishTime = self.histogram(
+            "msb_publish_seconds", "Total time spent in publish")
+        self.validateTime = self.histogram(
+            "msb_validate_seconds", "Time spent validating event values")
+        self.validationFailures = self.counter(
+            "msb_validation_failures_total", "Number of event values failing validation", ["eventId"])
+        self.validationDecisions = self.counter(
+            "msb_validation_decisions_total", "Number of event values validated or skipped by the validation mode",
+            ["eventId", "decision"])
+        self.serializeTime = self.histogram(
+            "msb_serialize_seconds", "Time spent serializing events")
+        self.sendTime = self.histogram(
+            "msb_send_seconds", "Time spent sending frames on the websocket")
+        self.sent = self.counter(
+            "msb_events_sent_total", "Number of events sent to the MSB")
+        self.sendErrors = self.counter(
+            "msb_send_errors_total", "Number of events that could not be sent")
+        self.batchSize = self.histogram(
+            "msb_send_batch_events", "Number of events written at once by the micro batching", buckets=COUNT_BUCKETS)
+        self.acks = self.counter(
+            "msb_event_acks_total", "Number of tracked events by acknowledgement result", ["result"])
+        self.ackLatency = self.histogram(
+            "msb_event_ack_latency_seconds", "Time from sending an event until its acknowledgement", ["eventId"])
+        self.inFlight = self.gauge(
+            "msb_events_in_flight", "Number of sent events waiting for their acknowledgement")
+        self.redelivered = self.counter(
+            "msb_events_redelivered_total", "Number of unacknowledged events queued again after a connection loss")
+        self.throttled = self.counter(
+            "msb_events_throttled_total", "Number of events exceeding a rate limit by action", ["eventId", "action"])
+        self.splitEvents = self.counter(
+            "msb_events_split_total", "Number of array events split because they exceeded the max message size",
+            ["eventId"])
+        self.columnarBytesSaved = self.gauge(
+            "msb_columnar_bytes_saved_per_sample",
+            "Bytes saved per sample by the last columnar block compared to one event per sample", ["eventId"])
+        self.scheduleLag = self.histogram(
+            "msb_schedule_lag_seconds", "Delay of the runs of scheduled events after their due time")
+        self.discarded = self.counter(
+            "msb_events_discarded_total", "Number of events discarded while not connected")
+        # event cache
+        self.cacheSize = self.gauge(
+            "msb_event_cache_size", "Number of events in the event cache")
+        self.cacheBytes = self.gauge(
+            "msb_event_cache_bytes", "Memory in bytes used by the events in the event cache")
+        self.cached = self.counter(
+            "msb_events_cached_total", "Number of events put into the event cache")
+        self.cacheEvictions = self.counter(
+            "msb_event_cache_evictions_total", "Number of events dismissed from the full event cache")
+        self.cacheExpirations = self.counter(
+            "msb_event_cache_expirations_total", "Number of cached events dropped after their time to live")
+        # inbound messages
+        self.received = self.counter(
+            "msb_messages_received_total", "Number of messages received from the MSB", ["type"])
+        self.dispatchTime = self.histogram(
+            "msb_function_dispatch_seconds", "Time spent handling incoming function calls")
+        self.functionCalls = self.counter(
+            "msb_function_calls_total", "Number of incoming function calls", ["functionId"])
+        # connection
+        self.connected = self.gauge(
+            "msb_connected", "1 if the websocket connection is open")
+        self.reconnects = self.counter(
+            "msb_reconnects_total", "Number of reconnect attempts")
+        self.registrationTime = self.histogram(
+            "msb_registration_seconds", "Time from sending the registration until IO_REGISTERED")
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from .Priority import getPriority
+
+logger = logging.getLogger(__name__)
+
+# latency budget in microseconds per event priority (0 LOW, 1 MEDIUM, 2 HIGH)
+DEFAULT_LATENCY_BUDGET = {0: 5000, 1: 1000, 2: 0}
+
+_monotonic = time.monotonic
+
+
+class MicroBatcher:
+    """Collects outgoing frames and writes them in batches, adapting to the publish rate.
+
+    At low rates (frames arriving less often than the latency budget) a frame is written directly by the
+    publishing thread. At high rates the frames are collected by a writer thread until the latency budget
+    of the most urgent frame is used up or the batch reaches the max size.
+    """
+
+    def __init__(self, sendBatch, maxBytes=65536, latencyBudget=None):
+        """Initializes a new micro batcher.
+
+        Args:
+            sendBatch (:func:): Called with the list of frames of a batch
+            maxBytes (int): The max size of a batch in bytes
+            latencyBudget (dict): The max time in microseconds a frame may be delayed, per priority
+        """
+        self.sendBatch = sendBatch
+        self.maxBytes = maxBytes
+        self.latencyBudget = dict(DEFAULT_LATENCY_BUDGET)
+        if latencyBudget is not None:
+            self.latencyBudget.update(latencyBudget)
+        self.queue = collections.deque()
+        self.queuedBytes = 0
+        self.deadline = None
+        self.sending = False
+        self.running = True
+        self.interval = None
+        self.lastSubmit = None
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def budget(self, priority):
+        """Get the latency budget of a priority in s."""
+        priority = getPriority(priority)
+        return self.latencyBudget.get(priority, self.latencyBudget[0]) / 1e6
+
+    def submit(self, frame, priority=0):
+        """Adds a frame, it is written directly or with the next batch.
+
+        Args:
+            frame (str): The frame
+            priority (str, int): The priority of the event (LOW,MEDIUM,HIGH) or (0,1,2)
+        """
+        budget = self.budget(priority)
+        with self.condition:
+            now = _monotonic()
+            if self.lastSubmit is not None:
+                interval = now - self.lastSubmit
+                self.interval = interval if self.interval is None else 0.8 * self.interval + 0.2 * interval
+            self.lastSubmit = now
+            if not self.sending and not self.queue and (self.interval is None or self.interval >= budget):
+                # low rate, write the frame without delay
+                self.sending = True
+                direct = True
+            else:
+                direct = False
+                self.queue.append((frame, now + budget))
+                self.queuedBytes += len(frame)
+                if self.deadline is None or now + budget < self.deadline:
+                    self.deadline = now + budget
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="msb-batcher")
+                    self.thread.daemon = True
+                    self.thread.start()
+                self.condition.notify_all()
+        if direct:
+            try:
+                self._write([frame])
+            finally:
+                with self.condition:
+                    self.sending = False
+                    self.condition.notify_all()
+
+    def _write(self, frames):
+        try:
+            self.sendBatch(frames)
+        except Exception:
+            logger.exception("Error, could not send batch of %s frames", len(frames))
+
+    def _take(self):
+        frames = []
+        size = 0
+        while self.queue and (not frames or size + len(self.queue[0][0]) <= self.maxBytes):
+            frame = self.queue.popleft()[0]
+            frames.append(frame)
+            size += len(frame)
+        self.queuedBytes -= size
+        self.deadline = min(deadline for frame, deadline in self.queue) if self.queue else None
+        return frames
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and (
+                    self.sending
+                    or not self.queue
+                    or (self.queuedBytes < self.maxBytes and _monotonic() < self.deadline)
+                ):
+                    timeout = None
+                    if self.queue and not self.sending:
+                        timeout = max(self.deadline - _monotonic(), 0)
+                    self.condition.wait(timeout)
+                if not self.running:
+                    return
+                frames = self._take()
+                self.sending = True
+            try:
+                self._write(frames)
+            finally:
+                with self.condition:
+                    self.sending = False
+                    self.condition.notify_all()
+
+    def flush(self, timeout=5.0):
+        """Waits until all frames were written.
+
+        Args:
+            timeout (float): The max time to wait in s
+        Returns:
+            bool: True if all frames were written
+        """
+        with self.condition:
+            if self.queue:
+                # write the collected frames without waiting for their deadline
+                self.deadline = _monotonic()
+                self.condition.notify_all()
+            return self.condition.wait_for(lambda: not self.queue and not self.sending, timeout)
+
+    def clear(self):
+        """Dismisses the frames not written yet (e.g. when the connection was closed).
+
+        Returns:
+            int: The number of dismissed frames
+        """
+        with self.condition:
+            dismissed = len(self.queue)
+            self.queue.clear()
+            self.queuedBytes = 0
+            self.deadline = None
+            return dismissed
+
+    def stop(self):
+        """Stops the writer thread, frames not written yet are dismissed."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
@@ -7,7 +7,7 @@ Licensed under the Apache License, Version 2.0
 See the file "LICENSE" for the full license governing this code.
 """
 
-import websocket, threading, json, jsonschema, ssl, time, uuid, os, logging
+import websocket, threading, json, jsonschema, ssl, time, uuid, os, logging, itertools
 from random import randint
 import datetime
 import copy
@@ -15,7 +15,38 @@ import copy
 from .Event import Event
 from .ComplexDataFormat import ComplexDataFormat
 from .Function import Function
-from .DataFormat import getDataType
+from .DataFormat import DataFormat, getDataType
+from .DataType import DataType, convertDataType
+from .EndpointPool import EndpointPool
+from .MetricsRegistry import ClientMetrics
+from .NumericArray import isNumericArray, encodeNumericArray, validateNumericArray, getItemFormat
+from .SerializerCompiler import compileSerializer
+from .ValidatorCompiler import compileValidator, STRICT_FORMAT_CHECKER
+from .ValidationMode import ValidationMode
+from .LogHelper import Preview, RateLimitedLog
+from .EventEnvelope import EventEnvelope, TimestampFormatter
+from .PerMessageDeflate import PerMessageDeflate
+from .PublishAck import AckTracker, PublishFuture, combineFutures
+from .RateLimiter import DROP, RAISE, RateLimiter
+from .MicroBatcher import MicroBatcher
+from .Priority import getPriority
+from .Scheduler import SKIP, Scheduler
+from .WindowAggregator import TIME, WindowAggregator, createWindowDataFormat
+from .DeltaEncoding import DeltaEncoder
+from .EventCache import EventCache
+from .BinaryPayload import (
+    BYTES_TYPES, CHUNK_SIZE, ChunkAssembler, createChunkDataFormat, encodeBytes, encodeChunk, isBytesLike, splitChunks
+)
+
+logger = logging.getLogger(__name__)
+# repeated errors (e.g. of invalid values or failing sends) are limited to a burst per interval
+errorLog = RateLimitedLog(logger)
+
+# marks events sent again by the at-least-once delivery
+REDELIVERED_SUFFIX = ',"redelivered":true}'
+
+# format checker of the jsonschema engine (the formats supported by jsonschema and its installed format packages)
+DEFAULT_FORMAT_CHECKER = jsonschema.FormatChecker()
 
 
 class MsbClient():
@@ -30,7 +61,8 @@ class MsbClient():
         name=None,
         description=None,
         token=None,
-        applicationPropertiesCustomPath=None
+        applicationPropertiesCustomPath=None,
+        msb_url=None
     ):
         """Initializes a new msb client.
 
@@ -43,6 +75,8 @@ class MsbClient():
             name (str): The name of the service
             description (str): The description of the service
             token (str): The token of the service used to verify service via MSB GUI or Rest
+            applicationPropertiesCustomPath (str): Custom path of the application.properties file
+            msb_url (str, list): The url of the MSB or a list of urls of several MSB endpoints
         Returns:
             MsbClient: The msb client object to specify the service and handle MSB connection
         """
@@ -55,6 +89,11 @@ class MsbClient():
         self.debug = False
         self.trace = False
         self.dataFormatValidation = True
+        self.validationEngine = "jsonschema"
+        self.validationMode = ValidationMode()
+        # validation modes (with their results) per event
+        self.validationModes = {}
+        self.eventValidationModes = set()
 
         # connection params
         self.connected = False
@@ -64,6 +103,17 @@ class MsbClient():
         self.userDisconnect = False
         self.reconnectInterval = 10
 
+        # msb endpoints used for (re)connects and failover
+        self.endpoints = EndpointPool(cooldown=self.reconnectInterval)
+        self.connectStartTime = None
+        self.registrationStartTime = None
+
+        # metrics and profiling
+        self.metrics = ClientMetrics()
+        self.profilingHooks = []
+        self.profilingSampleEvery = 1
+        self.profilingCounter = 0
+
         # client-side heartbeats
         self.keepAlive = False
         self.heartbeat_interval = 8
@@ -71,20 +121,51 @@ class MsbClient():
         # sockJs framing
         self.sockJsFraming = True
 
+        # permessage-deflate settings and the compression state of the current connection
+        self.permessageDeflate = None
+        self.deflate = None
+
         # event caching
-        self.eventCache = []
         self.eventCacheEnabled = True
         self.eventCacheSize = 1000
+        self.eventCache = EventCache(self.eventCacheSize, onDismiss=self._onCacheDismissed)
+        self.cacheExpiryTask = None
         self.maxMessageSize = 1000000
 
+        # acknowledgement tracking of sent events (the futures of cached events are kept in the cache)
+        self.ackTracker = None
+        self.ackLock = threading.Lock()
+        self.ackExpiryTask = None
+        self.atLeastOnce = False
+        # unique ids of the events sent with at-least-once delivery (random prefix of the client and a counter)
+        self.deliveryPrefix = os.urandom(8).hex() + "-"
+        self.deliveryIds = itertools.count()
+
+        # client-wide rate limit, rateLimited is set if any rate limit is configured
+        self.rateLimiter = None
+        self.rateLimited = False
+
+        # micro batching of sent events
+        self.batcher = None
+
+        # scheduler of periodically published events (created with the first scheduled event)
+        self.scheduler = None
+        self.schedulerWorkers = 4
+
         # smart object definition
         self.functions = {}
         self.events = {}
+        self.columnarEvents = {}
+        self.chunkedEvents = set()
+        self.aggregatedEvents = {}
+        self.chunkAssemblers = {}
+        self.timestampFormatter = TimestampFormatter()
         self.configuration = {}
         self.configuration["parameters"] = {}
 
         # // socket
         self.ws = None
+        self.wsThread = None
         self.hostnameVerification = False
         self.threadAsDaemonEnabled = False
 
@@ -97,6 +178,8 @@ class MsbClient():
             self.token = token
         else:
             self.readConfig()
+        if msb_url is not None:
+            self.setEndpoints(msb_url)
 
     # list of all valid MSB message types
     MSBMessageTypes = [
@@ -115,40 +198,91 @@ class MsbClient():
     ]
 
     def sendBuf(self):
-        for idx, msg in enumerate(self.eventCache):
-            try:
-                if self.connected and self.registered:
-                    logging.debug("SENDING (BUF): " + msg)
-                    if self.sockJsFraming:
-                        _msg = self.objectToJson(msg).replace("\\n", "")
-                        self.ws.send('["E ' + _msg[1:-1] + '"]')
-                    else:
-                        self.ws.send("E " + msg)
-                    self.eventCache.pop(idx)
-            except Exception:
-                pass
+        """Sends the cached events (FIFO), events that could not be sent stay in the cache.
+
+        With acknowledgement tracking only as many events as fit into the in-flight window are sent,
+        the rest is sent when acknowledgements arrive.
+        """
+        sent = 0
+        tracker = self.ackTracker
+        batcher = self.batcher
+        cache = self.eventCache
+        try:
+            if tracker is None:
+                limit = len(cache)
+            else:
+                self._expireInFlight(tracker.waitForWindow(False))
+                limit = max(tracker.window - len(tracker), 0)
+            # the events are taken one by one, compressed blocks are decompressed when they are reached
+            while sent < limit and self.connected and self.registered:
+                entry = cache.peek()
+                if entry is None:
+                    break
+                msg, future = entry[0], entry[1]
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("SENDING (BUF): %s", Preview(msg))
+                if tracker is None:
+                    self._sendEvent(self.frameMessage("E", msg), 0, batcher)
+                else:
+                    if future is None:
+                        future = PublishFuture(json.loads(msg)["eventId"], msg)
+                    with self.ackLock:
+                        tracker.track(future)
+                        try:
+                            self._sendEvent(self.frameMessage("E", msg), 0, batcher)
+                        except Exception:
+                            tracker.remove(future)
+                            raise
+                cache.remove(entry)
+                sent += 1
+        except Exception:
+            pass
+        finally:
+            if batcher is None:
+                # batched events are counted when they are written
+                self.metrics.sent.inc(sent)
+            self._updateCacheMetrics()
+
+    def _updateCacheMetrics(self):
+        self.metrics.cacheSize.set(len(self.eventCache))
+        self.metrics.cacheBytes.set(self.eventCache.bytes)
+
+    def _onCacheDismissed(self, futures, expired):
+        """Counts the events dismissed from the event cache, their futures fail."""
+        if expired:
+            self.metrics.cacheExpirations.inc(len(futures))
+            reason = " expired in the cache"
+        else:
+            self.metrics.cacheEvictions.inc(len(futures))
+            reason = " evicted from the full cache"
+        for future in futures:
+            if future is not None:
+                future.setError("Event " + str(future.eventId) + reason)
+
+    def _expireCache(self):
+        self.eventCache.expire()
+        self._updateCacheMetrics()
 
     def on_message(self, ws, message):
+        t_start = time.perf_counter_ns()
         if self.sockJsFraming:
             if self.debug and message.startswith("h"):
-                logging.debug("♥")
+                logger.debug("♥")
             message = message[3:-2]
         if message in self.MSBMessageTypes:
-            logging.info(message)
+            logger.info(message)
+            self.metrics.received.labels(message).inc()
             if message == "IO_CONNECTED":
                 if self.reconnecting:
                     self.reconnecting = False
-                    if self.sockJsFraming:
-                        _selfd = json.dumps(
-                            self.objectToJson(self.getSelfDescription())
-                        ).replace("\\n", "")
-                        self.ws.send('["R ' + _selfd[1:-1] + '"]')
-                    else:
-                        self.ws.send(
-                            "R " + self.objectToJson(self.getSelfDescription())
-                        )
-            if message == "IO_REGISTERED":
+                    self.sendSelfDescription()
+            if message == "IO_PUBLISHED":
+                self._acknowledge()
+            elif message == "IO_REGISTERED":
                 self.registered = True
+                if self.registrationStartTime is not None:
+                    self.metrics.registrationTime.observe(time.perf_counter() - self.registrationStartTime)
+                    self.registrationStartTime = None
                 if self.eventCacheEnabled:
                     self.connected = True
                     self.sendBuf()
@@ -164,6 +298,11 @@ class MsbClient():
                         self.ws.close()
                     except Exception:
                         pass
+            elif message in ("NIO_EVENT_FORWARDING_ERROR", "NIO_UNEXPECTED_EVENT_FORWARDING_ERROR"):
+                # an event was rejected, validate the values of trusted events again
+                for validationMode in list(self.validationModes.values()):
+                    validationMode.reset()
+                self._acknowledge(message)
             elif message == "NIO_UNAUTHORIZED_CONNECTION":
                 if self.connected:
                     try:
@@ -172,13 +311,17 @@ class MsbClient():
                         pass
             elif message == 'ping':
                 if self.sockJsFraming:
-                    self.ws.send('["pong"]')
+                    self._send('["pong"]')
                 else:
-                    self.ws.send('pong')
+                    self._send('pong')
         if message.startswith("C"):
+            self.metrics.received.labels("C").inc()
             jmsg = message.replace('\\"', '"')
+            t_parse = time.perf_counter_ns()
             jmsg = json.loads(jmsg[2:])
-            logging.info(str(jmsg))
+            t_dispatch = time.perf_counter_ns()
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("FUNCTION CALL: %s", Preview(jmsg))
             if jmsg["functionId"] not in self.functions:
                 if jmsg["functionId"].startswith("/") and not jmsg[
                     "functionId"
@@ -188,17 +331,30 @@ class MsbClient():
                 if "correlationId" in jmsg:
                     jmsg["functionParameters"]["correlationId"] = jmsg["correlationId"]
                 else:
-                    logging.debug("correlationid could not be found. Does the websocket interface version support it?")
+                    logger.debug("correlationid could not be found. Does the websocket interface version support it?")
+                self.metrics.functionCalls.labels(jmsg["functionId"]).inc()
+                t_handler = time.perf_counter_ns()
                 self.functions[jmsg["functionId"]].implementation(
                     jmsg["functionParameters"]
                 )
+                t_end = time.perf_counter_ns()
+                self.metrics.dispatchTime.observe((t_end - t_handler) / 1e9)
+                if self.profilingHooks and self._sampleProfiling():
+                    timings = [
+                        ("unframe", t_parse - t_start),
+                        ("parse", t_dispatch - t_parse),
+                        ("dispatch", t_handler - t_dispatch),
+                        ("handler", t_end - t_handler),
+                    ]
+                    for hook in self.profilingHooks:
+                        hook.onMessage(jmsg["functionId"], timings)
             else:
-                logging.warning("Function could not be found: " + jmsg["functionId"])
+                errorLog.warning("Function could not be found: %s", jmsg["functionId"])
         elif message.startswith("K"):
+            self.metrics.received.labels("K").inc()
             jmsg = message.replace('\\"', '"')
             jmsg = json.loads(jmsg[2:])
-            logging.info(str(jmsg))
-            logging.debug("CONFIGURATION: " + str(jmsg))
+            logger.info("CONFIGURATION: %s", Preview(jmsg))
             if jmsg["uuid"] == self.uuid:
                 for key in jmsg["params"]:
                     if key in self.configuration["parameters"]:
@@ -206,27 +362,60 @@ class MsbClient():
                 self.reRegister()
 
     def on_error(self, ws, error):
-        logging.error(error)
+        errorLog.error("%s", error)
 
     def on_close(self, ws, code, reason):
-        logging.debug("DISCONNECTED")
-        logging.debug("Websocket Close Status Code: (" + str(code) + "); Reason: (" + str(reason) + ")")
+        logger.debug("DISCONNECTED")
+        logger.debug("Websocket Close Status Code: (%s); Reason: (%s)", code, reason)
         self.connected = False
         self.registered = False
+        self.deflate = None
+        self.metrics.connected.set(0)
+        for event in self.events.values():
+            if event.deltaEncoder is not None:
+                # consumers may miss patches sent before the connection was closed
+                event.deltaEncoder.reset()
+        if self.batcher is not None:
+            dismissed = self.batcher.clear()
+            if dismissed:
+                self.metrics.sendErrors.inc(dismissed)
+        if self.ackTracker is not None:
+            inFlight = self.ackTracker.takeAll()
+            if self.atLeastOnce and self.eventCacheEnabled:
+                # the events may have reached the MSB, they are sent again marked as redelivered
+                self._requeue(inFlight, True)
+            else:
+                for future in inFlight:
+                    future.setError("Connection closed before event " + str(future.eventId) + " was acknowledged")
+                    self.metrics.acks.labels("lost").inc()
+            self.metrics.inFlight.set(0)
+        if not self.userDisconnect:
+            self.endpoints.reportFailure()
         if self.autoReconnect and not self.userDisconnect:
-            logging.info(
-                "### closed, waiting "
-                + str(self.reconnectInterval)
-                + " seconds before reconnect. ###"
-            )
-            time.sleep(self.reconnectInterval)
+            if self.endpoints.hasHealthyAlternative():
+                logger.info("### closed, failing over to next msb endpoint. ###")
+            else:
+                logger.info("### closed, waiting %s seconds before reconnect. ###", self.reconnectInterval)
+                time.sleep(self.reconnectInterval)
             self.reconnecting = True
-            logging.info("Start reconnecting to msb url: >" + self.msb_url + "<")
-            self.connect(self.msb_url)
+            self.metrics.reconnects.inc()
+            # the endpoint is selected by connect
+            logger.info("Start reconnecting to msb url: >%s<", ",".join(self.endpoints.getUrls()))
+            self.connect()
 
     def on_open(self, ws):
-        logging.debug("Socket open")
+        logger.debug("Socket open")
+        self.deflate = None
+        if self.permessageDeflate is not None and ws.sock is not None:
+            headers = ws.sock.getheaders() or {}
+            self.deflate = self.permessageDeflate.negotiate(headers.get("sec-websocket-extensions"))
+            if self.deflate is not None:
+                self.deflate.install(ws.sock)
+                logger.info("Using permessage-deflate (%s window bits)", self.deflate.windowBits)
+        if self.connectStartTime is not None:
+            self.endpoints.reportSuccess(time.monotonic() - self.connectStartTime)
         self.connected = True
+        self.metrics.connected.set(1)
 
     def enableDebug(self, debug=True):
         """Enables or disables the debug logging for the msb client.
@@ -245,6 +434,20 @@ class MsbClient():
             logging.getLogger().setLevel(logging.INFO)
         self.debug = debug
 
+    def setErrorLogRateLimit(self, burst=10, interval=10.0):
+        """Limits repeated error logs (e.g. of invalid values or failing sends) of all clients.
+
+        Each message is logged at most burst times per interval, the number of suppressed messages
+        is added to the next logged one.
+
+        Args:
+            burst (int): The max number of messages per interval (0 disables the limit)
+            interval (float): The interval in s
+        """
+        errorLog.burst = burst
+        errorLog.interval = interval
+        errorLog.reset()
+
     def enableTrace(self, trace=True):
         """Enables or disables the websocket trace.
 
@@ -264,6 +467,79 @@ class MsbClient():
         """
         self.dataFormatValidation = dataFormatValidation
 
+    def setValidationEngine(self, validationEngine="jsonschema"):
+        """Sets the engine validating values of complex data formats.
+
+        The 'compiled' engine checks values by straight-line python code generated from the data format.
+        Values failing these checks (and data formats which cannot be compiled) are validated by
+        the 'jsonschema' engine, so the error messages are the same. The compiled engine checks the date-time
+        (with time zone) and byte (base64) formats strictly, the 'jsonschema' engine uses the default format
+        checker of jsonschema.
+
+        Args:
+            validationEngine (str): The validation engine ('jsonschema' or 'compiled')
+        """
+        if validationEngine not in ("jsonschema", "compiled"):
+            raise Exception("Unknown validation engine: " + str(validationEngine))
+        self.validationEngine = validationEngine
+
+    def setValidationMode(
+        self,
+        mode="full",
+        sampleEvery=None,
+        sampleRate=None,
+        validateFirst=0,
+        trustAfter=100,
+        eventId=None,
+    ):
+        """Sets which event values are validated (if data format validation is enabled).
+
+        Modes are 'full' (every value), 'sampled' (one in sampleEvery values or a share of sampleRate),
+        'trust' (until trustAfter consecutive values were valid, a failure resets the trust) and 'off'.
+
+        Args:
+            mode (str): The validation mode (full, sampled, trust or off)
+            sampleEvery (int): Validate one in this number of values per event (sampled mode)
+            sampleRate (float): Validate this share of the values, e.g. 0.01 for 1 % (sampled mode)
+            validateFirst (int): The number of values always validated (trust mode)
+            trustAfter (int): The number of consecutive valid values after which an event is trusted (trust mode)
+            eventId (str): Only set the mode of this event, otherwise the mode of all events without own mode
+        """
+        validationMode = ValidationMode(mode, sampleEvery, sampleRate, validateFirst, trustAfter)
+        if eventId is not None:
+            self.validationModes[eventId] = validationMode
+            self.eventValidationModes.add(eventId)
+        else:
+            self.validationMode = validationMode
+            self.validationModes = {
+                eventId: self.validationModes[eventId] for eventId in self.eventValidationModes
+            }
+
+    def getValidationStats(self):
+        """Get the validation mode and results (validated values, consecutive passes, trusted) per event.
+
+        Returns:
+            dict: eventId -> validation statistics
+        """
+        return {eventId: mode.getStats() for eventId, mode in list(self.validationModes.items())}
+
+    def _decideValidation(self, eventId):
+        """Decides if the value of an event is validated.
+
+        Returns:
+            ValidationMode: The validation mode of the event to report the result to, None if not validated
+        """
+        if not self.dataFormatValidation:
+            return None
+        validationMode = self.validationModes.get(eventId)
+        if validationMode is None:
+            validationMode = self.validationModes[eventId] = self.validationMode.copy()
+        if validationMode.shouldValidate():
+            self.metrics.validationDecisions.labels(eventId, "validated").inc()
+            return validationMode
+        self.metrics.validationDecisions.labels(eventId, "skipped").inc()
+        return None
+
     def disableAutoReconnect(self, autoReconnect=True):
         """Disables or enables auto reconnect for the client if connection to MSB gets lost.
 
@@ -281,6 +557,7 @@ class MsbClient():
         if interval <= 3000:
             interval = 3000
         self.reconnectInterval = interval / 1000
+        self.endpoints.cooldown = self.reconnectInterval
 
     def setKeepAlive(self, keepAlive=True, heartbeat_interval=8000):
         """Sets the keepalive interval for the client-side heartbeat in ms for the WS connection.
@@ -304,6 +581,146 @@ class MsbClient():
         """
         self.sockJsFraming = not sockJsFraming
 
+    def enablePermessageDeflate(
+        self, permessageDeflate=True, windowBits=15, compressionLevel=6, minSize=256, noContextTakeover=False
+    ):
+        """Enables or disables the compression of messages with the permessage-deflate websocket extension.
+
+        The extension is offered on the next connect and only used if the MSB accepts it.
+
+        Args:
+            permessageDeflate (bool): Used to either enable (true) or disable (false) the compression
+            windowBits (int): The window size (9 to 15) of the compression, smaller windows use less memory
+            compressionLevel (int): The zlib compression level (1 to 9)
+            minSize (int): Messages smaller than this size in bytes are sent uncompressed
+            noContextTakeover (bool): Compress every message on its own (less memory, lower ratio)
+        """
+        if permessageDeflate:
+            self.permessageDeflate = PerMessageDeflate(windowBits, compressionLevel, minSize, noContextTakeover)
+        else:
+            self.permessageDeflate = None
+
+    def enableMicroBatching(self, microBatching=True, maxBytes=65536, latencyBudget=None):
+        """Enables or disables the micro batching of sent events.
+
+        Events published faster than their latency budget are collected and written at once (one sockJs
+        frame or one send call for the websocket frames), until the latency budget of the most urgent event
+        is used up or the batch reaches the max size. Events published at low rates are sent without delay.
+
+        Args:
+            microBatching (bool): Used to either enable (true) or disable (false) the micro batching
+            maxBytes (int): The max size of a batch in bytes (limited to the max message size)
+            latencyBudget (dict): The max delay in microseconds per event priority (0/LOW, 1/MEDIUM, 2/HIGH),
+                default {0: 5000, 1: 1000, 2: 0}
+        """
+        if self.batcher is not None:
+            self.batcher.flush()
+            self.batcher.stop()
+            self.batcher = None
+        if microBatching:
+            if self.maxMessageSize:
+                maxBytes = min(maxBytes, self.maxMessageSize)
+            if latencyBudget is not None:
+                latencyBudget = {
+                    getPriority(priority): budget for priority, budget in latencyBudget.items()
+                }
+            self.batcher = MicroBatcher(self._sendBatch, maxBytes, latencyBudget)
+
+    def enableAcknowledgements(self, acknowledgements=True, window=1000, timeout=30.0):
+        """Enables or disables tracking the acknowledgements of sent events, :func:`publish` returns futures.
+
+        The MSB acknowledges events in the order they were sent (IO_PUBLISHED or NIO_*_EVENT_FORWARDING_ERROR).
+        If the window of unacknowledged events is full, publish waits for acknowledgements.
+        Events not acknowledged in time are expired when events are published and periodically by the
+        scheduler (see :func:`schedule`), also if no further events are published.
+
+        Args:
+            acknowledgements (bool): Used to either enable (true) or disable (false) the tracking
+            window (int): The max number of sent but unacknowledged events
+            timeout (float): Events not acknowledged within this time in s fail
+        """
+        task, self.ackExpiryTask = self.ackExpiryTask, None
+        if task is not None:
+            task.cancel()
+        if acknowledgements:
+            self.ackTracker = AckTracker(window, timeout)
+            self.ackExpiryTask = self._getScheduler().schedule("ackExpiry", min(timeout, 1.0), self._expireAcks)
+        else:
+            self.ackTracker = None
+
+    def enableAtLeastOnceDelivery(self, atLeastOnce=True, window=1000, timeout=30.0):
+        """Enables or disables the at-least-once delivery of events (enables acknowledgements, see
+        :func:`enableAcknowledgements`).
+
+        Events sent but not acknowledged when the connection is closed are put back to the front of the
+        event cache and sent again after the reconnect, marked with "redelivered": true.
+        Every event gets a unique "deliveryId" when it is serialized, which is kept when it is redelivered,
+        so consumers can drop redelivered events with a delivery id they already received.
+        The cache can exceed its size by up to the window size.
+
+        Args:
+            atLeastOnce (bool): Used to either enable (true) or disable (false) the at-least-once delivery
+            window (int): The max number of sent but unacknowledged events (trades throughput against memory)
+            timeout (float): Events not acknowledged within this time in s fail
+        """
+        self.atLeastOnce = atLeastOnce
+        self.enableAcknowledgements(atLeastOnce, window, timeout)
+
+    def _requeue(self, futures, redelivered):
+        """Puts sent events back into the event cache, unacknowledged events to the front."""
+        entries = []
+        for future in futures:
+            msg = future.msg
+            if redelivered and not msg.endswith(REDELIVERED_SUFFIX):
+                msg = msg[:-1] + REDELIVERED_SUFFIX
+            future.msg = msg
+            event = self.events.get(future.eventId)
+            # the events expire by the time they were sent
+            entries.append((msg, future, future.eventId, event.priority if event is not None else 0, future.sentTime))
+            future.sentTime = None
+        self.eventCache.push(entries, front=redelivered)
+        if redelivered:
+            self.metrics.redelivered.inc(len(entries))
+        self._updateCacheMetrics()
+
+    def _acknowledge(self, error=None):
+        """Completes the oldest in-flight event with the acknowledgement (or error) of the MSB."""
+        tracker = self.ackTracker
+        if tracker is None:
+            return
+        future = tracker.acknowledge(error)
+        if future is None:
+            return
+        if error is None:
+            self.metrics.ackLatency.labels(future.eventId).observe(future.latency)
+            self.metrics.acks.labels("acknowledged").inc()
+        else:
+            self.metrics.acks.labels("rejected").inc()
+        self.metrics.inFlight.set(len(tracker))
+        # continue flushing the cache if it was limited by the window
+        if self.eventCache and len(tracker) < tracker.window:
+            self.sendBuf()
+
+    def _expireAcks(self):
+        tracker = self.ackTracker
+        if tracker is not None:
+            self._expireInFlight(tracker.waitForWindow(False))
+            self.metrics.inFlight.set(len(tracker))
+
+    def _expireInFlight(self, expired):
+        if expired:
+            self.metrics.acks.labels("expired").inc(len(expired))
+            errorLog.warning("%s events were not acknowledged in time", len(expired))
+
+    def getCompressionStats(self):
+        """Get the compression statistics of the current connection.
+
+        Returns:
+            dict: The statistics (see :func:`DeflateContext.getStats`) or None if the connection is not compressed
+        """
+        deflate = self.deflate
+        return deflate.getStats() if deflate is not None else None
+
     def disableHostnameVerification(self, hostnameVerification=True):
         """Disables or enables checking for self-signed SSL certificates (disable it e.g. for development)
 
@@ -329,6 +746,75 @@ class MsbClient():
             eventCacheSize (int): The size of the event cache (event entries)
         """
         self.eventCacheSize = eventCacheSize
+        self.eventCache.maxEvents = eventCacheSize
+
+    def setEventCacheBytes(self, maxBytes=0):
+        """Sets the max memory used by the events of the event cache (in addition to the max number of events).
+
+        If the max is reached, oldest entries get dismissed.
+
+        Args:
+            maxBytes (int): The max memory in bytes (0 disables the limit)
+        """
+        self.eventCache.maxBytes = maxBytes
+
+    def enableEventCacheCompression(self, compression=True, blockSize=65536, compressionLevel=6):
+        """Enables or disables the compression of the event cache (enabled by default).
+
+        Cached events are compressed in blocks of the block size, the blocks are decompressed one at a time
+        when the cache is sent. Larger blocks compress better but take longer to decompress.
+
+        Args:
+            compression (bool): Used to either enable (true) or disable (false) the compression
+            blockSize (int): The size in bytes of the uncompressed events of a block
+            compressionLevel (int): The zlib compression level (1 to 9)
+        """
+        cache = self.eventCache
+        with cache.lock:
+            cache.compression = compression
+            cache.blockSize = blockSize
+            cache.compressionLevel = compressionLevel
+
+    def getEventCacheStats(self):
+        """Get the number of cached events and the memory they use.
+
+        Returns:
+            dict: The statistics (see :func:`EventCache.getStats`)
+        """
+        return self.eventCache.getStats()
+
+    def setEventCacheTimeToLive(self, timeToLive, eventId=None, expiryInterval=1.0):
+        """Sets the time to live of cached events, older events are dropped instead of being sent after a reconnect.
+
+        Expired events are dropped when the cache is sent and periodically by the scheduler
+        (see :func:`schedule`), their futures fail. If the cache is full, expired events are dismissed first.
+
+        Args:
+            timeToLive (float): The time in s (None removes it)
+            eventId (str): Set the time of this event, otherwise the time of all other events
+            expiryInterval (float): The interval in s of removing expired events
+        """
+        self.eventCache.setTimeToLive(timeToLive, eventId)
+        task, self.cacheExpiryTask = self.cacheExpiryTask, None
+        if task is not None:
+            task.cancel()
+        if self.eventCache.timesToLive:
+            self.cacheExpiryTask = self._getScheduler().schedule("eventCacheExpiry", expiryInterval, self._expireCache)
+
+    def setEventCacheQuota(self, maxEvents, eventId=None, priority=None):
+        """Sets the max number of cached events of an event or of a priority, so that a single event
+        cannot dismiss all other events from the cache.
+
+        If a quota is reached, expired events are dismissed first, then the oldest events of the event
+        (of its lowest priority) or of the priority. If the whole cache is full, the oldest events of the lowest
+        priority are dismissed.
+
+        Args:
+            maxEvents (int): The max number of events (None removes the quota)
+            eventId (str): Set the quota of this event
+            priority (str, int): Set the quota of this priority (LOW,MEDIUM,HIGH) or (0,1,2)
+        """
+        self.eventCache.setQuota(maxEvents, eventId, priority)
 
     def enableThreadAsDaemon(self, threadAsDaemonEnabled=True):
         """Enable the msb client thread to run as daemon.
@@ -340,6 +826,50 @@ class MsbClient():
         """
         self.threadAsDaemonEnabled = threadAsDaemonEnabled
 
+    def addProfilingHook(self, hook, sampleEvery=None):
+        """Adds a profiling hook receiving per-stage timings of publish and incoming function calls.
+
+        Args:
+            hook (:obj:ProfilingHook): The hook, e.g. a :class:`LatencyHistogramHook`
+            sampleEvery (int): Only profile every Nth message (applies to all hooks)
+        """
+        if sampleEvery is not None:
+            self.profilingSampleEvery = max(1, int(sampleEvery))
+        self.profilingHooks = self.profilingHooks + [hook]
+
+    def removeProfilingHook(self, hook):
+        """Removes a profiling hook.
+
+        Args:
+            hook (:obj:ProfilingHook): The hook to be removed
+        """
+        self.profilingHooks = [h for h in self.profilingHooks if h is not hook]
+
+    def _sampleProfiling(self):
+        self.profilingCounter += 1
+        return self.profilingCounter % self.profilingSampleEvery == 0
+
+    def setEndpoints(self, msb_url):
+        """Sets the MSB endpoints to connect to.
+
+        If several endpoints are provided, the client connects to the fastest healthy one
+        and fails over to the next one if the connection gets lost.
+
+        Args:
+            msb_url (str, list): The url of the MSB, a comma separated list of urls or a list of urls
+        """
+        self.endpoints.setUrls(msb_url)
+        if len(self.endpoints) > 0:
+            self.msb_url = self.endpoints.getUrls()[0]
+
+    def getEndpointStats(self):
+        """Get the connection statistics (latency in s, connects, failures) of all MSB endpoints.
+
+        Returns:
+            list: One dict per endpoint
+        """
+        return self.endpoints.getStats()
+
     def _checkUrl(self, msb_url=None):
         """Checks and transforms the msb url into a valid websocket format
 
@@ -355,7 +885,7 @@ class MsbClient():
         elif "https://" in self.msb_url:
             self.msb_url = self.msb_url.replace("https://", "wss://")
         if not (self.msb_url.startswith("ws://") or self.msb_url.startswith("wss://")):
-            logging.error("WRONG MSB URL FORMAT: " + str(self.msb_url))
+            logger.error("WRONG MSB URL FORMAT: %s", self.msb_url)
         if self.sockJsFraming:
             self.msb_url_with_wspath = (
                 self.msb_url
@@ -372,15 +902,24 @@ class MsbClient():
         """Connects the client to the MSB WebSocket interface.
 
         Args:
-            msb_url (str): The url of the MSB (http(s)://host:port or ws(s)://host:port)
+            msb_url (str, list): The url of the MSB (http(s)://host:port or ws(s)://host:port) or a list of urls
         """
         self.userDisconnect = False
 
-        # check and update the url fromat
-        self._checkUrl(msb_url)
+        # select the endpoint, then check and update the url fromat
+        if msb_url is not None:
+            self.setEndpoints(msb_url)
+        elif len(self.endpoints) == 0 and self.msb_url:
+            self.setEndpoints(self.msb_url)
+        self._checkUrl(self.endpoints.select())
+        self.connectStartTime = time.monotonic()
         # init the websocket app and register own listeners
+        header = []
+        if self.permessageDeflate is not None:
+            header.append("Sec-WebSocket-Extensions: " + self.permessageDeflate.offer())
         ws = websocket.WebSocketApp(
             self.msb_url_with_wspath,
+            header=header,
             on_message=self.on_message,
             on_error=self.on_error,
             on_close=self.on_close,
@@ -421,8 +960,9 @@ class MsbClient():
             except Exception:
                 pass
 
-        logging.info("Connecting to MSB @ " + self.msb_url)
+        logger.info("Connecting to MSB @ %s", self.msb_url)
         wst = threading.Thread(target=runf)
+        self.wsThread = wst
         if self.threadAsDaemonEnabled:
             wst.setDaemon(True)
         wst.start()
@@ -430,20 +970,76 @@ class MsbClient():
     def disconnect(self):
         """Disconnects the client from the MSB WebSocket interface."""
         self.userDisconnect = True
-        logging.debug("Disconnect requested by msb client api")
+        logger.debug("Disconnect requested by msb client api")
+        if self.batcher is not None:
+            self.batcher.flush()
         self.ws.close()
 
+    def setMaxMessageSize(self, maxMessageSize=1000000):
+        """Sets the max size of messages (events and registrations) sent to the MSB.
+
+        Array events exceeding the size are split into several events, other events and self-descriptions
+        exceeding the size are not sent.
+
+        Args:
+            maxMessageSize (int): The max size of a websocket frame in bytes (0 disables the limit)
+        """
+        self.maxMessageSize = maxMessageSize
+
+    def getSelfDescriptionSize(self):
+        """Get the size of the registration message with a breakdown by events, functions and configuration.
+
+        Returns:
+            dict: The 'total' size, the sizes per event id ('events') and function id ('functions')
+                and the size of the 'configuration' in bytes
+        """
+        selfDescription = self.getSelfDescription()
+        return {
+            "total": _byteSize(self.frameMessage("R", self.objectToJson(selfDescription))),
+            "events": {e["eventId"]: len(self.objectToJson(e)) for e in selfDescription["events"]},
+            "functions": {f["functionId"]: len(self.objectToJson(f)) for f in selfDescription["functions"]},
+            "configuration": len(self.objectToJson(selfDescription["configuration"])),
+        }
+
+    def _checkSelfDescriptionSize(self, frame):
+        """Get the error description if the registration message exceeds the max message size, otherwise None."""
+        if not self.maxMessageSize or _byteSize(frame) <= self.maxMessageSize:
+            return None
+        sizes = self.getSelfDescriptionSize()
+        largest = sorted(
+            [("event " + k, v) for k, v in sizes["events"].items()]
+            + [("function " + k, v) for k, v in sizes["functions"].items()]
+            + [("configuration", sizes["configuration"])],
+            key=lambda item: -item[1],
+        )
+        return (
+            "Self-description exceeds the max message size (" + str(_byteSize(frame)) + " > "
+            + str(self.maxMessageSize) + " bytes), largest parts: "
+            + ", ".join(name + " (" + str(size) + " bytes)" for name, size in largest[:10])
+        )
+
+    def sendSelfDescription(self):
+        """Sends the self-description as registration message via the open websocket connection."""
+        frame = self.frameMessage("R", self.objectToJson(self.getSelfDescription()))
+        error = self._checkSelfDescriptionSize(frame)
+        if error is not None:
+            logger.error(error)
+            return
+        self.registrationStartTime = time.perf_counter()
+        self._send(frame)
+
     def register(self):
-        """Sends registration message to the MSB."""
+        """Sends registration message to the MSB.
+
+        Raises an exception if the self-description exceeds the max message size.
+        """
+        error = self._checkSelfDescriptionSize(self.frameMessage("R", self.objectToJson(self.getSelfDescription())))
+        if error is not None:
+            logger.error(error)
+            raise Exception(error)
+
         def _sendReg():
-            if self.sockJsFraming:
-                _selfd = json.dumps(
-                    self.objectToJson(self.getSelfDescription())
-                ).replace("\\n", "")
-                _selfd = _selfd[1:-1]
-                self.ws.send('["R ' + _selfd + '"]')
-            else:
-                self.ws.send("R " + self.objectToJson(self.getSelfDescription()))
+            self.sendSelfDescription()
 
         def _set_interval(func, sec):
             def func_wrapper():
@@ -466,6 +1062,9 @@ class MsbClient():
         event_dataformat=None,
         event_priority=0,
         isArray=None,
+        rateLimit=None,
+        burst=None,
+        rateLimitAction=DROP,
     ):
         """Adds an event to the self-description.
 
@@ -476,6 +1075,9 @@ class MsbClient():
             event_dataFormat (:obj:): The data type of the event (of class DataFormat, DataType or ComplexDataFormat)
             event_priority (str, int): The priority of the event (LOW,MEDIUM,HIGH) or (0,1,2)
             isArray (bool): Specifies if the event handles an object array or just an object of the data
+            rateLimit (float): The max number of published events per second (None for no limit)
+            burst (int): The max number of events published at once (see :class:`RateLimiter`)
+            rateLimitAction (str): The action for events exceeding the limit (drop, conflate, queue or raise)
         """
         # create event object by single params
         if not isinstance(event, Event):
@@ -486,6 +1088,9 @@ class MsbClient():
                 event_dataformat,
                 event_priority,
                 isArray,
+                rateLimit,
+                burst,
+                rateLimitAction,
             )
         # for complex objects, update dataformat
         if event.dataFormat is not None:
@@ -503,16 +1108,19 @@ class MsbClient():
             elif not event.isArray:
                 if "$ref" in event.dataFormat["dataObject"]:
                     event.dataFormat["dataObject"]["type"] = "object"
-        # logging.debug(str(event.dataFormat))
+        # logger.debug(str(event.dataFormat))
         # validate data format and add event
         if vadilateEventDataFormat(event.dataFormat):
             event.id = len(self.events) + 1
             if event.eventId not in self.events:
+                if isinstance(event.df, ComplexDataFormat):
+                    event.serializer = compileSerializer(event.dataFormat, event.isArray, _jsonDefault)
+                    event.validator = compileValidator(event.dataFormat, event.isArray)
                 self.events[event.eventId] = event
+                if event.rateLimiter is not None:
+                    self.rateLimited = True
             else:
-                logging.error(
-                    str(event.eventId) + " already in events, change event id!"
-                )
+                logger.error("%s already in events, change event id!", event.eventId)
                 raise Exception("Event with this ID already present: " + str(event.eventId))
 
     def addFunction(
@@ -551,9 +1159,7 @@ class MsbClient():
         if function.responseEvents is not None:
             for responseEvent in function.responseEvents:
                 if responseEvent not in self.events:
-                    logging.error(
-                        "Event not found for id " + responseEvent
-                    )
+                    logger.error("Event not found for id %s", responseEvent)
                     raise Exception("Event not found for id " + responseEvent)
         # for complex objects, update dataformat
         if function.dataFormat is not None:
@@ -571,16 +1177,13 @@ class MsbClient():
             elif not function.isArray:
                 if "$ref" in function.dataFormat["dataObject"]:
                     function.dataFormat["dataObject"]["type"] = "object"
-        # logging.debug(str(function.dataFormat))
+        # logger.debug(str(function.dataFormat))
         # validate data format and add function
         if vadilateFunctionDataFormat(function.dataFormat):
             if function.functionId not in self.functions:
                 self.functions[function.functionId] = function
             else:
-                logging.error(
-                    str(function.functionId)
-                    + " already in functions, change function id!"
-                )
+                logger.error("%s already in functions, change function id!", function.functionId)
                 raise Exception("Function with this ID already present: " + str(function.functionId))
 
     def setEventValue(self, eventId, eventValue):
@@ -615,66 +1218,725 @@ class MsbClient():
             cached (bool): Specifies wether this event will be added to cache if MSB is currently not reachable
             postDate (datetime): the post date of the event (e.g. datetime.datetime.utcnow().isoformat()[:-3] + "Z")
             correlationId (str): The correlation id of the event used to idetify events in multi-step flows
+        Returns:
+            PublishFuture: The future completed by the acknowledgement of the MSB if acknowledgements are enabled
+                (see :func:`enableAcknowledgements`), otherwise None
+        """
+        future = PublishFuture(eventId) if self.ackTracker is not None else None
+        if self.rateLimited and not self._admit(
+            eventId, (eventId, dataObject, priority, cached, postDate, correlationId, None, future)
+        ):
+            return future
+        self._publishEvent(eventId, dataObject, priority, cached, postDate, correlationId, future=future)
+        return future
+
+    def publishRaw(
+        self,
+        eventId,
+        dataObject,
+        priority=None,
+        cached=False,
+        postDate=None,
+        correlationId=None,
+        validate=False,
+        checkWellFormed=False,
+    ):
+        """Publishes an event with an already json encoded value (e.g. forwarded from another broker).
+
+        The value is spliced into the event as is, events are cached and sent like by :func:`publish`.
+
+        Args:
+            eventId (str): The event id
+            dataObject (str, bytes): The json encoded value (bytes as utf-8)
+            priority (str, int): The priority of the event (LOW,MEDIUM,HIGH) or (0,1,2)
+            cached (bool): Specifies wether this event will be added to cache if MSB is currently not reachable
+            postDate (datetime): the post date of the event (e.g. datetime.datetime.utcnow().isoformat()[:-3] + "Z")
+            correlationId (str): The correlation id of the event used to idetify events in multi-step flows
+            validate (bool): Decode and validate the value (according to the validation mode)
+            checkWellFormed (bool): Check the value shallowly (first and last character according to the data format)
+        Returns:
+            PublishFuture: The future completed by the acknowledgement of the MSB if acknowledgements are enabled
+                (see :func:`enableAcknowledgements`), otherwise the serialized event (None if the event was
+                throttled by the rate limit)
         """
-        event = {}
-        event["uuid"] = self.uuid
-        event["eventId"] = eventId
+        if isinstance(dataObject, (bytes, bytearray, memoryview)):
+            dataObject = bytes(dataObject).decode("utf-8")
+        if checkWellFormed:
+            error = checkRawDataObject(dataObject, self.events[eventId].dataFormat)
+            if error is not None:
+                raise Exception("Malformed value of event " + str(eventId) + ": " + error)
+        if validate:
+            validationMode = self._decideValidation(eventId)
+            if validationMode is not None:
+                valid = self._validateEventValue(self.events[eventId], json.loads(dataObject))
+                validationMode.report(valid)
+                if not valid:
+                    self.metrics.validationFailures.labels(eventId).inc()
+        future = PublishFuture(eventId) if self.ackTracker is not None else None
+        if self.rateLimited and not self._admit(
+            eventId, (eventId, None, priority, cached, postDate, correlationId, dataObject.strip(), future)
+        ):
+            return future
+        msg = self._publishEvent(
+            eventId, None, priority, cached, postDate, correlationId, dataObject.strip(), future=future
+        )
+        return msg if future is None else future
+
+    def schedule(self, eventId, interval, supplier, overrun=SKIP, delay=None, priority=None, cached=False):
+        """Publishes an event periodically with the values of a supplier.
+
+        All scheduled events share one timer thread and a pool of worker threads calling the suppliers
+        (see :func:`setSchedulerWorkers`). The runs are scheduled at multiples of the interval, so delays do
+        not accumulate.
+
+        Args:
+            eventId (str): The event id
+            interval (float): The interval in s
+            supplier (:func:): Called without arguments, returns the value to publish (None publishes nothing)
+            overrun (str): The action if a run is due while the supplier of the previous run is still running,
+                skip (drop the run) or coalesce (run once directly after the previous run)
+            delay (float): The delay of the first run in s (default: one interval)
+            priority (str, int): The priority of the event (LOW,MEDIUM,HIGH) or (0,1,2)
+            cached (bool): Specifies wether the events will be added to cache if MSB is currently not reachable
+        Returns:
+            ScheduledTask: The scheduled task, stopped with cancel()
+        """
+        if eventId not in self.events:
+            raise Exception("Event not found: " + str(eventId))
+
+        def _publishSupplied():
+            value = supplier()
+            if value is not None:
+                self.publish(eventId, value, priority, cached)
+
+        return self._getScheduler().schedule(eventId, interval, _publishSupplied, overrun, delay)
+
+    def _getScheduler(self):
+        if self.scheduler is None:
+            self.scheduler = Scheduler(self.schedulerWorkers, self._observeScheduleLag)
+        return self.scheduler
+
+    def _observeScheduleLag(self, task, lag):
+        self.metrics.scheduleLag.observe(lag)
+
+    def setSchedulerWorkers(self, workers=4):
+        """Sets the number of worker threads calling the suppliers of scheduled events (see :func:`schedule`).
+
+        Args:
+            workers (int): The number of worker threads, applies to schedulers started afterwards
+        """
+        self.schedulerWorkers = workers
+
+    def getSchedulerStats(self):
+        """Get the statistics of the scheduled events.
+
+        Returns:
+            dict: The number of scheduled events, runs, skipped and coalesced runs, supplier errors
+                and the max delay of a run in s
+        """
+        return self.scheduler.getStats() if self.scheduler is not None else None
+
+    def stopScheduler(self):
+        """Cancels all scheduled events (and the periodic removal of expired cached and in-flight events)."""
+        scheduler, self.scheduler = self.scheduler, None
+        self.cacheExpiryTask = None
+        self.ackExpiryTask = None
+        if scheduler is not None:
+            scheduler.stop()
+
+    def setRateLimit(self, rate, burst=None, action=DROP, maxQueue=1000, eventId=None):
+        """Sets the rate limit of an event or of all events of the client (token bucket).
+
+        Events exceeding the limit are dropped, conflated to the latest value, queued or publish raises.
+        Conflated and queued events are published when tokens are available again.
+
+        Args:
+            rate (float): The max number of published events per second (None removes the limit)
+            burst (int): The max number of events published at once (default: one second of events)
+            action (str): The action for events exceeding the limit (drop, conflate, queue or raise)
+            maxQueue (int): The max number of queued events, the oldest are dropped (queue action)
+            eventId (str): Set the limit of this event, otherwise the limit of the client
+        """
+        rateLimiter = RateLimiter(rate, burst, action, maxQueue) if rate is not None else None
+        if eventId is None:
+            self.rateLimiter = rateLimiter
+        else:
+            self.events[eventId].rateLimiter = rateLimiter
+        self.rateLimited = self.rateLimiter is not None or any(
+            event.rateLimiter is not None for event in self.events.values()
+        )
+
+    def getRateLimitStats(self):
+        """Get the throttled and pending events of the client-wide and the per-event rate limits.
+
+        Returns:
+            dict: event id (None for the client-wide limit) -> statistics of the rate limit
+        """
+        stats = {eventId: e.rateLimiter.getStats() for eventId, e in self.events.items() if e.rateLimiter is not None}
+        if self.rateLimiter is not None:
+            stats[None] = self.rateLimiter.getStats()
+        return stats
+
+    def _admit(self, eventId, item, key=None):
+        """Checks the rate limits of the event and the client, throttles the event if a limit is exceeded.
+
+        Args:
+            key (:obj:): The key of conflated events (default: the event id)
+        Returns:
+            bool: True if the event may be published now
+        """
+        # events are deferred while older events are pending to keep their order
+        rateLimiter = self.events[eventId].rateLimiter
+        if rateLimiter is not None and (rateLimiter.pending or not rateLimiter.tryAcquire()):
+            self._throttle(rateLimiter, eventId, item, key)
+            return False
+        rateLimiter = self.rateLimiter
+        if rateLimiter is not None and (rateLimiter.pending or not rateLimiter.tryAcquire()):
+            self._throttle(rateLimiter, eventId, item, key)
+            return False
+        return True
+
+    def _throttle(self, rateLimiter, eventId, item, key=None):
+        rateLimiter.throttled += 1
+        self.metrics.throttled.labels(eventId, rateLimiter.action).inc()
+        if rateLimiter.action == RAISE:
+            raise Exception("Rate limit of " + str(rateLimiter.rate) + " events/s exceeded by event " + str(eventId))
+        if rateLimiter.action == DROP:
+            dropped = item
+        else:
+            if item[4] is None:
+                # deferred events keep the time they were published
+                item = item[:4] + (self.timestampFormatter.now(),) + item[5:]
+            dropped = rateLimiter.defer(eventId if key is None else key, item, self._publishThrottled)
+        if dropped is not None:
+            errorLog.warning("Rate limit exceeded, event %s dropped", dropped[0])
+            if dropped[7] is not None:
+                dropped[7].setError("Event " + str(dropped[0]) + " dropped by the rate limit")
+
+    def _publishThrottled(self, item):
+        eventId, dataObject, priority, cached, postDate, correlationId, rawDataObject, future = item
+        self._publishEvent(eventId, dataObject, priority, cached, postDate, correlationId, rawDataObject, None, future)
+
+    def _publishEvent(
+        self,
+        eventId,
+        dataObject,
+        priority,
+        cached,
+        postDate,
+        correlationId,
+        rawDataObject=None,
+        sequence=None,
+        future=None,
+    ):
+        """Serializes the event and sends or caches it (see :func:`publish`).
+
+        Array events exceeding the max message size are split (see :func:`_publishSplit`).
+
+        Args:
+            rawDataObject (str): The already json encoded value, used instead of dataObject
+            sequence (tuple): The sequence index and count of a part of a split event
+            future (PublishFuture): The future completed by the acknowledgement (of the last part of split events)
+        Returns:
+            str: The serialized event (the last part of split events)
+        """
+        metrics = self.metrics
+        t_start = time.perf_counter_ns()
+        metrics.published.labels(eventId).inc()
+        msbEvent = self.events[eventId]
         # upfate the event value
         if dataObject is not None:
-            self.events[eventId].dataObject = dataObject
-            event["dataObject"] = self.events[eventId].dataObject
+            msbEvent.dataObject = dataObject
         if priority is not None:
-            self.events[eventId].priority = priority
-        event["priority"] = self.events[eventId].priority
+            msbEvent.priority = priority
+        # the static part of the event is precomputed, it changes only with the uuid or priority
+        envelope = msbEvent.envelope
+        if envelope is None or not envelope.matches(self.uuid, msbEvent.priority):
+            envelope = msbEvent.envelope = EventEnvelope(self.uuid, eventId, msbEvent.priority)
         if postDate is None:
-            event["postDate"] = datetime.datetime.utcnow().isoformat()[:-3] + "Z"
+            postDate = '"' + self.timestampFormatter.now() + '"'
         else:
-            event["postDate"] = str(postDate)
-        if correlationId is not None:
-            event["correlationId"] = correlationId
+            postDate = json.dumps(str(postDate))
 
         # validate event value
-        if self.dataFormatValidation and dataObject is not None:
-            self.validateValueForDataFormat(
-                event["dataObject"],
-                self.events[eventId].df,
-                self.events[eventId].dataFormat,
-                self.events[eventId].isArray,
-            )
-        msg = self.objectToJson(event)
+        t_validate = time.perf_counter_ns()
+        validationMode = self._decideValidation(eventId) if dataObject is not None else None
+        if validationMode is not None:
+            valid = self._validateEventValue(msbEvent, dataObject)
+            validationMode.report(valid)
+            if not valid:
+                metrics.validationFailures.labels(eventId).inc()
+            t_serialize = time.perf_counter_ns()
+            metrics.validateTime.observe((t_serialize - t_validate) / 1e9)
+        else:
+            t_serialize = t_validate
+        if dataObject is not None and rawDataObject is None:
+            rawDataObject = self._encodeValue(msbEvent, dataObject)
+        delta = None
+        if msbEvent.deltaEncoder is not None and rawDataObject is not None:
+            rawDataObject, delta = msbEvent.deltaEncoder.encode(rawDataObject)
+        deliveryId = self.deliveryPrefix + str(next(self.deliveryIds)) if self.atLeastOnce else None
+        msg = envelope.encode(postDate, rawDataObject, correlationId, sequence, delta, deliveryId)
+        t_serialized = time.perf_counter_ns()
+        metrics.serializeTime.observe((t_serialized - t_serialize) / 1e9)
+        # a character takes at most 12 bytes in a sockJs frame (escaped surrogate pair) or 4 bytes in utf-8
+        frame = None
+        if self.maxMessageSize and len(msg) * (12 if self.sockJsFraming else 4) + 6 > self.maxMessageSize:
+            # large events are framed once to measure them, the frame is sent as is
+            frame = self.frameMessage("E", msg)
+            size = _byteSize(frame)
+            if size > self.maxMessageSize:
+                if delta is not None:
+                    # the value is not sent (delta encoded events are not split), the next event is a keyframe
+                    msbEvent.deltaEncoder.reset()
+                return self._publishSplit(msbEvent, dataObject, cached, postDate, correlationId, size, future)
 
         # send event
         if self.connected and self.registered:
+            tracker = self.ackTracker
+            if tracker is not None:
+                if future is None:
+                    future = PublishFuture(eventId)
+                future.msg = msg
+                # wait for room in the window, but never in the websocket thread delivering the acknowledgements
+                self._expireInFlight(tracker.waitForWindow(threading.current_thread() is not self.wsThread))
+            batcher = self.batcher
             try:
-                if self.sockJsFraming:
-                    _msg = self.objectToJson(msg).replace("\\n", "")
-                    self.ws.send('["E ' + _msg[1:-1] + '"]')
+                if frame is None:
+                    frame = self.frameMessage("E", msg)
+                t_send = time.perf_counter_ns()
+                if tracker is None:
+                    self._sendEvent(frame, msbEvent.priority, batcher)
                 else:
-                    self.ws.send("E " + msg)
-                logging.debug("SENDING: " + msg)
-            except Exception:
-                logging.exception(self, "Error, could not send message...")
-                pass
+                    # the order of the in-flight events has to match the order on the connection
+                    with self.ackLock:
+                        tracker.track(future)
+                        self._sendEvent(frame, msbEvent.priority, batcher)
+                    metrics.inFlight.set(len(tracker))
+                t_end = time.perf_counter_ns()
+                if batcher is None:
+                    # batched events are counted when they are written
+                    metrics.sendTime.observe((t_end - t_send) / 1e9)
+                    metrics.sent.inc()
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("SENDING: %s", Preview(msg))
+                stages = (("frame", t_send - t_serialized), ("send", t_end - t_send))
+            except Exception as e:
+                metrics.sendErrors.inc()
+                if tracker is not None:
+                    tracker.remove(future)
+                    if self.atLeastOnce and self.eventCacheEnabled:
+                        self._requeue([future], False)
+                    else:
+                        future.setError(e)
+                errorLog.exception("Error, could not send message...")
+                t_end = time.perf_counter_ns()
+                stages = (("send", t_end - t_serialized),)
         else:
             # or cache event if not connected
             if self.eventCacheEnabled and cached:
-                logging.debug(
-                    "Not connected and/or registered, putting event in cache."
-                )
-                if len(self.eventCache) < self.eventCacheSize:
-                    self.eventCache.append(msg)
-                else:
-                    self.eventCache.pop(0)
-                    self.eventCache.append(msg)
+                logger.debug("Not connected and/or registered, putting event in cache.")
+                if future is not None:
+                    future.msg = msg
+                metrics.cached.inc()
+                self.eventCache.append(msg, future, eventId, msbEvent.priority)
+                self._updateCacheMetrics()
             elif cached and not self.eventCacheEnabled:
-                logging.debug(
-                    "Global cache disabled, message cache flag overridden and discarded."
+                metrics.discarded.inc()
+                logger.debug("Global cache disabled, message cache flag overridden and discarded.")
+                if future is not None:
+                    future.setError("Event " + str(eventId) + " discarded while not connected")
+            else:
+                metrics.discarded.inc()
+                logger.debug("Caching disabled, message discarded.")
+                if future is not None:
+                    future.setError("Event " + str(eventId) + " discarded while not connected")
+            t_end = time.perf_counter_ns()
+            stages = (("cache", t_end - t_serialized),)
+        metrics.publishTime.observe((t_end - t_start) / 1e9)
+        if self.profilingHooks and self._sampleProfiling():
+            timings = [
+                ("build", t_validate - t_start),
+                ("validate", t_serialize - t_validate),
+                ("serialize", t_serialized - t_serialize),
+            ]
+            timings.extend(stages)
+            for hook in self.profilingHooks:
+                hook.onPublish(eventId, timings)
+        return msg
+
+    def _encodeValue(self, msbEvent, dataObject):
+        """Encodes the value of an event as json."""
+        if msbEvent.df is bytes and isBytesLike(dataObject):
+            # binary data is base64 encoded directly from the buffer
+            return encodeBytes(dataObject)
+        if isNumericArray(dataObject):
+            # numeric arrays (numpy, array.array, memoryview) are encoded at once
+            return encodeNumericArray(dataObject)
+        if msbEvent.serializer is not None:
+            # complex values are encoded by the serializer generated for the data format
+            return msbEvent.serializer(dataObject)
+        return json.dumps(dataObject, default=_jsonDefault, separators=(",", ":"))
+
+    def _frameSize(self, msg):
+        """Get the size in bytes of the websocket frame of an event message (including the sockJs escaping)."""
+        return _byteSize(self.frameMessage("E", msg))
+
+    def _publishSplit(self, msbEvent, dataObject, cached, postDate, correlationId, size, future=None):
+        """Publishes an array event exceeding the max message size as several events.
+
+        The parts have the same post date and correlation id (generated if not provided)
+        and their sequence index and count.
+        """
+        if not msbEvent.isArray or dataObject is None or len(dataObject) < 2:
+            raise Exception(
+                "Event " + str(msbEvent.eventId) + " exceeds the max message size ("
+                + str(size) + " > " + str(self.maxMessageSize) + " bytes)"
+            )
+        if correlationId is None:
+            correlationId = str(uuid.uuid4())
+        # split the items into ranges (starting with an estimate) until the encoded parts fit
+        # the parts are measured with the longest delivery id (see _publishEvent)
+        deliveryId = self.deliveryPrefix + "9" * 20 if self.atLeastOnce else None
+        estimate = min(len(dataObject), size * 10 // (self.maxMessageSize * 9) + 1)
+        step = -(-len(dataObject) // estimate)
+        ranges = [(i, min(i + step, len(dataObject))) for i in range(0, len(dataObject), step)]
+        parts = []
+        while ranges:
+            start, end = ranges.pop(0)
+            rawDataObject = self._encodeValue(msbEvent, dataObject[start:end])
+            partSize = self._frameSize(
+                msbEvent.envelope.encode(
+                    postDate, rawDataObject, correlationId, (len(dataObject), len(dataObject)), None, deliveryId
                 )
+            )
+            if partSize <= self.maxMessageSize:
+                parts.append(rawDataObject)
+            elif end - start > 1:
+                middle = (start + end) // 2
+                ranges[0:0] = [(start, middle), (middle, end)]
             else:
-                logging.debug("Caching disabled, message discarded.")
+                raise Exception(
+                    "Item " + str(start) + " of event " + str(msbEvent.eventId) + " exceeds the max message size ("
+                    + str(partSize) + " > " + str(self.maxMessageSize) + " bytes)"
+                )
+        self.metrics.splitEvents.labels(msbEvent.eventId).inc()
+        logger.debug("Splitting event %s (%s bytes) into %s events", msbEvent.eventId, size, len(parts))
+        for index, rawDataObject in enumerate(parts):
+            msg = self._publishEvent(
+                msbEvent.eventId, None, None, cached, json.loads(postDate), correlationId, rawDataObject,
+                (index, len(parts)), future if index == len(parts) - 1 else None
+            )
+        return msg
+
+    def addChunkedEvent(
+        self,
+        eventId,
+        event_name=None,
+        event_description=None,
+        event_priority=0,
+    ):
+        """Adds an event for large blobs, which are sent in chunks by :func:`publishChunked`.
+
+        The data format is generated as complex data format with the chunk 'index', the number of chunks 'count'
+        and the (base64 encoded) chunk 'data'.
+
+        Args:
+            eventId (str): The event id
+            event_name (str): The name of the event
+            event_description (str): The description of the event
+            event_priority (str, int): The priority of the event (LOW,MEDIUM,HIGH) or (0,1,2)
+        """
+        self.addEvent(
+            eventId, event_name, event_description, createChunkDataFormat(str(eventId) + "Chunk"), event_priority, False
+        )
+        self.chunkedEvents.add(eventId)
+
+    def publishChunked(
+        self,
+        eventId,
+        blob,
+        chunkSize=CHUNK_SIZE,
+        priority=None,
+        cached=False,
+        correlationId=None,
+    ):
+        """Publishes a blob as sequence of chunk events with the same correlation id.
+
+        Every chunk counts as an event for the rate limits (see :func:`setRateLimit`), chunks exceeding a limit
+        are handled by its action like other events, but are never conflated with each other.
+
+        Args:
+            eventId (str): The event id of an event added by :func:`addChunkedEvent`
+            blob (:obj:): The binary data (bytes, bytearray or memoryview)
+            chunkSize (int): The max size of a chunk in bytes (before base64 encoding)
+            priority (str, int): The priority of the event (LOW,MEDIUM,HIGH) or (0,1,2)
+            cached (bool): Specifies wether this event will be added to cache if MSB is currently not reachable
+            correlationId (str): The correlation id of the chunks (generated if not provided)
+        Returns:
+            PublishFuture: The future completed by the acknowledgements of all chunks if acknowledgements are
+                enabled (see :func:`enableAcknowledgements`), it fails with the first failed chunk.
+                Otherwise the correlation id of the chunks
+        """
+        if eventId not in self.chunkedEvents:
+            raise Exception("Event is not a chunked event: " + str(eventId))
+        if correlationId is None:
+            correlationId = str(uuid.uuid4())
+        chunks = splitChunks(blob, chunkSize)
+        futures = [PublishFuture(eventId) for chunk in chunks] if self.ackTracker is not None else None
+        for index, chunk in enumerate(chunks):
+            future = futures[index] if futures is not None else None
+            rawDataObject = encodeChunk(index, len(chunks), chunk)
+            if self.rateLimited and not self._admit(
+                eventId, (eventId, None, priority, cached, None, correlationId, rawDataObject, future),
+                (eventId, correlationId, index)
+            ):
+                continue
+            self._publishEvent(eventId, None, priority, cached, None, correlationId, rawDataObject, future=future)
+        return correlationId if futures is None else combineFutures(eventId, futures)
+
+    def addChunkedFunction(
+        self,
+        functionId,
+        function_name=None,
+        function_description=None,
+        fnpointer=None,
+        responseEvents=None,
+        timeout=60.0,
+    ):
+        """Adds a function receiving blobs in chunks (see :func:`publishChunked`).
+
+        The chunks of incoming calls are reassembled by their correlation id. The implementation is called once
+        with the blob as bytes in the parameter 'dataObject' when all chunks were received.
+
+        Args:
+            functionId (str): The function id
+            function_name (str): The name of the function
+            function_description (str): The description of the function
+            fnpointer (:func:): The function implementation to be called with the reassembled blob
+            responseEvents (:obj: list of event ids): The list of event IDs to be send as response events
+            timeout (float): Incomplete blobs without new chunks are dismissed after this time in s
+        """
+        assembler = ChunkAssembler(timeout)
+
+        def _assembleChunks(functionParameters):
+            correlationId = functionParameters.get("correlationId")
+            blob = assembler.add(correlationId, functionParameters["dataObject"])
+            if blob is not None:
+                fnpointer({"dataObject": blob, "correlationId": correlationId})
+
+        self.addFunction(
+            functionId,
+            function_name,
+            function_description,
+            createChunkDataFormat(str(functionId) + "Chunk"),
+            _assembleChunks,
+            False,
+            responseEvents,
+        )
+        self.chunkAssemblers[functionId] = assembler
+
+    def addColumnarEvent(
+        self,
+        eventId,
+        event_name=None,
+        event_description=None,
+        valueDataType=DataType.DOUBLE,
+        event_priority=0,
+    ):
+        """Adds an event for blocks of time series samples to the self-description.
+
+        The data format is generated as complex data format with two parallel arrays:
+        'timestamps' (date-time) and 'values' (of the value data type).
+
+        Args:
+            eventId (str): The event id
+            event_name (str): The name of the event
+            event_description (str): The description of the event
+            valueDataType (:obj:DataType): The data type of the sample values
+            event_priority (str, int): The priority of the event (LOW,MEDIUM,HIGH) or (0,1,2)
+        """
+        block = ComplexDataFormat(str(eventId) + "Block")
+        block.addProperty("timestamps", DataType.DATETIME, True)
+        block.addProperty("values", valueDataType, True)
+        self.addEvent(eventId, event_name, event_description, block, event_priority, False)
+        self.columnarEvents[eventId] = valueDataType
+
+    def publishColumnar(
+        self,
+        eventId,
+        timestamps,
+        values,
+        priority=None,
+        cached=False,
+        correlationId=None,
+    ):
+        """Publishes a block of time series samples of a columnar event as one event.
+
+        Instead of one event (with its own uuid, eventId, priority and postDate) per sample,
+        the samples are sent as parallel arrays in a single dataObject, which counts as one event
+        for the rate limits (see :func:`setRateLimit`).
+
+        Args:
+            eventId (str): The event id of an event added by :func:`addColumnarEvent`
+            timestamps (list): The sample timestamps (datetime, iso string or epoch seconds)
+            values (:obj:): The sample values (list, numpy array, array.array or memoryview)
+            priority (str, int): The priority of the event (LOW,MEDIUM,HIGH) or (0,1,2)
+            cached (bool): Specifies wether this event will be added to cache if MSB is currently not reachable
+            correlationId (str): The correlation id of the event used to idetify events in multi-step flows
+        Returns:
+            dict: The number of samples, the event size and the bytes saved per sample
+            compared to publishing one event per sample (None if the event was throttled by the rate limit)
+        """
+        if eventId not in self.columnarEvents:
+            raise Exception("Event is not a columnar event: " + str(eventId))
+        if len(timestamps) != len(values):
+            raise Exception(
+                "Number of timestamps (" + str(len(timestamps))
+                + ") and values (" + str(len(values)) + ") differ"
+            )
+        timestamps = [_formatTimestamp(ts) for ts in timestamps]
+        validationMode = self._decideValidation(eventId)
+        if validationMode is not None:
+            valueDataType = self.columnarEvents[eventId]
+            valid = validateValueForSimpleDataformat(
+                values,
+                convertDataType(valueDataType),
+                True,
+                DataFormat(valueDataType, True).getDataFormat(),
+            )
+            validationMode.report(valid)
+            if not valid:
+                self.metrics.validationFailures.labels(eventId).inc()
+        if isNumericArray(values):
+            encodedValues = encodeNumericArray(values)
+        else:
+            encodedValues = json.dumps(values, default=_jsonDefault, separators=(",", ":"))
+        rawDataObject = (
+            '{"timestamps":' + json.dumps(timestamps, separators=(",", ":"))
+            + ',"values":' + encodedValues + "}"
+        )
+        if self.rateLimited and not self._admit(
+            eventId, (eventId, None, priority, cached, None, correlationId, rawDataObject, None)
+        ):
+            return None
+        msg = self._publishEvent(eventId, None, priority, cached, None, correlationId, rawDataObject)
+
+        samples = len(timestamps)
+        stats = {"samples": samples, "bytes": len(msg)}
+        if samples > 0:
+            # size of the first sample published as single event
+            single = self.events[eventId].envelope.encode(
+                json.dumps(timestamps[0]), json.dumps(values[0], default=_jsonDefault), correlationId
+            )
+            stats["bytesPerSample"] = len(msg) / samples
+            stats["individualBytesPerSample"] = len(single)
+            stats["bytesSavedPerSample"] = stats["individualBytesPerSample"] - stats["bytesPerSample"]
+            self.metrics.columnarBytesSaved.labels(eventId).set(stats["bytesSavedPerSample"])
+        return stats
+
+    def addAggregatedEvent(
+        self,
+        eventId,
+        event_name=None,
+        event_description=None,
+        window=1.0,
+        slide=None,
+        windowType=TIME,
+        event_priority=0,
+        cached=False,
+    ):
+        """Adds an event publishing the count, min, max, mean and standard deviation of numeric samples per window
+        instead of the samples (see :func:`aggregate`).
+
+        The data format is generated as complex data format with the properties 'windowStart', 'windowEnd' (date-time),
+        'count', 'min', 'max', 'mean' and 'stddev'.
+        Windows by time are completed by the scheduler (see :func:`schedule`), windows by count by :func:`aggregate`.
+
+        Args:
+            eventId (str): The event id
+            event_name (str): The name of the event
+            event_description (str): The description of the event
+            window (float, int): The window size in s (windows by time) or samples (windows by count)
+            slide (float, int): The distance of sliding windows, the window size has to be a multiple of it
+                (default: the window size, tumbling windows)
+            windowType (str): Windows by time or count
+            event_priority (str, int): The priority of the event (LOW,MEDIUM,HIGH) or (0,1,2)
+            cached (bool): Specifies wether the window results will be added to cache if MSB is not reachable
+        """
+        aggregator = WindowAggregator(window, slide, windowType)
+        dataFormat = createWindowDataFormat(str(eventId) + "Window")
+        self.addEvent(eventId, event_name, event_description, dataFormat, event_priority, False)
+        self.aggregatedEvents[eventId] = (aggregator, cached)
+        # the window results are generated in the data format, so they are not validated
+        self.setValidationMode("off", eventId=eventId)
+        if windowType == TIME:
+            self.schedule(eventId, aggregator.slide, aggregator.tick, cached=cached)
+
+    def aggregate(self, eventId, value):
+        """Adds samples to the window of an aggregated event, window results are published when windows are complete.
+
+        Args:
+            eventId (str): The event id of an event added by :func:`addAggregatedEvent`
+            value (:obj:): The sample (number) or samples (numpy array, array.array, memoryview, list or tuple)
+        """
+        try:
+            aggregator, cached = self.aggregatedEvents[eventId]
+        except KeyError:
+            raise Exception("Event is not an aggregated event: " + str(eventId))
+        for dataObject in aggregator.add(value):
+            self.publish(eventId, dataObject, cached=cached)
+
+    def getAggregationStats(self):
+        """Get the number of samples and windows of the aggregated events.
+
+        Returns:
+            dict: The statistics per event id
+        """
+        return {eventId: aggregator.getStats() for eventId, (aggregator, cached) in self.aggregatedEvents.items()}
+
+    def enableDeltaEncoding(self, eventId, deltaEncoding=True, keyframeEvery=100):
+        """Enables or disables the delta encoding of the values of a complex event.
+
+        Instead of the full value, only the properties changed since the last published value are sent
+        as json merge patch (RFC 7386, null for removed properties), marked with "delta": true.
+        Every keyframeEvery events and after a connection loss the full value is sent.
+        All events carry a "deltaSequence" number, consumers restore the values with :class:`DeltaDecoder`.
+
+        Args:
+            eventId (str): The event id of an event with an object data format
+            deltaEncoding (bool): Used to either enable (true) or disable (false) the delta encoding
+            keyframeEvery (int): Every this number of events the full value is sent
+        """
+        msbEvent = self.events[eventId]
+        if deltaEncoding:
+            if msbEvent.isArray:
+                raise Exception("Delta encoding is not supported for array events: " + str(eventId))
+            msbEvent.deltaEncoder = DeltaEncoder(msbEvent.dataFormat, keyframeEvery)
+        else:
+            msbEvent.deltaEncoder = None
+
+    def getDeltaStats(self):
+        """Get the number of keyframes and patches and the sent bytes compared to full values per delta encoded event.
+
+        Returns:
+            dict: The statistics per event id
+        """
+        return {
+            eventId: event.deltaEncoder.getStats()
+            for eventId, event in self.events.items() if event.deltaEncoder is not None
+        }
+
+    def _validateEventValue(self, event, value):
+        """Validates the value of an event by the selected validation engine (see :func:`setValidationEngine`)."""
+        if self.validationEngine != "compiled":
+            return self.validateValueForDataFormat(value, event.df, event.dataFormat, event.isArray)
+        if event.validator is not None and event.validator(value):
+            return True
+        return self.validateValueForDataFormat(value, event.df, event.dataFormat, event.isArray, STRICT_FORMAT_CHECKER)
 
     @staticmethod
-    def validateValueForDataFormat(value, df, dataFormat, isArray):
+    def validateValueForDataFormat(value, df, dataFormat, isArray, formatChecker=None):
         """Validate the event value to match the specified data format
 
         Args:
@@ -682,12 +1944,15 @@ class MsbClient():
             df (:obj:): The (short) data format of the event
             dataFormat (:obj:): The (complex) data format of the event
             isArray (bool): Specifies wether this event will be added to cache if MSB is currently not reachable
+            formatChecker (:obj:jsonschema.FormatChecker): The format checker of complex data formats
+                (default: the default format checker of jsonschema)
         """
         if isinstance(df, ComplexDataFormat):
             if validateValueForComplexDataformat(
                 value,
                 dataFormat,
                 isArray,
+                formatChecker,
             ):
                 return True
             else:
@@ -697,6 +1962,7 @@ class MsbClient():
                 value,
                 df,
                 isArray,
+                dataFormat,
             ):
                 return True
             else:
@@ -731,9 +1997,7 @@ class MsbClient():
         if key in self.configuration["parameters"]:
             return self.configuration["parameters"][key]["value"]
         else:
-            logging.warning(
-                "Cannot get config param for unknown key: " + str(key)
-            )
+            logger.warning("Cannot get config param for unknown key: %s", key)
             raise Exception("Cannot get config param for unknown key: " + str(key))
 
     def changeConfigParameter(self, key, value):
@@ -750,24 +2014,79 @@ class MsbClient():
                 if self.connected and self.registered:
                     self.reRegister()
             else:
-                logging.warning(
-                    "Cannot change config param. Value is already set!"
-                )
+                logger.warning("Cannot change config param. Value is already set!")
         else:
-            logging.warning(
-                "Cannot change config param for unknown key: " + str(key)
-            )
+            logger.warning("Cannot change config param for unknown key: %s", key)
 
     def reRegister(self):
         """Performs a new registration to update the self-description on MSB."""
-        logging.debug("Reregistering after configuration parameter change...")
-        if self.sockJsFraming:
-            _selfd = json.dumps(self.objectToJson(self.getSelfDescription())).replace(
-                "\\n", ""
-            )
-            self.ws.send('["R ' + _selfd[1:-1] + '"]')
+        logger.debug("Reregistering after configuration parameter change...")
+        self.sendSelfDescription()
+
+    def _send(self, frame):
+        """Sends a message via the websocket connection (compressed if permessage-deflate was negotiated)."""
+        deflate = self.deflate
+        if deflate is None:
+            self.ws.send(frame)
         else:
-            self.ws.send("R " + self.objectToJson(self.getSelfDescription()))
+            deflate.sendText(self.ws.sock, frame)
+
+    def _sendEvent(self, frame, priority, batcher):
+        """Sends a framed event directly or with the next batch of the micro batching."""
+        if batcher is None:
+            self._send(frame)
+        else:
+            batcher.submit(frame, priority)
+
+    def _sendBatch(self, frames):
+        """Writes a batch of framed messages at once (see :func:`enableMicroBatching`).
+
+        With sockJs framing the messages are joined into one sockJs frame, otherwise the websocket frames
+        are written with a single send call.
+        """
+        metrics = self.metrics
+        t_send = time.perf_counter_ns()
+        try:
+            if len(frames) == 1:
+                self._send(frames[0])
+            elif self.sockJsFraming:
+                # a sockJs frame is a json array of messages
+                self._send("[" + ",".join([frame[1:-1] for frame in frames]) + "]")
+            elif self.deflate is not None:
+                for frame in frames:
+                    self._send(frame)
+            else:
+                sock = self.ws.sock
+                data = []
+                for frame in frames:
+                    abnf = websocket.ABNF.create_frame(frame, websocket.ABNF.OPCODE_TEXT)
+                    if sock.get_mask_key:
+                        abnf.get_mask_key = sock.get_mask_key
+                    data.append(abnf.format())
+                with sock.lock:
+                    sock.sock.sendall(b"".join(data))
+        except Exception:
+            metrics.sendErrors.inc(len(frames))
+            errorLog.exception("Error, could not send batch of %s events...", len(frames))
+            return
+        metrics.sendTime.observe((time.perf_counter_ns() - t_send) / 1e9)
+        metrics.sent.inc(len(frames))
+        metrics.batchSize.observe(len(frames))
+
+    def frameMessage(self, messageType, msg):
+        """Frames a json message for the websocket interface (with or without sockJs framing).
+
+        Args:
+            messageType (str): The message type prefix (e.g. 'E' for events, 'R' for registrations)
+            msg (str): The json message
+        Returns:
+            str: The frame to be sent
+        """
+        if self.sockJsFraming:
+            # drop the line breaks of indented json before escaping (line breaks in strings are escaped already)
+            _msg = json.dumps(msg.replace("\n", ""))
+            return '["' + messageType + " " + _msg[1:-1] + '"]'
+        return messageType + " " + msg
 
     def objectToJson(self, object):
         """Converts a python object into a json object.
@@ -775,7 +2094,7 @@ class MsbClient():
          Returns:
             json object: The resulting json object
         """
-        return json.dumps(object, default=lambda o: o.__dict__, indent=4)
+        return json.dumps(object, default=_jsonDefault, indent=4)
 
     def jsonToObject(self, json):
         """Converts a json into a python object.
@@ -785,6 +2104,29 @@ class MsbClient():
         """
         return json.loads(object)
 
+    def getMetrics(self):
+        """Get a snapshot of the client metrics (publishing, validation, cache, inbound messages, connection).
+
+        Returns:
+            dict: Per metric name the type, help text and the samples of all label combinations
+        """
+        return self.metrics.getSnapshot()
+
+    def startMetricsServer(self, port=9464, host="127.0.0.1"):
+        """Starts a local http server providing the client metrics in prometheus text format on /metrics.
+
+        Args:
+            port (int): The port of the http server (0 selects a free port)
+            host (str): The interface the http server is bound to
+        Returns:
+            int: The port the http server is listening on
+        """
+        return self.metrics.startHttpServer(port, host)
+
+    def stopMetricsServer(self):
+        """Stops the local metrics http server."""
+        self.metrics.stopHttpServer()
+
     def getSelfDescription(self):
         """Generate the self description JSON object of the application or smart object."""
         self_description = {}
@@ -799,9 +2141,14 @@ class MsbClient():
             current_e_props = []
             # fix serialization issues "AttributeError: 'mappingproxy' object has no attribute '__dict__'"
             # caused by property "df" directly holding python datatypes (int, str, bool, ...)
-            # Workaround: Deep copy event, set string value to property "df" before serializing
-            msbEvent = copy.deepcopy(self.events[event])
+            # Workaround: Copy event, set string value to property "df" before serializing
+            # (the last published value is not part of the self description, so it is not copied)
+            msbEvent = copy.copy(self.events[event])
             msbEvent.df = "non-serializable-workaround"
+            msbEvent.dataObject = None
+            msbEvent.envelope = None
+            msbEvent.rateLimiter = None
+            msbEvent.deltaEncoder = None
             e = json.loads(
                 json.dumps(msbEvent, default=lambda o: o.__dict__, indent=4)
             )
@@ -818,11 +2165,11 @@ class MsbClient():
                 current_e_props.append(key)
             for key in current_e_props:
                 if key not in e_props:
-                    # logging.warning(self, 'Remove key from event if invalid in self description: ' + key)
+                    # logger.warning('Remove key from event if invalid in self description: %s', key)
                     try:
                         del e[key]
                     except Exception:
-                        logging.exception(self, "Key not found: " + key)
+                        logger.exception("Key not found: %s", key)
             _ev.append(e)
         self_description["events"] = _ev
         _fu = []
@@ -849,7 +2196,7 @@ class MsbClient():
 
     def readConfig(self):
         """Helper function to parse main configuration param by param name from the application.properties file"""
-        logging.info("Reading configuration from application.properties file")
+        logger.info("Reading configuration from application.properties file")
         config = None
         if self.applicationPropertiesCustomPath is None:
             config = open("application.properties", "r")
@@ -867,7 +2214,7 @@ class MsbClient():
                 elif configparam[0] == "msb.token":
                     self.token = configparam[1].rstrip()
                 elif configparam[0] == "msb.url":
-                    self.msb_url = configparam[1].rstrip()
+                    self.setEndpoints(configparam[1].rstrip())
                 elif configparam[0] == "msb.description":
                     self.description = configparam[1].rstrip()
 
@@ -886,7 +2233,7 @@ def vadilateEventDataFormat(df):
     try:
         jsonschema.Draft4Validator(schema).validate(do)
     except Exception as e:
-        logging.exception(e)
+        logger.exception(e)
         return False
     return True
 
@@ -905,18 +2252,20 @@ def vadilateFunctionDataFormat(df):
     try:
         jsonschema.Draft4Validator(schema).validate(do)
     except Exception as e:
-        logging.exception(e)
+        logger.exception(e)
         return False
     return True
 
 
-def validateValueForComplexDataformat(value, dataFormat, isArray):
+def validateValueForComplexDataformat(value, dataFormat, isArray, formatChecker=None):
     """Validate the event value to match the specified complex data format
 
     Args:
         value (:obj:): The value of the event to be validated
         dataFormat (:obj:): The (complex) data format of the event
         isArray (bool): Specifies wether this event will be added to cache if MSB is currently not reachable
+        formatChecker (:obj:jsonschema.FormatChecker): The format checker
+            (default: the default format checker of jsonschema)
     """
     schema = {}
     if isArray:
@@ -932,56 +2281,141 @@ def validateValueForComplexDataformat(value, dataFormat, isArray):
         jsonschema.validate(
             value,
             schema,
-            format_checker=jsonschema.FormatChecker(),
+            format_checker=formatChecker if formatChecker is not None else DEFAULT_FORMAT_CHECKER,
         )
         return True
     except Exception as e:
-        logging.error(
-            "Error validating event: "
-            + str(e)
-        )
+        errorLog.error("Error validating event: %s", e)
         return False
 
 
-def validateValueForSimpleDataformat(value, df, isArray):
+def validateValueForSimpleDataformat(value, df, isArray, dataFormat=None):
     """Validate the event value to match the specified simple data format
 
+    Numeric arrays (numpy arrays, array.array, memoryview) are validated by their element type and shape.
+
     Args:
         value (:obj:): The value of the event to be validated
         df (:obj:): The (short) data format of the event
         isArray (bool): Specifies wether this event will be added to cache if MSB is currently not reachable
+        dataFormat (:obj:): The (complex) data format of the event, used to check the exact format of numeric arrays
     """
+    if df is bytes:
+        # binary data can be provided as bytes, bytearray or memoryview
+        if isArray and isinstance(value, list) and all(isBytesLike(item) for item in value):
+            return True
+        if not isArray and isBytesLike(value):
+            return True
+    if isArray and isNumericArray(value):
+        error = validateNumericArray(value, getItemFormat(dataFormat, df))
+        if error is None:
+            return True
+        errorLog.error("Error validating event: %s", error)
+        return False
     if isArray:
         try:
             if all((type(item) == df) for item in value):
                 return True
             else:
-                logging.error(
-                    "Error validating event: "
-                    + "Value in list doesn't fit the required data format: "
-                    + str(value)
-                    + ", expected all items to be: "
-                    + str(df)
+                errorLog.error(
+                    "Error validating event: Value in list doesn't fit the required data format: %s"
+                    + ", expected all items to be: %s",
+                    Preview(value),
+                    df,
                 )
                 return False
         except Exception:
-            logging.error(
-                "Error validating event: "
-                + "Value ("
-                + str(value)
-                + ") is not an array as defined."
-            )
+            errorLog.error("Error validating event: Value (%s) is not an array as defined.", Preview(value))
             return False
     else:
         if type(value) == df:
             return True
-    logging.error(
-        "Error validating event: "
-        + "Value doesn't fit the required data format: "
-        + str(value)
-        + " = "
-        + str(type(value))
-        + ", expected: "
-        + str(df)
+    errorLog.error(
+        "Error validating event: Value doesn't fit the required data format: %s = %s, expected: %s",
+        Preview(value),
+        type(value),
+        df,
     )
     return False
+
+
+# expected first and last characters of json values per data format type
+RAW_DELIMITERS = {
+    "object": ("{", "}"),
+    "array": ("[", "]"),
+    "string": ('"', '"'),
+}
+
+RAW_LITERALS = {
+    "boolean": ("true", "false"),
+    "null": ("null",),
+}
+
+
+def checkRawDataObject(raw, dataFormat=None):
+    """Checks shallowly if a json encoded value is well-formed for the data format.
+
+    Only the first and last characters (or the whole literal for numbers and booleans) are checked,
+    the value is not parsed.
+
+    Args:
+        raw (str): The json encoded value
+        dataFormat (:obj:): The (complex) data format of the event
+    Returns:
+        str: None if well-formed, otherwise the error description
+    """
+    raw = raw.strip()
+    if not raw:
+        return "Value is empty"
+    schema = dataFormat.get("dataObject", {}) if isinstance(dataFormat, dict) else {}
+    kind = "object" if "$ref" in schema else schema.get("type")
+    if kind in RAW_DELIMITERS:
+        first, last = RAW_DELIMITERS[kind]
+        if raw[0] != first or raw[-1] != last or len(raw) < 2:
+            return "Expected a json " + kind + ", got: " + raw[:20]
+    elif kind in RAW_LITERALS:
+        if raw not in RAW_LITERALS[kind]:
+            return "Expected a json " + kind + ", got: " + raw[:20]
+    elif kind in ("integer", "number"):
+        if raw[0] not in "-0123456789" or raw[-1] not in "0123456789":
+            return "Expected a json " + kind + ", got: " + raw[:20]
+    elif raw[0] + raw[-1] not in ("{}", "[]", '""') and raw[-1] not in "0123456789el":
+        return "Expected a json value, got: " + raw[:20]
+    return None
+
+
+def _byteSize(text):
+    """Get the size in bytes of a text encoded as utf-8."""
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+def _jsonDefault(o):
+    """Converts objects the json module cannot serialize (binary data, numeric arrays and plain objects).
+
+    Nested memoryviews are binary data, numeric memoryviews are only encoded as arrays as the whole value.
+    """
+    if isinstance(o, BYTES_TYPES):
+        return encodeBytes(o)[1:-1]
+    if isNumericArray(o):
+        return o.tolist()
+    return o.__dict__
+
+
+def _formatTimestamp(ts):
+    """Formats a timestamp (datetime, iso string or epoch seconds) as date-time string."""
+    if isinstance(ts, str):
+        return ts
+    if isinstance(ts, (int, float)):
+        ts = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).replace(tzinfo=None)
+    return ts.isoformat(timespec="milliseconds") + "Z"
+
+
+def expandColumnar(dataObject):
+    """Expands the dataObject of a columnar event lazily into (timestamp, value) samples.
+
+    Args:
+        dataObject (dict): The dataObject with parallel 'timestamps' and 'values' arrays
+    Returns:
+        iterator: The (timestamp, value) tuples
+    """
+    return zip(dataObject["timestamps"], dataObject["values"])
@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+
+from .PerMessageDeflate import DeflateContext, parseExtension
+
+logger = logging.getLogger(__name__)
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+class MockConnection:
+    """A websocket connection of a client to the mock server."""
+
+    def __init__(self, server, sock, path, deflate=None):
+        self.server = server
+        self.sock = sock
+        self.path = path
+        # compression state if the permessage-deflate extension was negotiated
+        self.deflate = deflate
+        # the raw websocket interface is used without the sockJs session path
+        self.sockJsFraming = not path.rstrip("/").endswith("/websocket/data/websocket")
+        self.uuid = None
+        self.selfDescription = None
+        self.open = True
+        self.sendLock = threading.RLock()
+
+    def sendFrame(self, opcode, payload, compressed=False):
+        header = bytearray([0x80 | (0x40 if compressed else 0) | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(length)
+        elif length < 65536:
+            header.append(126)
+            header.extend(struct.pack("!H", length))
+        else:
+            header.append(127)
+            header.extend(struct.pack("!Q", length))
+        with self.sendLock:
+            self.sock.sendall(bytes(header) + payload)
+
+    def send(self, message):
+        """Sends a MSB message (e.g. 'IO_CONNECTED' or 'C {...}') with the framing used by the client.
+
+        Args:
+            message (str): The message
+        """
+        if not self.open:
+            return
+        if self.sockJsFraming:
+            message = "a" + json.dumps([message])
+        try:
+            if self.deflate is not None:
+                # the frames have to be sent in the order of the compression
+                with self.sendLock:
+                    self.sendFrame(OPCODE_TEXT, self.deflate.compress(message.encode("utf-8")), True)
+            else:
+                self.sendFrame(OPCODE_TEXT, message.encode("utf-8"))
+        except OSError:
+            self.open = False
+
+    def close(self, code=1000, reason=""):
+        """Closes the websocket connection.
+
+        Args:
+            code (int): The websocket close status code
+            reason (str): The close reason
+        """
+        if not self.open:
+            return
+        self.open = False
+        try:
+            self.sendFrame(OPCODE_CLOSE, struct.pack("!H", code) + reason.encode("utf-8"))
+        except OSError:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _recvExactly(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise EOFError()
+            data.extend(chunk)
+        return bytes(data)
+
+    def readFrame(self):
+        b1, b2 = self._recvExactly(2)
+        fin = b1 & 0x80
+        rsv1 = b1 & 0x40
+        opcode = b1 & 0x0F
+        length = b2 & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._recvExactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._recvExactly(8))[0]
+        mask = self._recvExactly(4) if b2 & 0x80 else None
+        payload = self._recvExactly(length)
+        if mask is not None:
+            payload = _unmask(payload, mask)
+        return fin, rsv1, opcode, payload
+
+    def readMessages(self):
+        """Yields the text messages received from the client (already reassembled)."""
+        fragments = []
+        compressed = False
+        while self.open:
+            fin, rsv1, opcode, payload = self.readFrame()
+            if opcode == OPCODE_CLOSE:
+                self.close()
+                return
+            elif opcode == OPCODE_PING:
+                self.sendFrame(OPCODE_PONG, payload)
+            elif opcode == OPCODE_PONG:
+                continue
+            else:
+                self.server.receivedBytes += len(payload)
+                if opcode != OPCODE_CONTINUATION:
+                    compressed = bool(rsv1)
+                if compressed:
+                    if self.deflate is None:
+                        raise ValueError("Compressed frame without permessage-deflate")
+                    payload = self.deflate.decompress(payload, bool(fin))
+                fragments.append(payload)
+                if fin:
+                    data = b"".join(fragments)
+                    fragments = []
+                    yield data.decode("utf-8")
+
+
+def _unmask(payload, mask):
+    # xor the payload with the repeated 4 byte mask as one big integer
+    length = len(payload)
+    key = (mask * (length // 4 + 1))[:length]
+    return (
+        int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")
+    ).to_bytes(length, "big")
+
+
+class MsbMockServer:
+    """Lightweight in-process stand-in for the MSB websocket interface (for tests and load generation).
+
+    Supports sockJs framed and raw websocket connections, answers registrations, records received events
+    and can inject function calls and configuration changes.
+    Latency, dropped events and NIO_* errors can be simulated.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        """Initializes a new mock server.
+
+        Args:
+            host (str): The interface the server is bound to
+            port (int): The port of the server (0 selects a free port)
+        """
+        self.host = host
+        self.port = port
+        self.connections = []
+        self.events = []
+        self.registrations = []
+        self.messages = []
+        # simulation settings
+        self.latency = 0
+        self.dropRate = 0.0
+        self.acknowledgeEvents = True
+        self.eventErrorRate = 0.0
+        self.eventError = "NIO_EVENT_FORWARDING_ERROR"
+        self.registrationErrors = []
+        self.recordMessages = False
+        # accept the permessage-deflate extension if offered by the client
+        self.permessageDeflate = True
+        self.deflateNoContextTakeover = False
+        # payload bytes of the data frames received (after compression)
+        self.receivedBytes = 0
+        self.sock = None
+        self.running = False
+        self.condition = threading.Condition()
+
+    @property
+    def url(self):
+        return "ws://" + self.host + ":" + str(self.port)
+
+    def start(self):
+        """Starts the server in a daemon thread.
+
+        Returns:
+            str: The websocket url of the server
+        """
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.port = self.sock.getsockname()[1]
+        self.sock.listen(64)
+        self.running = True
+        t = threading.Thread(target=self._acceptLoop)
+        t.daemon = True
+        t.start()
+        return self.url
+
+    def stop(self):
+        """Closes all connections and stops the server."""
+        self.running = False
+        self.closeConnections()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def closeConnections(self, code=1000, reason="mock server closed connection"):
+        """Closes all client connections (e.g. to simulate an outage).
+
+        Args:
+            code (int): The websocket close status code
+            reason (str): The close reason
+        """
+        for connection in list(self.connections):
+            connection.close(code, reason)
+
+    def failNextRegistrations(self, count=1, error="NIO_REGISTRATION_ERROR"):
+        """Answers the next registrations with an error instead of IO_REGISTERED.
+
+        Args:
+            count (int): The number of registrations to fail
+            error (str): The error message (e.g. NIO_REGISTRATION_ERROR, NIO_UNAUTHORIZED_CONNECTION)
+        """
+        self.registrationErrors.extend([error] * count)
+
+    def broadcast(self, message):
+        """Sends a MSB message to all connected clients.
+
+        Args:
+            message (str): The message (e.g. 'ping' or 'NIO_UNEXPECTED_EVENT_FORWARDING_ERROR')
+        """
+        for connection in list(self.connections):
+            connection.send(message)
+
+    def sendFunctionCall(self, functionId, functionParameters=None, correlationId=None, uuid=None):
+        """Injects a function call (C message) to the connected clients.
+
+        Args:
+            functionId (str): The function id
+            functionParameters (dict): The function parameters (e.g. {'dataObject': ...})
+            correlationId (str): The correlation id of the call
+            uuid (str): Only call the client with this uuid
+        """
+        call = {
+            "uuid": uuid,
+            "functionId": functionId,
+            "functionParameters": functionParameters if functionParameters is not None else {},
+        }
+        if correlationId is not None:
+            call["correlationId"] = correlationId
+        message = "C " + json.dumps(call)
+        for connection in list(self.connections):
+            if uuid is None or connection.uuid == uuid:
+                connection.send(message)
+
+    def sendConfiguration(self, params, uuid=None):
+        """Injects a configuration change (K message) to the connected clients.
+
+        Args:
+            params (dict): The changed configuration parameters (key -> value)
+            uuid (str): Only send to the client with this uuid
+        """
+        for connection in list(self.connections):
+            if uuid is None or connection.uuid == uuid:
+                connection.send("K " + json.dumps({"uuid": connection.uuid, "params": params}))
+
+    def waitForEvents(self, count, timeout=10):
+        """Waits until the given number of events was received.
+
+        Args:
+            count (int): The number of events
+            timeout (float): The max time to wait in s
+        Returns:
+            bool: True if the events were received in time
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.events) >= count, timeout)
+
+    def waitForRegistration(self, count=1, timeout=10):
+        """Waits until the given number of registrations was received.
+
+        Args:
+            count (int): The number of registrations
+            timeout (float): The max time to wait in s
+        Returns:
+            bool: True if the registrations were received in time
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.registrations) >= count, timeout)
+
+    def reset(self):
+        """Clears the recorded events, registrations and messages."""
+        with self.condition:
+            self.events = []
+            self.registrations = []
+            self.messages = []
+            self.receivedBytes = 0
+
+    def _acceptLoop(self):
+        while self.running:
+            try:
+                sock, address = self.sock.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            t = threading.Thread(target=self._serve, args=(sock,))
+            t.daemon = True
+            t.start()
+
+    def _handshake(self, sock):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise EOFError()
+            request += chunk
+        lines = request.split(b"\r\n\r\n")[0].decode("latin-1").split("\r\n")
+        path = lines[0].split(" ")[1]
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        accept = base64.b64encode(
+            hashlib.sha1((headers["sec-websocket-key"] + WS_GUID).encode("ascii")).digest()
+        ).decode("ascii")
+        response = [
+            "HTTP/1.1 101 Switching Protocols",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            "Sec-WebSocket-Accept: " + accept,
+        ]
+        deflate = None
+        offer = parseExtension(headers.get("sec-websocket-extensions"))
+        if self.permessageDeflate and offer is not None:
+            extension, deflate = self._negotiateDeflate(offer)
+            response.append("Sec-WebSocket-Extensions: " + extension)
+        sock.sendall(("\r\n".join(response) + "\r\n\r\n").encode("ascii"))
+        return path, headers, deflate
+
+    def _negotiateDeflate(self, offer):
+        extension = "permessage-deflate"
+        if offer.get("client_max_window_bits") is not None:
+            extension += "; client_max_window_bits=" + offer["client_max_window_bits"]
+        if "client_no_context_takeover" in offer:
+            extension += "; client_no_context_takeover"
+        windowBits = 15
+        if offer.get("server_max_window_bits") is not None:
+            windowBits = int(offer["server_max_window_bits"])
+            extension += "; server_max_window_bits=" + offer["server_max_window_bits"]
+        if self.deflateNoContextTakeover or "server_no_context_takeover" in offer:
+            extension += "; server_no_context_takeover"
+        deflate = DeflateContext(
+            windowBits,
+            compressNoContextTakeover=self.deflateNoContextTakeover or "server_no_context_takeover" in offer,
+            decompressNoContextTakeover="client_no_context_takeover" in offer,
+        )
+        return extension, deflate
+
+    def _serve(self, sock):
+        connection = None
+        try:
+            path, headers, deflate = self._handshake(sock)
+            connection = MockConnection(self, sock, path, deflate)
+            self.connections.append(connection)
+            if connection.sockJsFraming:
+                connection.sendFrame(OPCODE_TEXT, b"o")
+            connection.send("IO_CONNECTED")
+            for data in connection.readMessages():
+                if connection.sockJsFraming:
+                    if not data.startswith("["):
+                        continue
+                    messages = json.loads(data)
+                else:
+                    messages = [data]
+                for message in messages:
+                    self._handleMessage(connection, message)
+        except (EOFError, OSError, ValueError, zlib.error) as e:
+            logger.debug("Mock server connection closed: %s", e)
+        finally:
+            if connection is not None:
+                connection.open = False
+                if connection in self.connections:
+                    self.connections.remove(connection)
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _handleMessage(self, connection, message):
+        if self.recordMessages:
+            self.messages.append(message)
+        if self.latency:
+            time.sleep(self.latency)
+        if message.startswith("R "):
+            selfDescription = json.loads(message[2:])
+            if self.registrationErrors:
+                connection.send(self.registrationErrors.pop(0))
+                return
+            connection.uuid = selfDescription.get("uuid")
+            connection.selfDescription = selfDescription
+            with self.condition:
+                self.registrations.append(selfDescription)
+                self.condition.notify_all()
+            connection.send("IO_REGISTERED")
+        elif message.startswith("E "):
+            if self.dropRate and random.random() < self.dropRate:
+                return
+            if self.eventErrorRate and random.random() < self.eventErrorRate:
+                connection.send(self.eventError)
+                return
+            event = json.loads(message[2:])
+            with self.condition:
+                self.events.append(event)
+                self.condition.notify_all()
+            if self.acknowledgeEvents:
+                connection.send("IO_PUBLISHED")
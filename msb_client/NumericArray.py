@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import array
+import json
+
+# allowed element kinds (numpy dtype kind -> max itemsize) per simple data format
+ALLOWED_KINDS = {
+    "int32": {"i": 4, "u": 2},
+    "int64": {"i": 8, "u": 4},
+    "float": {"f": 4},
+    "double": {"f": 8},
+    "boolean": {"b": 1},
+}
+
+# byte string widths of the numpy formatting per element kind and size, one longer than the longest element
+NUMPY_WIDTHS = {("b", 1): 6, ("f", 2): 12, ("f", 4): 16, ("f", 8): 25}
+for _size in (1, 2, 4, 8):
+    NUMPY_WIDTHS[("i", _size)] = len(str(-2 ** (8 * _size - 1))) + 1
+    NUMPY_WIDTHS[("u", _size)] = len(str(2 ** (8 * _size) - 1)) + 1
+
+# element kinds of array.array typecodes and memoryview formats
+TYPECODE_KINDS = {
+    "b": "i", "h": "i", "i": "i", "l": "i", "q": "i", "n": "i",
+    "B": "u", "H": "u", "I": "u", "L": "u", "Q": "u", "N": "u",
+    "e": "f", "f": "f", "d": "f",
+    "?": "b",
+}
+
+
+def isNumericArray(value):
+    """Checks if the value is a numpy array, an array.array or a memoryview.
+
+    numpy is not imported, arrays are detected by their interface.
+
+    Args:
+        value (:obj:): The value to be checked
+    """
+    if isinstance(value, (array.array, memoryview)):
+        return True
+    return hasattr(value, "dtype") and hasattr(value, "ndim") and hasattr(value, "tolist")
+
+
+def getArrayKind(value):
+    """Get the element kind, element size and number of dimensions of a numeric array.
+
+    Returns:
+        tuple: (kind, itemsize, ndim) with kind as numpy dtype kind ('i', 'u', 'f', 'b') or None if unsupported
+    """
+    if isinstance(value, array.array):
+        return TYPECODE_KINDS.get(value.typecode), value.itemsize, 1
+    if isinstance(value, memoryview):
+        return TYPECODE_KINDS.get(value.format.lstrip("@=<>!")), value.itemsize, value.ndim
+    return value.dtype.kind, value.dtype.itemsize, value.ndim
+
+
+def getItemFormat(dataFormat, df=None):
+    """Get the simple format name (int32, int64, float, double, boolean, ...) of the array items.
+
+    Args:
+        dataFormat (:obj:): The (complex) data format of the event
+        df (:obj:): The (short) data format of the event, used if the data format does not define the items
+    """
+    try:
+        items = dataFormat["dataObject"]["items"]
+        if "format" in items:
+            return items["format"]
+        return {"integer": "int64", "number": "double"}.get(items["type"], items["type"])
+    except (KeyError, TypeError):
+        return {int: "int64", float: "double", bool: "boolean"}.get(df)
+
+
+def validateNumericArray(value, itemFormat):
+    """Validates a numeric array by a single element type and shape check.
+
+    Args:
+        value (:obj:): The numpy array, array.array or memoryview
+        itemFormat (str): The simple format name of the array items (e.g. int32 or double)
+    Returns:
+        str: None if valid, otherwise the error description
+    """
+    kind, itemsize, ndim = getArrayKind(value)
+    if ndim != 1:
+        return "Array has " + str(ndim) + " dimensions, expected 1"
+    allowed = ALLOWED_KINDS.get(itemFormat, {})
+    if kind not in allowed or itemsize > allowed[kind]:
+        return (
+            "Array elements of kind '" + str(kind) + "' with " + str(itemsize)
+            + " bytes do not fit the required data format: " + str(itemFormat)
+        )
+    return None
+
+
+def encodeNumericArray(value):
+    """Encodes a numeric array as json array.
+
+    numpy arrays are formatted by numpy from the buffer as fixed width byte strings (floats with the shortest
+    representation that restores the value exactly), no python objects are created per element.
+    array.array and memoryview are fetched in one call (tolist) and formatted by C level printf formatting,
+    floats with enough digits to be restored exactly (9 for float32, 17 for float64).
+    nan and inf are not valid json numbers, arrays containing them are rejected.
+
+    Args:
+        value (:obj:): The numpy array, array.array or memoryview
+    Returns:
+        str: The json array
+    """
+    kind, itemsize, ndim = getArrayKind(value)
+    width = NUMPY_WIDTHS.get((kind, itemsize))
+    if ndim == 1 and width is not None and hasattr(value, "dtype"):
+        if len(value) == 0:
+            return "[]"
+        # the last byte of every element is padding, it is replaced by the separator and the rest of the padding
+        # is removed
+        chars = value.astype("S" + str(width)).view("u1").reshape(len(value), width)
+        chars[:, -1] = 44
+        chars = chars.reshape(-1)
+        encoded = chars[chars != 0].tobytes()[:-1]
+        if kind == "b":
+            encoded = encoded.replace(b"True", b"true").replace(b"False", b"false")
+        elif kind == "f" and b"n" in encoded:
+            raise Exception("Array contains nan or inf, which are not valid json numbers")
+        return "[" + encoded.decode("ascii") + "]"
+    values = value.tolist()
+    if kind == "f" and ndim == 1:
+        if not values:
+            return "[]"
+        fmt = "%.9g" if itemsize <= 4 else "%.17g"
+        encoded = ",".join([fmt] * len(values)) % tuple(values)
+        if "n" in encoded:
+            raise Exception("Array contains nan or inf, which are not valid json numbers")
+        return "[" + encoded + "]"
+    return json.dumps(values, separators=(",", ":"))
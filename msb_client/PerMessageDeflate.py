@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import threading
+import time
+import zlib
+
+from websocket import ABNF
+
+EXTENSION_NAME = "permessage-deflate"
+
+# empty uncompressed block terminating every compressed message (RFC 7692, 7.2.1)
+TAIL = b"\x00\x00\xff\xff"
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+
+
+def parseExtension(header):
+    """Get the parameters of the permessage-deflate extension from a Sec-WebSocket-Extensions header.
+
+    Args:
+        header (str): The header value, e.g. 'permessage-deflate; client_max_window_bits=10'
+    Returns:
+        dict: The parameters (name -> value, None for parameters without value)
+            or None if the header does not contain the extension
+    """
+    if not header:
+        return None
+    for extension in header.split(","):
+        parts = [part.strip() for part in extension.split(";")]
+        if parts[0].lower() != EXTENSION_NAME:
+            continue
+        params = {}
+        for part in parts[1:]:
+            if not part:
+                continue
+            name, _, value = part.partition("=")
+            params[name.strip().lower()] = value.strip().strip('"') or None
+        return params
+    return None
+
+
+def _windowBits(value, name):
+    bits = int(value)
+    # zlib does not support raw deflate streams with 8 bit windows
+    if not 9 <= bits <= 15:
+        raise Exception("Unsupported " + name + ": " + str(value) + ", expected 9 to 15")
+    return bits
+
+
+class PerMessageDeflate:
+    """Settings of the permessage-deflate extension (RFC 7692) offered by the client."""
+
+    def __init__(self, windowBits=15, compressionLevel=6, minSize=256, noContextTakeover=False, memLevel=8):
+        """Initializes new permessage-deflate settings.
+
+        Args:
+            windowBits (int): The window size (9 to 15) of the compression of sent messages
+            compressionLevel (int): The zlib compression level (1 to 9)
+            minSize (int): Messages smaller than this size in bytes are sent uncompressed
+            noContextTakeover (bool): Compress every message on its own (less memory, lower ratio)
+            memLevel (int): The zlib memory level (1 to 9) of the compression
+        """
+        self.windowBits = _windowBits(windowBits, "window bits")
+        self.compressionLevel = compressionLevel
+        self.minSize = minSize
+        self.noContextTakeover = noContextTakeover
+        self.memLevel = memLevel
+
+    def offer(self):
+        """Get the value of the Sec-WebSocket-Extensions header of the handshake request."""
+        offer = EXTENSION_NAME + "; client_max_window_bits"
+        if self.windowBits < 15:
+            offer += "=" + str(self.windowBits)
+        if self.noContextTakeover:
+            offer += "; client_no_context_takeover"
+        return offer
+
+    def negotiate(self, response):
+        """Creates the compression state of a connection from the handshake response.
+
+        Args:
+            response (str): The Sec-WebSocket-Extensions header of the handshake response
+        Returns:
+            DeflateContext: The compression state or None if the server declined the extension
+        """
+        params = parseExtension(response)
+        if params is None:
+            return None
+        windowBits = self.windowBits
+        if params.get("client_max_window_bits") is not None:
+            windowBits = min(windowBits, _windowBits(params["client_max_window_bits"], "client_max_window_bits"))
+        return DeflateContext(
+            windowBits,
+            self.compressionLevel,
+            self.minSize,
+            self.noContextTakeover or "client_no_context_takeover" in params,
+            "server_no_context_takeover" in params,
+            self.memLevel,
+        )
+
+
+class DeflateContext:
+    """Compression state of a websocket connection using the permessage-deflate extension."""
+
+    def __init__(
+        self,
+        windowBits=15,
+        compressionLevel=6,
+        minSize=0,
+        compressNoContextTakeover=False,
+        decompressNoContextTakeover=False,
+        memLevel=8,
+    ):
+        """Initializes a new compression state.
+
+        Args:
+            windowBits (int): The window size of the compression of sent messages
+            compressionLevel (int): The zlib compression level
+            minSize (int): Messages smaller than this size in bytes are sent uncompressed
+            compressNoContextTakeover (bool): Reset the compression after every sent message
+            decompressNoContextTakeover (bool): Reset the decompression after every received message
+            memLevel (int): The zlib memory level of the compression
+        """
+        self.windowBits = windowBits
+        self.compressionLevel = compressionLevel
+        self.minSize = minSize
+        self.compressNoContextTakeover = compressNoContextTakeover
+        self.decompressNoContextTakeover = decompressNoContextTakeover
+        self.memLevel = memLevel
+        self.compressor = None
+        # received messages are decompressed with the max window, which also covers smaller windows
+        self.decompressor = zlib.decompressobj(-15)
+        # the compression and the send of a message must not interleave with other messages
+        self.lock = threading.Lock()
+        self.receivingCompressed = False
+        self.frameCompressed = False
+        # statistics of sent messages
+        self.messages = 0
+        self.compressedMessages = 0
+        self.uncompressedBytes = 0
+        self.compressedBytes = 0
+        self.compressTime = 0.0
+
+    def compress(self, data):
+        """Compresses a message.
+
+        Args:
+            data (bytes): The message payload
+        Returns:
+            bytes: The compressed payload (without the tail of the sync flush)
+        """
+        if self.compressor is None or self.compressNoContextTakeover:
+            self.compressor = zlib.compressobj(
+                self.compressionLevel, zlib.DEFLATED, -self.windowBits, self.memLevel
+            )
+        compressed = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed.endswith(TAIL):
+            compressed = compressed[:-4]
+        return compressed
+
+    def decompress(self, data, fin=True):
+        """Decompresses a (fragment of a) received message.
+
+        Args:
+            data (bytes): The compressed payload of the frame
+            fin (bool): True for the last frame of the message
+        Returns:
+            bytes: The decompressed payload
+        """
+        if fin:
+            data = data + TAIL
+        decompressed = self.decompressor.decompress(data)
+        if fin and self.decompressNoContextTakeover:
+            self.decompressor = zlib.decompressobj(-15)
+        return decompressed
+
+    def sendText(self, sock, text):
+        """Sends a text message via a websocket-client connection, compressed if it reaches the min size.
+
+        Args:
+            sock (:obj:websocket.WebSocket): The connected websocket
+            text (str): The message
+        """
+        data = text.encode("utf-8")
+        if len(data) < self.minSize:
+            sock.send(text)
+            with self.lock:
+                self.messages += 1
+                self.uncompressedBytes += len(data)
+                self.compressedBytes += len(data)
+            return
+        with self.lock:
+            start = time.perf_counter()
+            compressed = self.compress(data)
+            self.compressTime += time.perf_counter() - start
+            self.messages += 1
+            self.compressedMessages += 1
+            self.uncompressedBytes += len(data)
+            self.compressedBytes += len(compressed)
+            sock.send_frame(ABNF(fin=1, rsv1=1, opcode=ABNF.OPCODE_TEXT, data=compressed))
+
+    def install(self, sock):
+        """Decompresses the received messages of a websocket-client connection.
+
+        websocket-client rejects frames with the RSV1 bit, so the bit is taken from the frame header
+        before the frame is validated and the payload is decompressed afterwards.
+        Must be called after the handshake, before the first message is received.
+
+        Args:
+            sock (:obj:websocket.WebSocket): The connected websocket
+        """
+        frameBuffer = sock.frame_buffer
+        recvHeader = frameBuffer.recv_header
+        recvFrame = sock.recv_frame
+
+        def _recvHeader():
+            recvHeader()
+            fin, rsv1, rsv2, rsv3, opcode, hasMask, lengthBits = frameBuffer.header
+            self.frameCompressed = bool(rsv1)
+            if rsv1:
+                frameBuffer.header = (fin, 0, rsv2, rsv3, opcode, hasMask, lengthBits)
+
+        def _recvFrame():
+            frame = recvFrame()
+            if frame.opcode in (OPCODE_TEXT, OPCODE_BINARY):
+                self.receivingCompressed = self.frameCompressed
+            elif frame.opcode != OPCODE_CONTINUATION:
+                return frame
+            if self.receivingCompressed:
+                frame.data = self.decompress(frame.data, frame.fin)
+            return frame
+
+        frameBuffer.recv_header = _recvHeader
+        sock.recv_frame = _recvFrame
+
+    def getStats(self):
+        """Get the statistics of the sent messages.
+
+        Returns:
+            dict: The number of messages, compressed messages, the bytes before and after compression,
+                the compression ratio and the cpu time of the compression in s
+        """
+        with self.lock:
+            return {
+                "messages": self.messages,
+                "compressedMessages": self.compressedMessages,
+                "uncompressedBytes": self.uncompressedBytes,
+                "compressedBytes": self.compressedBytes,
+                "ratio": self.compressedBytes / self.uncompressedBytes if self.uncompressedBytes else None,
+                "compressTime": self.compressTime,
+            }
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+# event priorities by name, events can have the name or the number as priority
+PRIORITIES = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}
+
+
+def getPriority(priority):
+    """Get the number of an event priority.
+
+    Args:
+        priority (str, int): The priority (LOW,MEDIUM,HIGH) or (0,1,2)
+    Returns:
+        int: The priority as number
+    """
+    return PRIORITIES.get(priority, priority)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+from .MetricsRegistry import MetricsRegistry
+
+# stage histogram buckets (in s) from 1 us to 1 s
+STAGE_BUCKETS = (
+    0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005,
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+
+class ProfilingHook:
+    """Base class of profiling hooks, which receive per-stage timings of sampled messages.
+
+    Stage timings are provided as list of (stage name, duration in ns) tuples in the order of execution.
+    Publish stages are build, validate, serialize and frame/send (or cache if not connected).
+    Incoming function call stages are unframe, parse, dispatch and handler.
+    """
+
+    def onPublish(self, eventId, timings):
+        """Called for sampled events sent by publish.
+
+        Args:
+            eventId (str): The event id
+            timings (list): The (stage, duration in ns) tuples
+        """
+        pass
+
+    def onMessage(self, functionId, timings):
+        """Called for sampled incoming function calls.
+
+        Args:
+            functionId (str): The function id
+            timings (list): The (stage, duration in ns) tuples
+        """
+        pass
+
+
+class LatencyHistogramHook(ProfilingHook):
+    """Aggregates the stage timings in latency histograms per event and per function."""
+
+    def __init__(self, registry=None):
+        """Initializes a new latency histogram hook.
+
+        Args:
+            registry (:obj:MetricsRegistry): The registry holding the histograms, e.g. the client metrics
+                to expose them via prometheus. A separate registry is used if not provided.
+        """
+        if registry is None:
+            registry = MetricsRegistry()
+        self.stageTime = registry.histogram(
+            "msb_stage_seconds",
+            "Time spent per processing stage of sampled messages",
+            ["direction", "id", "stage"],
+            buckets=STAGE_BUCKETS,
+        )
+        self.totalTime = registry.histogram(
+            "msb_stage_total_seconds",
+            "Time spent in all processing stages of sampled messages",
+            ["direction", "id"],
+            buckets=STAGE_BUCKETS,
+        )
+
+    def _record(self, direction, id, timings):
+        total = 0
+        for stage, duration in timings:
+            total += duration
+            self.stageTime.labels(direction, id, stage).observe(duration / 1e9)
+        self.totalTime.labels(direction, id).observe(total / 1e9)
+
+    def onPublish(self, eventId, timings):
+        self._record("publish", eventId, timings)
+
+    def onMessage(self, functionId, timings):
+        self._record("message", functionId, timings)
+
+    def getSummary(self):
+        """Get count, mean and approximated percentiles (upper bucket bounds) per direction, id and stage.
+
+        Returns:
+            dict: direction -> id -> stage -> statistics (times in s)
+        """
+        summary = {}
+        for family, stageOf in ((self.stageTime, lambda labels: labels["stage"]),
+                                (self.totalTime, lambda labels: "total")):
+            for sample in family.getSamples():
+                labels = sample["labels"]
+                stats = summary.setdefault(labels["direction"], {}).setdefault(labels["id"], {})
+                stats[stageOf(labels)] = {
+                    "count": sample["count"],
+                    "mean": sample["sum"] / sample["count"] if sample["count"] else 0.0,
+                    "p50": _percentile(sample, 0.5),
+                    "p99": _percentile(sample, 0.99),
+                }
+        return summary
+
+
+def _percentile(sample, q):
+    rank = q * sample["count"]
+    for bound, count in sample["buckets"].items():
+        if count >= rank:
+            return bound
+    return float("inf")
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import collections
+import threading
+import time
+
+# guards the lazy creation of the wait events and the completion of all futures
+_lock = threading.Lock()
+
+
+class PublishFuture:
+    """Lightweight future of a published event, completed by the acknowledgement of the MSB.
+
+    The wait event is only created if somebody waits for the result.
+    """
+
+    __slots__ = ("eventId", "msg", "sentTime", "latency", "done", "error", "_event", "_callbacks")
+
+    def __init__(self, eventId, msg=None):
+        """Initializes a new future.
+
+        Args:
+            eventId (str): The event id
+            msg (str): The serialized event
+        """
+        self.eventId = eventId
+        self.msg = msg
+        self.sentTime = None
+        self.latency = None
+        self.done = False
+        self.error = None
+        self._event = None
+        self._callbacks = None
+
+    def _complete(self, error=None):
+        with _lock:
+            if self.done:
+                return False
+            self.done = True
+            self.error = error
+            event, callbacks = self._event, self._callbacks
+            self._callbacks = None
+        if event is not None:
+            event.set()
+        for callback in callbacks or ():
+            callback(self)
+        return True
+
+    def setAcknowledged(self):
+        """Completes the future as acknowledged by the MSB.
+
+        Returns:
+            bool: False if the future was already completed
+        """
+        if self.sentTime is not None:
+            self.latency = time.monotonic() - self.sentTime
+        return self._complete()
+
+    def setError(self, error):
+        """Completes the future with an error (e.g. NIO_EVENT_FORWARDING_ERROR).
+
+        Args:
+            error (str, Exception): The error
+        Returns:
+            bool: False if the future was already completed
+        """
+        return self._complete(error if isinstance(error, Exception) else Exception(error))
+
+    def addDoneCallback(self, callback):
+        """Adds a callback called with the future when it is completed (immediately if already completed)."""
+        with _lock:
+            if not self.done:
+                if self._callbacks is None:
+                    self._callbacks = []
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def result(self, timeout=None):
+        """Waits for the acknowledgement.
+
+        Args:
+            timeout (float): The max time to wait in s (None waits until the future is completed)
+        Returns:
+            float: The acknowledgement latency in s (None if the event was not sent by the client)
+        """
+        if not self.done:
+            with _lock:
+                if not self.done and self._event is None:
+                    self._event = threading.Event()
+                event = self._event
+            if event is not None and not event.wait(timeout):
+                raise Exception("Event " + str(self.eventId) + " not acknowledged within " + str(timeout) + " s")
+        if self.error is not None:
+            raise self.error
+        return self.latency
+
+
+def combineFutures(eventId, futures):
+    """Creates a future completed when all futures are completed (e.g. of the chunks of a blob).
+
+    The combined future fails with the first error, otherwise its latency is the max latency of the futures.
+
+    Args:
+        eventId (str): The event id
+        futures (list): The futures
+    Returns:
+        PublishFuture: The combined future
+    """
+    combined = PublishFuture(eventId)
+    remaining = [len(futures)]
+
+    def onDone(future):
+        if future.error is not None:
+            combined.setError(future.error)
+            return
+        with _lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            combined.latency = max((f.latency for f in futures if f.latency is not None), default=None)
+            combined.setAcknowledged()
+
+    for future in futures:
+        future.addDoneCallback(onDone)
+    return combined
+
+
+class AckTracker:
+    """Correlates the acknowledgements of the MSB with the sent events in FIFO order.
+
+    The MSB acknowledges events in the order they were sent (IO_PUBLISHED or NIO_*_EVENT_FORWARDING_ERROR),
+    without referencing the event. Events that are never answered are expired after the timeout.
+    """
+
+    def __init__(self, window=1000, timeout=30.0):
+        """Initializes a new acknowledgement tracker.
+
+        Args:
+            window (int): The max number of sent but unacknowledged events
+            timeout (float): Events not acknowledged within this time in s are expired
+        """
+        self.window = window
+        self.timeout = timeout
+        self.inFlight = collections.deque()
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.inFlight)
+
+    def waitForWindow(self, block=True):
+        """Waits until the in-flight window has room for another event.
+
+        Events not acknowledged within the timeout are expired.
+
+        Args:
+            block (bool): Only expire the events and exceed the window instead of waiting if False
+        Returns:
+            list: The expired futures
+        """
+        expired = []
+        with self.condition:
+            while self.inFlight:
+                remaining = self.inFlight[0].sentTime + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    expired.append(self.inFlight.popleft())
+                elif block and len(self.inFlight) >= self.window:
+                    self.condition.wait(remaining)
+                else:
+                    break
+        for future in expired:
+            future.setError("Event " + str(future.eventId) + " not acknowledged within " + str(self.timeout) + " s")
+        return expired
+
+    def track(self, future):
+        """Adds a sent event (the window is not checked, see :func:`waitForWindow`)."""
+        future.sentTime = time.monotonic()
+        with self.condition:
+            self.inFlight.append(future)
+
+    def remove(self, future):
+        """Removes an event that could not be sent."""
+        with self.condition:
+            try:
+                self.inFlight.remove(future)
+            except ValueError:
+                pass
+            self.condition.notify_all()
+
+    def acknowledge(self, error=None):
+        """Completes the oldest in-flight event.
+
+        Args:
+            error (str): The error if the MSB rejected the event
+        Returns:
+            PublishFuture: The completed future or None if no event was in flight
+        """
+        with self.condition:
+            if not self.inFlight:
+                return None
+            future = self.inFlight.popleft()
+            self.condition.notify_all()
+        if error is None:
+            future.setAcknowledged()
+        else:
+            future.setError(error)
+        return future
+
+    def takeAll(self):
+        """Removes all in-flight events (e.g. when the connection is closed).
+
+        Returns:
+            list: The futures in the order they were sent
+        """
+        with self.condition:
+            futures = list(self.inFlight)
+            self.inFlight.clear()
+            self.condition.notify_all()
+        return futures
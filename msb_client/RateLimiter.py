@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DROP = "drop"
+CONFLATE = "conflate"
+QUEUE = "queue"
+RAISE = "raise"
+
+ACTIONS = (DROP, CONFLATE, QUEUE, RAISE)
+
+_monotonic = time.monotonic
+
+
+class RateLimiter:
+    """Token bucket limiting the rate of published events, with the action for events exceeding the limit.
+
+    Actions:
+        drop: the event is discarded
+        conflate: only the latest value (per event) is kept and published when a token is available
+        queue: the events are queued (up to maxQueue, the oldest are dropped) and published when tokens are available
+        raise: publish raises an exception
+    """
+
+    def __init__(self, rate, burst=None, action=DROP, maxQueue=1000):
+        """Initializes a new rate limiter.
+
+        Args:
+            rate (float): The number of events per second
+            burst (int): The max number of events published at once (default: one second of events, at least 1)
+            action (str): The action for events exceeding the limit (drop, conflate, queue or raise)
+            maxQueue (int): The max number of queued events (queue action)
+        """
+        if action not in ACTIONS:
+            raise Exception("Unknown rate limit action: " + str(action) + ", expected one of " + str(ACTIONS))
+        if rate <= 0:
+            raise Exception("Rate limit must be positive: " + str(rate))
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.action = action
+        self.maxQueue = maxQueue
+        self.tokens = self.burst
+        self.last = _monotonic()
+        # number of events exceeding the limit
+        self.throttled = 0
+        # deferred events (conflate: key -> item, queue: FIFO of items)
+        self.pending = collections.OrderedDict() if action == CONFLATE else collections.deque()
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def tryAcquire(self):
+        """Takes a token if available.
+
+        The check is not locked, concurrent publishers may exceed the limit slightly.
+
+        Returns:
+            bool: True if the event may be published
+        """
+        now = _monotonic()
+        tokens = self.tokens + (now - self.last) * self.rate
+        self.last = now
+        if tokens > self.burst:
+            tokens = self.burst
+        if tokens >= 1.0:
+            self.tokens = tokens - 1.0
+            return True
+        self.tokens = tokens
+        return False
+
+    def defer(self, key, item, release):
+        """Defers an event until a token is available (conflate and queue actions).
+
+        Args:
+            key (str): The key of conflated events (e.g. the event id)
+            item (:obj:): The deferred event
+            release (:func:): Called with the item when it may be published
+        Returns:
+            The item that was replaced (conflate) or dropped from the full queue, otherwise None
+        """
+        with self.lock:
+            dropped = None
+            if self.action == CONFLATE:
+                dropped = self.pending.get(key)
+                self.pending[key] = item
+            else:
+                if len(self.pending) >= self.maxQueue:
+                    dropped = self.pending.popleft()
+                self.pending.append(item)
+            self._schedule(release)
+        return dropped
+
+    def _schedule(self, release):
+        if self.timer is None and self.pending:
+            delay = max((1.0 - self.tokens) / self.rate, 0.0)
+            self.timer = threading.Timer(delay, self._drain, (release,))
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _drain(self, release):
+        while True:
+            with self.lock:
+                if not self.pending or not self.tryAcquire():
+                    self.timer = None
+                    self._schedule(release)
+                    return
+                if self.action == CONFLATE:
+                    item = self.pending.popitem(last=False)[1]
+                else:
+                    item = self.pending.popleft()
+            try:
+                release(item)
+            except Exception:
+                logger.exception("Error, could not publish deferred event")
+
+    def getStats(self):
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "action": self.action,
+            "throttled": self.throttled,
+            "pending": len(self.pending),
+        }
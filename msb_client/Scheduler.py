@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .LogHelper import RateLimitedLog
+
+logger = logging.getLogger(__name__)
+# thousands of tasks may fail at once (e.g. a shared data source is not available)
+errorLog = RateLimitedLog(logger)
+
+# overrun actions for runs that are due while the previous run of the task is still in progress
+SKIP = "skip"
+COALESCE = "coalesce"
+
+OVERRUN_ACTIONS = (SKIP, COALESCE)
+
+_monotonic = time.monotonic
+
+
+class ScheduledTask:
+    """A periodic task of the :class:`Scheduler`."""
+
+    __slots__ = (
+        "scheduler", "name", "interval", "callback", "overrun", "next",
+        "running", "pending", "cancelled", "runs", "skipped", "coalesced", "errors", "maxLag",
+    )
+
+    def __init__(self, scheduler, name, interval, callback, overrun, start):
+        self.scheduler = scheduler
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+        self.overrun = overrun
+        # the next run is always a multiple of the interval after the start, so the runs do not drift
+        self.next = start
+        self.running = False
+        self.pending = False
+        self.cancelled = False
+        self.runs = 0
+        self.skipped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.maxLag = 0.0
+
+    def cancel(self):
+        """Stops the task, a run in progress is completed."""
+        self.scheduler.cancel(self)
+
+    def getStats(self):
+        return {
+            "interval": self.interval,
+            "overrun": self.overrun,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "maxLag": self.maxLag,
+        }
+
+
+class Scheduler:
+    """Runs periodic tasks from a single timer thread (heap of due times) in a pool of worker threads.
+
+    The due times are computed from the start time with a monotonic clock, so delays do not accumulate.
+    Runs that are due while the previous run of the task is still in progress are skipped or coalesced
+    into one run directly after it. Runs missed because the scheduler fell behind are skipped.
+    """
+
+    def __init__(self, workers=4, onLag=None):
+        """Initializes a new scheduler.
+
+        Args:
+            workers (int): The number of worker threads running the tasks
+            onLag (:func:): Called with the task and the delay in s of every run (e.g. for metrics)
+        """
+        self.workers = workers
+        self.onLag = onLag
+        self.heap = []
+        self.sequence = itertools.count()
+        self.tasks = set()
+        self.condition = threading.Condition()
+        self.executor = None
+        self.thread = None
+        self.running = False
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def schedule(self, name, interval, callback, overrun=SKIP, delay=None):
+        """Adds a periodic task.
+
+        Args:
+            name (str): The name of the task (e.g. the event id)
+            interval (float): The interval in s
+            callback (:func:): Called without arguments in every run
+            overrun (str): The action for runs due while the previous run is in progress (skip or coalesce)
+            delay (float): The delay of the first run in s (default: one interval)
+        Returns:
+            ScheduledTask: The task
+        """
+        if interval <= 0:
+            raise Exception("Interval must be positive: " + str(interval))
+        if overrun not in OVERRUN_ACTIONS:
+            raise Exception("Unknown overrun action: " + str(overrun) + ", expected one of " + str(OVERRUN_ACTIONS))
+        task = ScheduledTask(
+            self, name, float(interval), callback, overrun, _monotonic() + (interval if delay is None else delay)
+        )
+        with self.condition:
+            if not self.running:
+                self.running = True
+                self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="msb-scheduler")
+                self.thread = threading.Thread(target=self._run, name="msb-scheduler")
+                self.thread.daemon = True
+                self.thread.start()
+            self.tasks.add(task)
+            heapq.heappush(self.heap, (task.next, next(self.sequence), task))
+            if self.heap[0][2] is task:
+                self.condition.notify()
+        return task
+
+    def cancel(self, task):
+        """Stops a task, a run in progress is completed."""
+        with self.condition:
+            task.cancelled = True
+            task.pending = False
+            self.tasks.discard(task)
+
+    def _run(self):
+        heap = self.heap
+        thread = threading.current_thread()
+        while True:
+            with self.condition:
+                while self.running and (not heap or heap[0][0] > _monotonic()):
+                    self.condition.wait(heap[0][0] - _monotonic() if heap else None)
+                if not self.running or self.thread is not thread:
+                    return
+                now = _monotonic()
+                due = []
+                while heap and heap[0][0] <= now:
+                    task = heapq.heappop(heap)[2]
+                    if task.cancelled:
+                        continue
+                    scheduled = task.next
+                    task.next = scheduled + task.interval
+                    if task.next <= now:
+                        # the scheduler fell behind, runs are skipped to keep the phase of the task
+                        missed = int((now - scheduled) / task.interval)
+                        task.skipped += missed
+                        task.next = scheduled + (missed + 1) * task.interval
+                    heapq.heappush(heap, (task.next, next(self.sequence), task))
+                    if task.running:
+                        if task.overrun == SKIP:
+                            task.skipped += 1
+                        else:
+                            task.pending = True
+                            task.coalesced += 1
+                        continue
+                    task.running = True
+                    due.append((task, scheduled))
+                executor = self.executor
+            for task, scheduled in due:
+                try:
+                    executor.submit(self._execute, task, scheduled)
+                except RuntimeError:
+                    # the executor was shut down
+                    return
+
+    def _execute(self, task, scheduled):
+        while True:
+            lag = _monotonic() - scheduled
+            if lag > task.maxLag:
+                task.maxLag = lag
+            if self.onLag is not None:
+                self.onLag(task, lag)
+            try:
+                task.callback()
+            except Exception:
+                task.errors += 1
+                errorLog.exception("Error in scheduled task %s", task.name)
+            with self.condition:
+                task.runs += 1
+                if not task.pending or task.cancelled:
+                    task.running = False
+                    return
+                # coalesced run of the periods that were due while this run was in progress
+                task.pending = False
+                scheduled = _monotonic()
+
+    def getStats(self):
+        """Get the statistics of all tasks.
+
+        Returns:
+            dict: The number of tasks and the sums of runs, skipped and coalesced runs, errors and the max delay
+        """
+        with self.condition:
+            tasks = list(self.tasks)
+        return {
+            "tasks": len(tasks),
+            "runs": sum(task.runs for task in tasks),
+            "skipped": sum(task.skipped for task in tasks),
+            "coalesced": sum(task.coalesced for task in tasks),
+            "errors": sum(task.errors for task in tasks),
+            "maxLag": max([task.maxLag for task in tasks] or [0.0]),
+        }
+
+    def stop(self):
+        """Cancels all tasks and stops the timer thread, runs in progress are completed."""
+        with self.condition:
+            for task in self.tasks:
+                task.cancelled = True
+            self.tasks.clear()
+            del self.heap[:]
+            self.running = False
+            executor, self.executor = self.executor, None
+            self.condition.notify_all()
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import json
+import logging
+from json.encoder import encode_basestring_ascii
+
+logger = logging.getLogger(__name__)
+
+REF_PREFIX = "#/definitions/"
+
+
+def compileSerializer(dataFormat, isArray=False, default=None):
+    """Generates a json encoder function specialized for a complex data format.
+
+    The property names and types are known in advance, so the encoder reads the properties of
+    dicts, plain objects and dataclasses directly instead of walking __dict__ reflectively.
+    Values not matching the data format (missing or additional properties, other types) are
+    passed to the generic json encoder, so the result is always valid json.
+
+    Args:
+        dataFormat (dict): The (complex) data format of the event including all definitions
+        isArray (bool): Specifies if the event handles an object array or just an object
+        default (:func:): The function converting objects the json module cannot serialize
+    Returns:
+        function: The encoder, returning the compact json string of a value
+    """
+    generic = json.JSONEncoder(default=default, separators=(",", ":")).encode
+    compiler = _Compiler(dataFormat)
+    root = dataFormat["dataObject"]
+    if isArray and root.get("type") != "array":
+        root = {"type": "array", "items": root}
+    expression = compiler.expression(root, "v")
+    compiler.lines.append("def _encode(v):")
+    compiler.lines.append("    return " + expression)
+    source = "\n".join(compiler.lines)
+    namespace = {
+        "_generic": generic,
+        "_ascii": encode_basestring_ascii,
+        "_int": int.__repr__,
+        "_float": float.__repr__,
+        "_inf": float("inf"),
+    }
+    exec(compile(source, "<serializer " + str(list(compiler.functions)) + ">", "exec"), namespace)
+    logger.debug("Generated serializer:\n%s", source)
+    return namespace["_encode"]
+
+
+class _Compiler:
+    """Generates the source code of the encoder functions, one function per definition."""
+
+    def __init__(self, dataFormat):
+        self.dataFormat = dataFormat
+        self.functions = {}
+        self.lines = []
+        self.variables = 0
+
+    def variable(self):
+        self.variables += 1
+        return "v" + str(self.variables)
+
+    def function(self, ref):
+        name = ref[len(REF_PREFIX):] if ref.startswith(REF_PREFIX) else ref
+        if name not in self.functions:
+            self.functions[name] = "_encode_" + str(len(self.functions))
+            self.compileDefinition(name, self.functions[name])
+        return self.functions[name]
+
+    def compileDefinition(self, name, functionName):
+        properties = self.dataFormat[name].get("properties", {})
+        names = list(properties)
+        lines = [
+            "def " + functionName + "(o):",
+            "    d = o",
+            "    if not isinstance(d, dict):",
+            "        d = getattr(o, '__dict__', None)",
+            "        if d is None:",
+            "            d = {k: getattr(o, k) for k in " + repr(tuple(names)) + " if hasattr(o, k)}",
+            "    if len(d) != " + str(len(names)) + ":",
+            "        return _generic(o)",
+        ]
+        if not names:
+            lines.append("    return '{}'")
+        else:
+            variables = [self.variable() for propertyName in names]
+            lines.append("    try:")
+            for propertyName, var in zip(names, variables):
+                lines.append("        " + var + " = d[" + repr(propertyName) + "]")
+            lines.append("    except KeyError:")
+            lines.append("        return _generic(o)")
+            parts = []
+            for i, (propertyName, var) in enumerate(zip(names, variables)):
+                key = ("{" if i == 0 else ",") + json.dumps(propertyName) + ":"
+                parts.append(repr(key) + " + " + self.expression(properties[propertyName], var))
+            lines.append("    return (\n        " + "\n        + ".join(parts) + "\n        + '}'\n    )")
+        self.lines.extend(lines)
+        self.lines.append("")
+
+    def expression(self, schema, var):
+        """Get the expression encoding the variable according to its schema."""
+        if "$ref" in schema and isinstance(schema["$ref"], str):
+            return self.function(schema["$ref"]) + "(" + var + ")"
+        kind = schema.get("type")
+        if kind == "string":
+            return "(_ascii(" + var + ") if type(" + var + ") is str else _generic(" + var + "))"
+        if kind == "integer":
+            return "(_int(" + var + ") if type(" + var + ") is int else _generic(" + var + "))"
+        if kind == "number":
+            return (
+                "(_float(" + var + ") if type(" + var + ") is float and -_inf < " + var + " < _inf"
+                + " else _generic(" + var + "))"
+            )
+        if kind == "boolean":
+            return (
+                "('true' if " + var + " is True else 'false' if " + var + " is False else _generic(" + var + "))"
+            )
+        if kind == "array" and "items" in schema:
+            item = self.variable()
+            return (
+                "('[' + ','.join([" + self.expression(schema["items"], item) + " for " + item + " in " + var + "])"
+                + " + ']' if type(" + var + ") in (list, tuple) else _generic(" + var + "))"
+            )
+        return "_generic(" + var + ")"
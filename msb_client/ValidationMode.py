@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import random
+import threading
+
+FULL = "full"
+SAMPLED = "sampled"
+TRUST = "trust"
+OFF = "off"
+
+MODES = (FULL, SAMPLED, TRUST, OFF)
+
+
+class ValidationMode:
+    """Decides which event values are validated and tracks the validation results of an event.
+
+    Modes:
+        full: every value is validated
+        sampled: one in sampleEvery values or a random share (sampleRate) of the values is validated
+        trust: the first validateFirst values are validated, after trustAfter consecutive valid values
+            the event is trusted and not validated anymore until a validation failure resets the trust
+        off: no value is validated
+    """
+
+    def __init__(self, mode=FULL, sampleEvery=None, sampleRate=None, validateFirst=0, trustAfter=100):
+        """Initializes a new validation mode.
+
+        Args:
+            mode (str): The validation mode (full, sampled, trust or off)
+            sampleEvery (int): Validate one in this number of values (sampled mode)
+            sampleRate (float): Validate this share of the values, e.g. 0.01 for 1 % (sampled mode)
+            validateFirst (int): The number of values always validated (trust mode)
+            trustAfter (int): The number of consecutive valid values after which the event is trusted (trust mode)
+        """
+        if mode not in MODES:
+            raise Exception("Unknown validation mode: " + str(mode) + ", expected one of " + str(MODES))
+        if mode == SAMPLED and not sampleEvery and sampleRate is None:
+            raise Exception("Sampled validation requires sampleEvery or sampleRate")
+        self.mode = mode
+        self.sampleEvery = sampleEvery
+        self.sampleRate = sampleRate
+        self.validateFirst = validateFirst
+        self.trustAfter = trustAfter
+        self.lock = threading.Lock()
+        self.reset()
+
+    def copy(self):
+        """Get a new validation mode with the same settings (and without results)."""
+        return ValidationMode(self.mode, self.sampleEvery, self.sampleRate, self.validateFirst, self.trustAfter)
+
+    def reset(self):
+        """Resets the results, a trusted event is validated again."""
+        with self.lock:
+            self.count = 0
+            self.validated = 0
+            self.consecutivePasses = 0
+            self.trusted = False
+
+    def shouldValidate(self):
+        """Decides if the next value is validated.
+
+        Returns:
+            bool: True if the value has to be validated
+        """
+        if self.mode == FULL:
+            return True
+        if self.mode == OFF:
+            return False
+        if self.mode == TRUST:
+            return not self.trusted
+        with self.lock:
+            self.count += 1
+            count = self.count
+        if self.sampleEvery:
+            return count % self.sampleEvery == 1 or self.sampleEvery == 1
+        return random.random() < self.sampleRate
+
+    def report(self, valid):
+        """Reports the result of a validation.
+
+        Args:
+            valid (bool): True if the value was valid
+        """
+        with self.lock:
+            self.validated += 1
+            if valid:
+                self.consecutivePasses += 1
+                if (
+                    self.mode == TRUST
+                    and self.validated >= self.validateFirst
+                    and self.consecutivePasses >= self.trustAfter
+                ):
+                    self.trusted = True
+            else:
+                self.consecutivePasses = 0
+                self.trusted = False
+
+    def getStats(self):
+        return {
+            "mode": self.mode,
+            "validated": self.validated,
+            "consecutivePasses": self.consecutivePasses,
+            "trusted": self.trusted,
+        }
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import base64
+import binascii
+import datetime
+import logging
+import re
+
+import jsonschema
+
+logger = logging.getLogger(__name__)
+
+REF_PREFIX = "#/definitions/"
+
+# keywords the compiled checks implement, data formats using other keywords are not compiled
+SUPPORTED_KEYWORDS = {"type", "format", "properties", "required", "items", "$ref", "title", "description"}
+
+# checks for the fast path, values of other types (e.g. int subclasses) are left to the jsonschema engine
+TYPE_CHECKS = {
+    "object": "type({0}) is dict",
+    "array": "type({0}) is list",
+    "string": "type({0}) is str",
+    "integer": "type({0}) is int",
+    "number": "(type({0}) is float or type({0}) is int)",
+    "boolean": "type({0}) is bool",
+    "null": "{0} is None",
+}
+
+DATE_TIME = re.compile(
+    r"^(\d{4})-(\d{2})-(\d{2})[Tt ](\d{2}):(\d{2}):(\d{2})(\.\d+)?([Zz]|[+-](\d{2}):(\d{2}))$"
+)
+
+# format checker of the compiled engine, date-time (with time zone) and byte (base64) are always checked,
+# independent of the optional format packages of jsonschema; the jsonschema engine keeps the default checker
+STRICT_FORMAT_CHECKER = jsonschema.FormatChecker()
+
+
+@STRICT_FORMAT_CHECKER.checks("date-time", raises=ValueError)
+def _checkDateTime(instance):
+    if not isinstance(instance, str):
+        return True
+    match = DATE_TIME.match(instance)
+    if match is None:
+        return False
+    datetime.datetime(*[int(match.group(i)) for i in range(1, 7)])
+    if match.group(9) is not None:
+        return int(match.group(9)) < 24 and int(match.group(10)) < 60
+    return True
+
+
+@STRICT_FORMAT_CHECKER.checks("byte", raises=(binascii.Error, ValueError))
+def _checkByte(instance):
+    if not isinstance(instance, str):
+        return True
+    base64.b64decode(instance, validate=True)
+    return True
+
+
+def compileValidator(dataFormat, isArray=False):
+    """Generates straight-line python checks for a complex data format.
+
+    The checks cover types, required properties, array items and the formats of the strict format checker.
+    They only accept values the jsonschema engine with the strict format checker accepts as well. Values failing
+    the checks have to be validated by that engine again, which also provides the error description.
+
+    Args:
+        dataFormat (dict): The (complex) data format of the event including all definitions
+        isArray (bool): Specifies if the event handles an object array or just an object
+    Returns:
+        function: The check returning True for valid values, None if the data format uses unsupported keywords
+    """
+    compiler = _Compiler(dataFormat)
+    root = dataFormat["dataObject"]
+    if isArray and root.get("type") != "array":
+        root = {"type": "array", "items": root}
+    try:
+        expression = compiler.expression(root, "v")
+    except Exception as e:
+        logger.debug("Data format not compiled, using the jsonschema engine: %s", e)
+        return None
+    compiler.lines.append("def _validate(v):")
+    compiler.lines.append("    return " + expression)
+    source = "\n".join(compiler.lines)
+    namespace = {"_conforms": STRICT_FORMAT_CHECKER.conforms}
+    exec(compile(source, "<validator " + str(list(compiler.functions)) + ">", "exec"), namespace)
+    logger.debug("Generated validator:\n%s", source)
+    return namespace["_validate"]
+
+
+class _Compiler:
+    """Generates the source code of the checks, one function per definition."""
+
+    def __init__(self, dataFormat):
+        self.dataFormat = dataFormat
+        self.functions = {}
+        self.lines = []
+        self.variables = 0
+
+    def variable(self):
+        self.variables += 1
+        return "v" + str(self.variables)
+
+    def function(self, ref):
+        if not ref.startswith(REF_PREFIX) or ref[len(REF_PREFIX):] not in self.dataFormat:
+            raise Exception("Unresolvable reference: " + str(ref))
+        name = ref[len(REF_PREFIX):]
+        if name not in self.functions:
+            self.functions[name] = "_validate_" + str(len(self.functions))
+            lines = ["def " + self.functions[name] + "(o):"]
+            lines.append("    return " + self.expression(self.dataFormat[name], "o"))
+            self.lines.extend(lines)
+            self.lines.append("")
+        return self.functions[name]
+
+    def expression(self, schema, var):
+        """Get the boolean expression checking the variable against its schema."""
+        unsupported = set(schema) - SUPPORTED_KEYWORDS
+        if unsupported:
+            raise Exception("Unsupported keywords: " + str(sorted(unsupported)))
+        checks = []
+        kind = schema.get("type")
+        if kind is not None:
+            if kind not in TYPE_CHECKS:
+                raise Exception("Unsupported type: " + str(kind))
+            checks.append(TYPE_CHECKS[kind].format(var))
+        if "$ref" in schema:
+            checks.append(self.function(schema["$ref"]) + "(" + var + ")")
+        if schema.get("format") in STRICT_FORMAT_CHECKER.checkers:
+            checks.append("_conforms(" + var + ", " + repr(schema["format"]) + ")")
+        if "required" in schema or "properties" in schema:
+            if kind != "object":
+                raise Exception("Properties of an untyped schema")
+            for propertyName in schema.get("required", []):
+                checks.append(repr(propertyName) + " in " + var)
+            for propertyName, propertySchema in schema.get("properties", {}).items():
+                checks.append(
+                    "(" + repr(propertyName) + " not in " + var + " or "
+                    + self.expression(propertySchema, var + "[" + repr(propertyName) + "]") + ")"
+                )
+        if "items" in schema:
+            if kind != "array" or not isinstance(schema["items"], dict):
+                raise Exception("Items of an untyped schema")
+            item = self.variable()
+            checks.append(
+                "all([" + self.expression(schema["items"], item) + " for " + item + " in " + var + "])"
+            )
+        if not checks:
+            return "True"
+        return "(" + " and ".join(checks) + ")"
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+"""
+
+import collections
+import datetime
+import math
+import threading
+import time
+
+from .ComplexDataFormat import ComplexDataFormat
+from .DataType import DataType
+from .NumericArray import isNumericArray
+
+# window types, windows by time are closed periodically, windows by count after a number of samples
+TIME = "time"
+COUNT = "count"
+
+WINDOW_TYPES = (TIME, COUNT)
+
+
+def createWindowDataFormat(name):
+    """Creates the complex data format of the results of an aggregation window.
+
+    Args:
+        name (str): The name of the data format
+    """
+    window = ComplexDataFormat(name)
+    window.addProperty("windowStart", DataType.DATETIME, False)
+    window.addProperty("windowEnd", DataType.DATETIME, False)
+    window.addProperty("count", DataType.INT64, False)
+    window.addProperty("min", DataType.DOUBLE, False)
+    window.addProperty("max", DataType.DOUBLE, False)
+    window.addProperty("mean", DataType.DOUBLE, False)
+    window.addProperty("stddev", DataType.DOUBLE, False)
+    return window
+
+
+def _formatTime(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class WindowStats:
+    """Incremental count, min, max, mean and variance (sum of squared deviations) of samples.
+
+    Blocks of samples and other stats are merged with the parallel algorithm of Chan et al.,
+    which is numerically stable for large counts.
+    """
+
+    __slots__ = ("count", "mean", "m2", "min", "max", "start", "end")
+
+    def __init__(self, start=None):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.start = start
+        self.end = None
+
+    def add(self, value):
+        """Adds a single sample (Welford's algorithm)."""
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def addArray(self, values):
+        """Adds a block of samples, numpy arrays are aggregated by numpy.
+
+        Args:
+            values (:obj:): The samples (numpy array, array.array, memoryview or list)
+        """
+        count = len(values)
+        if count == 0:
+            return
+        if hasattr(values, "dtype"):
+            # numpy arrays are detected by their interface, numpy is not imported
+            mean = float(values.mean())
+            m2 = float(values.var()) * count
+            low = float(values.min())
+            high = float(values.max())
+        else:
+            if isinstance(values, memoryview):
+                values = values.tolist()
+            mean = math.fsum(values) / count
+            m2 = math.fsum([(value - mean) ** 2 for value in values])
+            low = float(min(values))
+            high = float(max(values))
+        self._merge(count, mean, m2, low, high)
+
+    def merge(self, other):
+        """Adds the samples of other stats."""
+        if other.count:
+            self._merge(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _merge(self, count, mean, m2, low, high):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        if low < self.min:
+            self.min = low
+        if high > self.max:
+            self.max = high
+
+    def toDataObject(self):
+        """Get the window result (population standard deviation) as value of the window data format."""
+        return {
+            "windowStart": _formatTime(self.start),
+            "windowEnd": _formatTime(self.end),
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean,
+            "stddev": math.sqrt(self.m2 / self.count),
+        }
+
+
+class WindowAggregator:
+    """Aggregates numeric samples in tumbling or sliding windows by time or count.
+
+    A window consists of panes of the slide length. When a pane is completed (by :func:`tick` for windows by
+    time, after slide samples for windows by count), the panes of the window are merged to the window result.
+    Tumbling windows have a single pane.
+    """
+
+    def __init__(self, size, slide=None, windowType=TIME, clock=time.time):
+        """Initializes a new window aggregator.
+
+        Args:
+            size (float, int): The window size in s (windows by time) or samples (windows by count)
+            slide (float, int): The distance of the windows (default: size, tumbling windows),
+                the size has to be a multiple of it
+            windowType (str): Windows by time or count
+            clock (:func:): The clock of the window start and end (epoch seconds)
+        """
+        if windowType not in WINDOW_TYPES:
+            raise Exception("Unknown window type: " + str(windowType) + ", expected one of " + str(WINDOW_TYPES))
+        slide = size if slide is None else slide
+        if size <= 0 or slide <= 0 or slide > size:
+            raise Exception("Invalid window size " + str(size) + " and slide " + str(slide))
+        panes = int(round(size / slide))
+        if windowType == COUNT and (int(size) != size or int(slide) != slide):
+            raise Exception("Windows by count need whole numbers of samples: " + str(size) + ", " + str(slide))
+        if abs(panes * slide - size) > 1e-9 * size:
+            raise Exception("Window size " + str(size) + " is not a multiple of the slide " + str(slide))
+        self.size = size
+        self.slide = slide
+        self.windowType = windowType
+        self.clock = clock
+        self.panes = collections.deque(maxlen=panes)
+        self.current = WindowStats(clock() if windowType == TIME else None)
+        self.samples = 0
+        self.windows = 0
+        self.lock = threading.Lock()
+
+    def add(self, value):
+        """Adds a sample or an array of samples.
+
+        Args:
+            value (:obj:): The sample (number) or samples (numpy array, array.array, memoryview, list or tuple)
+        Returns:
+            list: The results of the windows completed by the samples (windows by count)
+        """
+        isArray = isinstance(value, (list, tuple)) or isNumericArray(value)
+        with self.lock:
+            if self.windowType == TIME:
+                if isArray:
+                    self.current.addArray(value)
+                else:
+                    self.current.add(value)
+                self.samples += len(value) if isArray else 1
+                return []
+            if not isArray:
+                value = (value,)
+            results = []
+            offset = 0
+            while offset < len(value):
+                current = self.current
+                if current.start is None:
+                    current.start = self.clock()
+                room = int(self.slide) - current.count
+                block = value[offset:offset + room]
+                if len(block) == 1:
+                    current.add(block[0])
+                else:
+                    current.addArray(block)
+                offset += len(block)
+                if current.count == self.slide:
+                    result = self._closePane(None)
+                    if result is not None:
+                        results.append(result)
+            self.samples += offset
+            return results
+
+    def tick(self):
+        """Completes the current pane of a window by time (called periodically every slide).
+
+        Returns:
+            dict: The window result or None if the window has no samples
+        """
+        with self.lock:
+            return self._closePane(self.clock())
+
+    def _closePane(self, now):
+        pane = self.current
+        pane.end = self.clock() if now is None else now
+        self.panes.append(pane)
+        self.current = WindowStats(now)
+        if self.windowType == COUNT and len(self.panes) < self.panes.maxlen:
+            return None
+        if len(self.panes) == 1:
+            window = pane
+        else:
+            window = WindowStats(self.panes[0].start)
+            for pane in self.panes:
+                window.merge(pane)
+            window.end = pane.end
+        if window.count == 0:
+            return None
+        self.windows += 1
+        return window.toDataObject()
+
+    def getStats(self):
+        return {
+            "windowType": self.windowType,
+            "size": self.size,
+            "slide": self.slide,
+            "samples": self.samples,
+            "windows": self.windows,
+        }
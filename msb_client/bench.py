@@ -0,0 +1,568 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2019 Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+Authors: Daniel Stock, Matthias Stoehr
+
+Licensed under the Apache License, Version 2.0
+See the file "LICENSE" for the full license governing this code.
+
+Benchmark suite for publish, dispatch and registration throughput against the local mock MSB.
+
+Usage:
+    python -m msb_client.bench [--quick] [--filter publish] [--output results.json] [--compare old.json]
+"""
+
+import argparse
+import datetime
+import importlib.util
+import json
+import logging
+import platform
+import sys
+import time
+
+from . import __version__
+from .ComplexDataFormat import ComplexDataFormat
+from .DataType import DataType
+from .MsbClient import MsbClient
+from .MsbMockServer import MsbMockServer
+
+SERVICE_UUID = "5d1cbd3a-6fd3-4d8c-9e3d-6a2c2a8e0b7f"
+
+
+def createComplexDataFormat():
+    """Creates the nested Device/Module data format used for complex benchmarks."""
+    myModule = ComplexDataFormat("BenchModule")
+    myModule.addProperty("moduleName", DataType.STRING, False)
+    myModule.addProperty("moduleTemperature", DataType.DOUBLE, False)
+    myDevice = ComplexDataFormat("BenchDevice")
+    myDevice.addProperty("deviceName", DataType.STRING, False)
+    myDevice.addProperty("deviceWeight", DataType.FLOAT, False)
+    myDevice.addProperty("online", DataType.BOOLEAN, False)
+    myDevice.addProperty("submodules", myModule, True)
+    return myDevice
+
+
+def createComplexValue(nrOfModules=5):
+    return {
+        "deviceName": "Device 1",
+        "deviceWeight": 1.3,
+        "online": True,
+        "submodules": [
+            {"moduleName": "Module " + str(i), "moduleTemperature": 20.0 + i} for i in range(nrOfModules)
+        ],
+    }
+
+
+def createNestedDataFormat(depth=5):
+    """Creates a data format nested to the given depth, each level holding a list of the next level."""
+    nested = None
+    for level in reversed(range(depth)):
+        myLevel = ComplexDataFormat("BenchLevel" + str(level))
+        myLevel.addProperty("name", DataType.STRING, False)
+        myLevel.addProperty("value", DataType.DOUBLE, False)
+        myLevel.addProperty("count", DataType.INT32, False)
+        myLevel.addProperty("active", DataType.BOOLEAN, False)
+        if nested is not None:
+            myLevel.addProperty("children", nested, True)
+        nested = myLevel
+    return nested
+
+
+def createFlatDataFormat(nrOfFields=20):
+    """Creates a flat data format with the given number of string, double, int32 and date-time fields."""
+    types = (DataType.STRING, DataType.DOUBLE, DataType.INT32, DataType.DATETIME)
+    myFlat = ComplexDataFormat("BenchFlat" + str(nrOfFields))
+    for i in range(nrOfFields):
+        myFlat.addProperty("field" + str(i), types[i % len(types)], False)
+    return myFlat
+
+
+def createFlatValue(nrOfFields=20):
+    values = ("value", 1.5, 42, "2024-01-01T12:00:00.000Z")
+    return {"field" + str(i): values[i % len(values)] for i in range(nrOfFields)}
+
+
+def createNestedValue(depth=5, width=3):
+    value = {"name": "Level " + str(depth), "value": depth * 1.5, "count": depth, "active": True}
+    if depth > 1:
+        value["children"] = [createNestedValue(depth - 1, width) for i in range(width)]
+    return value
+
+
+PUBLISH_VALUES = {
+    "SIMPLE": lambda: 42,
+    "ARRAY": lambda: list(range(100)),
+    "COMPLEX": createComplexValue,
+}
+
+
+def createClient(nrOfEvents=0):
+    """Creates a client with the SIMPLE, ARRAY and COMPLEX benchmark events, one function F1
+    and optionally additional generated events.
+
+    Args:
+        nrOfEvents (int): The number of additional simple events
+    Returns:
+        MsbClient: The client (not connected)
+    """
+    client = MsbClient("SmartObject", SERVICE_UUID, "BenchmarkSO", "Benchmark smart object", SERVICE_UUID[-6:])
+    client.disableAutoReconnect(True)
+    client.enableThreadAsDaemon(True)
+    client.addEvent("SIMPLE", "Simple", "Simple event", DataType.INT32, 0, False)
+    client.addEvent("ARRAY", "Array", "Array event", DataType.INT32, 0, True)
+    client.addEvent("COMPLEX", "Complex", "Complex event", createComplexDataFormat(), 0, False)
+    client.addFunction("F1", "F1", "Benchmark function", DataType.STRING, _benchFunction)
+    for i in range(nrOfEvents):
+        client.addEvent("GEN_" + str(i), "Gen " + str(i), "Generated event", DataType.DOUBLE, 0, False)
+    return client
+
+
+def _benchFunction(msg):
+    pass
+
+
+def connectClient(client, mockServer, timeout=10):
+    """Connects and registers the client at the mock server and waits until registration is done."""
+    client.connect(mockServer.url)
+    client.register()
+    _waitFor(lambda: client.connected and client.registered, timeout)
+    return client
+
+
+def _waitFor(condition, timeout=10):
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise Exception("Timeout while waiting for benchmark condition")
+        time.sleep(0.001)
+
+
+def _result(name, ops, seconds, **extra):
+    result = {
+        "name": name,
+        "ops": ops,
+        "seconds": seconds,
+        "opsPerSec": ops / seconds if seconds else None,
+        "meanUs": seconds / ops * 1e6 if ops else None,
+    }
+    result.update(extra)
+    return result
+
+
+def benchPublish(mockServer, eventId, validation, n):
+    """Measures publish of the SIMPLE, ARRAY or COMPLEX event and the time until the mock server received all."""
+    client = connectClient(createClient(), mockServer)
+    client.enableDataFormatValidation(validation)
+    value = PUBLISH_VALUES[eventId]()
+    mockServer.reset()
+    try:
+        start = time.perf_counter()
+        for i in range(n):
+            client.publish(eventId, value)
+        publishSeconds = time.perf_counter() - start
+        mockServer.waitForEvents(n, timeout=60)
+        deliveredSeconds = time.perf_counter() - start
+    finally:
+        client.disconnect()
+    return _result(
+        "publish_" + eventId.lower() + ("_validated" if validation else "_unvalidated"),
+        n, publishSeconds, deliveredSeconds=deliveredSeconds, delivered=len(mockServer.events)
+    )
+
+
+def benchEncodeSmallEvents(n):
+    """Measures publish of small events without connection and cache (envelope, timestamp and encoding)."""
+    client = createClient()
+    client.enableDataFormatValidation(False)
+    client.disableEventCache(True)
+    publish = client.publish
+    start = time.perf_counter()
+    for i in range(n):
+        publish("SIMPLE", i)
+    return _result("encode_small_events", n, time.perf_counter() - start)
+
+
+def benchSelfDescription(nrOfEvents, n):
+    """Measures getSelfDescription and its serialization for a client with the given number of events."""
+    client = createClient(nrOfEvents)
+    start = time.perf_counter()
+    for i in range(n):
+        client.objectToJson(client.getSelfDescription())
+    return _result("self_description_" + str(nrOfEvents) + "_events", n, time.perf_counter() - start)
+
+
+def benchSerialize(generated, n, depth=5, width=3):
+    """Measures the serialization of a deeply nested value by the generated serializer or objectToJson."""
+    client = createClient()
+    client.addEvent("NESTED", "Nested", "Nested event", createNestedDataFormat(depth), 0, False)
+    serialize = client.events["NESTED"].serializer if generated else client.objectToJson
+    value = createNestedValue(depth, width)
+    start = time.perf_counter()
+    for i in range(n):
+        serialize(value)
+    return _result(
+        "serialize_nested_" + ("generated" if generated else "object_to_json"),
+        n, time.perf_counter() - start, bytes=len(serialize(value))
+    )
+
+
+def benchValidate(validationEngine, n, nrOfFields=20):
+    """Measures the validation of a flat complex value by the given validation engine."""
+    client = createClient()
+    client.setValidationEngine(validationEngine)
+    client.addEvent("FLAT", "Flat", "Flat event", createFlatDataFormat(nrOfFields), 0, False)
+    event = client.events["FLAT"]
+    value = createFlatValue(nrOfFields)
+    start = time.perf_counter()
+    for i in range(n):
+        if not client._validateEventValue(event, value):
+            raise Exception("Benchmark value is not valid")
+    return _result("validate_flat_" + validationEngine, n, time.perf_counter() - start)
+
+
+def benchRateLimitCheck(n):
+    """Measures the token bucket check of a rate limit (a limit high enough that no event is throttled)."""
+    client = createClient()
+    client.setRateLimit(1e9, 1e9, eventId="SIMPLE")
+    admit = client._admit
+    item = ("SIMPLE", 1, None, False, None, None, None, None)
+    start = time.perf_counter()
+    for i in range(n):
+        admit("SIMPLE", item)
+    return _result("rate_limit_check", n, time.perf_counter() - start)
+
+
+def benchScheduler(nrOfSources, interval, seconds):
+    """Measures the delay (jitter) of the runs of periodically published events, nrOfSources events
+    scheduled with the same interval and spread over it, published without connection and cache.
+    """
+    client = createClient()
+    client.disableEventCache(True)
+    client.enableDataFormatValidation(False)
+    lags = []
+    for i in range(nrOfSources):
+        client.schedule("SIMPLE", interval, lambda i=i: i, delay=interval * i / nrOfSources)
+    observeLag = client.scheduler.onLag
+    client.scheduler.onLag = lambda task, lag: (lags.append(lag), observeLag(task, lag))
+    time.sleep(seconds)
+    stats = client.getSchedulerStats()
+    client.stopScheduler()
+    lags.sort()
+    return _result(
+        "scheduler_" + str(nrOfSources) + "_sources",
+        stats["runs"], seconds, expectedRuns=int(nrOfSources * seconds / interval), skipped=stats["skipped"],
+        lagP50Us=lags[len(lags) // 2] * 1e6 if lags else None,
+        lagP99Us=lags[int(len(lags) * 0.99)] * 1e6 if lags else None,
+        lagMaxUs=lags[-1] * 1e6 if lags else None,
+    )
+
+
+def benchAggregate(inputType, n, blockSize=1000):
+    """Measures the aggregation of n samples in windows of 10000 samples by count, added one by one (scalar)
+    or in blocks of python floats (list) or numpy arrays (numpy), window results published without connection.
+    """
+    client = createClient()
+    client.disableEventCache(True)
+    client.addAggregatedEvent("AGGREGATED", "Aggregated", "Aggregated samples", window=10000, windowType="count")
+    samples = [float(i % 1000) for i in range(blockSize)]
+    if inputType == "numpy":
+        import numpy
+
+        samples = numpy.array(samples)
+    start = time.perf_counter()
+    if inputType == "scalar":
+        for i in range(n):
+            client.aggregate("AGGREGATED", 1.5)
+    else:
+        for i in range(n // blockSize):
+            client.aggregate("AGGREGATED", samples)
+    seconds = time.perf_counter() - start
+    return _result(
+        "aggregate_" + inputType, n, seconds, windows=client.getAggregationStats()["AGGREGATED"]["windows"]
+    )
+
+
+def createFunctionCallFrame(sockJsFraming=True, dataObject="Hello Client"):
+    """Creates an incoming function call frame as received from the MSB."""
+    message = "C " + json.dumps({
+        "uuid": SERVICE_UUID,
+        "functionId": "F1",
+        "correlationId": "bench",
+        "functionParameters": {"dataObject": dataObject},
+    })
+    if sockJsFraming:
+        return "a" + json.dumps([message])
+    return message
+
+
+def benchDispatch(n):
+    """Measures the handling of incoming function calls (C messages) by on_message."""
+    client = createClient()
+    frame = createFunctionCallFrame()
+    start = time.perf_counter()
+    for i in range(n):
+        client.on_message(None, frame)
+    return _result("dispatch_function_call", n, time.perf_counter() - start)
+
+
+def benchCacheFlush(mockServer, n, compression=True):
+    """Measures the replay of n cached events after the connection is established
+    and the memory used per cached event."""
+    client = createClient()
+    client.setEventCacheSize(n)
+    client.enableEventCacheCompression(compression)
+    value = createComplexValue()
+    for i in range(n):
+        client.publish("COMPLEX", value, cached=True)
+    bytesPerEvent = client.getEventCacheStats()["bytesPerEvent"]
+    mockServer.reset()
+    start = time.perf_counter()
+    connectClient(client, mockServer)
+    _waitFor(lambda: len(client.eventCache) == 0 or not client.connected, 60)
+    mockServer.waitForEvents(n, timeout=60)
+    seconds = time.perf_counter() - start
+    client.disconnect()
+    return _result(
+        "cache_flush" + ("" if compression else "_uncompressed"), n, seconds,
+        delivered=len(mockServer.events), bytesPerEvent=bytesPerEvent
+    )
+
+
+def benchReconnect(mockServer, n):
+    """Measures the time from a lost connection until the client is registered again (without interval)."""
+    client = connectClient(createClient(), mockServer)
+    client.disableAutoReconnect(False)
+    client.reconnectInterval = 0
+    total = 0.0
+    try:
+        for i in range(n):
+            start = time.perf_counter()
+            mockServer.closeConnections()
+            _waitFor(lambda: not client.registered, 10)
+            _waitFor(lambda: client.connected and client.registered, 10)
+            total += time.perf_counter() - start
+    finally:
+        client.disconnect()
+    return _result("reconnect", n, total)
+
+
+def benchDeflate(mockServer, message, compressionLevel, n):
+    """Measures the bytes received by the mock server and the compression cpu time for registrations
+    (with 1000 events) or COMPLEX events, compressed with permessage-deflate at the given level
+    (None for uncompressed messages).
+    """
+    client = createClient(1000 if message == "register" else 0)
+    client.enableDataFormatValidation(False)
+    if compressionLevel is not None:
+        client.enablePermessageDeflate(compressionLevel=compressionLevel)
+    connectClient(client, mockServer)
+    value = createComplexValue()
+    mockServer.reset()
+    try:
+        start = time.perf_counter()
+        for i in range(n):
+            if message == "register":
+                client.sendSelfDescription()
+            else:
+                client.publish("COMPLEX", value)
+        seconds = time.perf_counter() - start
+        if message == "register":
+            mockServer.waitForRegistration(n, timeout=60)
+        else:
+            mockServer.waitForEvents(n, timeout=60)
+        stats = client.getCompressionStats()
+    finally:
+        client.disconnect()
+    return _result(
+        "deflate_" + message + ("_level" + str(compressionLevel) if compressionLevel is not None else "_off"),
+        n, seconds, bytes=mockServer.receivedBytes,
+        compressTime=stats["compressTime"] if stats is not None else 0.0,
+        ratio=stats["ratio"] if stats is not None else 1.0,
+    )
+
+
+def benchMicroBatching(mockServer, microBatching, sockJsFraming, n):
+    """Measures the time until the mock server received n SIMPLE events published as fast as possible,
+    sent one by one or with micro batching.
+    """
+    client = createClient()
+    client.enableDataFormatValidation(False)
+    client.disableSockJsFraming(not sockJsFraming)
+    client.enableMicroBatching(microBatching)
+    connectClient(client, mockServer)
+    mockServer.reset()
+    try:
+        start = time.perf_counter()
+        for i in range(n):
+            client.publish("SIMPLE", i)
+        publishSeconds = time.perf_counter() - start
+        mockServer.waitForEvents(n, timeout=60)
+        deliveredSeconds = time.perf_counter() - start
+        batchSize = client.metrics.batchSize.labels()
+    finally:
+        client.disconnect()
+    return _result(
+        "micro_batching_" + ("on" if microBatching else "off") + ("_sockjs" if sockJsFraming else "_raw"),
+        n, deliveredSeconds, publishSeconds=publishSeconds, delivered=len(mockServer.events),
+        meanBatchSize=batchSize.sum / batchSize.count if batchSize.count else 1.0,
+    )
+
+
+def benchDelta(mockServer, keyframeEvery, n):
+    """Measures publish of COMPLEX events of which only the weight changes and the bytes received by the
+    mock server, with delta encoding (a keyframe every keyframeEvery events) or without (None).
+    """
+    client = createClient()
+    client.enableDataFormatValidation(False)
+    if keyframeEvery is not None:
+        client.enableDeltaEncoding("COMPLEX", keyframeEvery=keyframeEvery)
+    connectClient(client, mockServer)
+    value = createComplexValue()
+    mockServer.reset()
+    try:
+        start = time.perf_counter()
+        for i in range(n):
+            value["deviceWeight"] = float(i)
+            client.publish("COMPLEX", value)
+        seconds = time.perf_counter() - start
+        mockServer.waitForEvents(n, timeout=60)
+    finally:
+        client.disconnect()
+    return _result(
+        "delta_" + ("keyframe" + str(keyframeEvery) if keyframeEvery is not None else "off"),
+        n, seconds, bytes=mockServer.receivedBytes, bytesPerEvent=mockServer.receivedBytes / n,
+    )
+
+
+def runAll(quick=False, filter=None):
+    """Runs all benchmarks.
+
+    Args:
+        quick (bool): Use less iterations (e.g. for smoke tests)
+        filter (str): Only run benchmarks whose name contains this string
+    Returns:
+        dict: The benchmark results with environment information
+    """
+    scale = 0.1 if quick else 1
+    count = lambda n: max(1, int(n * scale))  # noqa: E731
+    benchmarks = []
+    for eventId in ("SIMPLE", "ARRAY", "COMPLEX"):
+        for validation in (True, False):
+            name = "publish_" + eventId.lower() + ("_validated" if validation else "_unvalidated")
+            benchmarks.append((name, lambda s, e=eventId, v=validation: benchPublish(s, e, v, count(10000))))
+    benchmarks.append(("encode_small_events", lambda s: benchEncodeSmallEvents(count(1000000))))
+    for nrOfEvents, n in ((10, 200), (1000, 5), (10000, 1)):
+        benchmarks.append((
+            "self_description_" + str(nrOfEvents) + "_events",
+            lambda s, e=nrOfEvents, n=n: benchSelfDescription(e, max(1, count(n)))
+        ))
+    for generated in (True, False):
+        benchmarks.append((
+            "serialize_nested_" + ("generated" if generated else "object_to_json"),
+            lambda s, g=generated: benchSerialize(g, count(2000))
+        ))
+    for validationEngine in ("compiled", "jsonschema"):
+        benchmarks.append((
+            "validate_flat_" + validationEngine,
+            lambda s, e=validationEngine: benchValidate(e, count(2000))
+        ))
+    benchmarks.append(("rate_limit_check", lambda s: benchRateLimitCheck(count(1000000))))
+    for nrOfSources in (100, 10000):
+        benchmarks.append((
+            "scheduler_" + str(nrOfSources) + "_sources",
+            lambda s, n=nrOfSources: benchScheduler(n, 1.0, 5.0 if not quick else 2.0)
+        ))
+    for inputType in ("scalar", "list", "numpy"):
+        if inputType == "numpy" and importlib.util.find_spec("numpy") is None:
+            continue
+        benchmarks.append((
+            "aggregate_" + inputType, lambda s, t=inputType: benchAggregate(t, count(1000000))
+        ))
+    benchmarks.append(("dispatch_function_call", lambda s: benchDispatch(count(20000))))
+    for compression in (True, False):
+        benchmarks.append((
+            "cache_flush" + ("" if compression else "_uncompressed"),
+            lambda s, c=compression: benchCacheFlush(s, count(5000), c)
+        ))
+    benchmarks.append(("reconnect", lambda s: benchReconnect(s, count(20))))
+    for message, n in (("publish", 10000), ("register", 20)):
+        for compressionLevel in (None, 1, 6, 9):
+            benchmarks.append((
+                "deflate_" + message + ("_level" + str(compressionLevel) if compressionLevel is not None else "_off"),
+                lambda s, m=message, c=compressionLevel, n=n: benchDeflate(s, m, c, count(n))
+            ))
+    for keyframeEvery in (None, 10, 100):
+        benchmarks.append((
+            "delta_" + ("keyframe" + str(keyframeEvery) if keyframeEvery is not None else "off"),
+            lambda s, k=keyframeEvery: benchDelta(s, k, count(10000))
+        ))
+    for microBatching in (False, True):
+        for sockJsFraming in (True, False):
+            benchmarks.append((
+                "micro_batching_" + ("on" if microBatching else "off") + ("_sockjs" if sockJsFraming else "_raw"),
+                lambda s, b=microBatching, f=sockJsFraming: benchMicroBatching(s, b, f, count(20000))
+            ))
+
+    results = []
+    with MsbMockServer() as mockServer:
+        for name, benchmark in benchmarks:
+            if filter and filter not in name:
+                continue
+            result = benchmark(mockServer)
+            results.append(result)
+            sys.stderr.write(
+                "{:<36} {:>12.1f} ops/s {:>12.2f} us/op\n".format(name, result["opsPerSec"], result["meanUs"])
+            )
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.utcnow().isoformat()[:-3] + "Z",
+        "results": results,
+    }
+
+
+def compare(results, baseline):
+    """Compares the results with the results of a former run.
+
+    Args:
+        results (dict): The current results
+        baseline (dict): The former results
+    Returns:
+        list: (name, baseline ops/s, current ops/s, relative change) per benchmark found in both runs
+    """
+    former = {r["name"]: r for r in baseline["results"]}
+    comparison = []
+    for result in results["results"]:
+        if result["name"] in former and former[result["name"]]["opsPerSec"]:
+            before = former[result["name"]]["opsPerSec"]
+            comparison.append((result["name"], before, result["opsPerSec"], result["opsPerSec"] / before - 1))
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the msb client against the local mock MSB.")
+    parser.add_argument("--quick", action="store_true", help="run less iterations")
+    parser.add_argument("--filter", help="only run benchmarks containing this name")
+    parser.add_argument("--output", help="write the results as json to this file (default: stdout)")
+    parser.add_argument("--compare", help="compare with the json results of a former run")
+    parser.add_argument("--verbose", action="store_true", help="show the client log output")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    results = runAll(args.quick, args.filter)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for name, before, after, change in compare(results, baseline):
+            sys.stderr.write("{:<36} {:>+8.1%} ({:.1f} -> {:.1f} ops/s)\n".format(name, change, before, after))
+
+
+if __name__ == "__main__":
+    main()
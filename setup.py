@@ -51,6 +51,9 @@ setup(
         "jsonschema>=4.19.1",
         "enum34>=1.1.10",
     ],
+    extras_require={
+        "numpy": ["numpy"],
+    },
     zip_safe=False,
     license='Apache-2.0',
 )
@@ -0,0 +1,120 @@
+"""
+Benchmarks for the MSB Python client library (requires pytest-benchmark).
+Copyright (c) 2019
+Fraunhofer Institute for Manufacturing Engineering and Automation (IPA)
+See the file "LICENSE" for the full license governing this code.
+
+Run with: python -m pytest test/test_benchmark.py --benchmark-json=results.json
+"""
+import pytest
+
+from msb_client import bench
+from msb_client.MsbMockServer import MsbMockServer
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="module")
+def mockServer():
+    with MsbMockServer() as server:
+        yield server
+
+
+@pytest.fixture
+def connectedClient(mockServer):
+    client = bench.connectClient(bench.createClient(), mockServer)
+    yield client
+    client.disconnect()
+
+
+@pytest.mark.parametrize("validation", [True, False])
+@pytest.mark.parametrize("eventId", ["SIMPLE", "ARRAY", "COMPLEX"])
+def test_benchmarkPublish(benchmark, connectedClient, eventId, validation):
+    connectedClient.enableDataFormatValidation(validation)
+    value = bench.PUBLISH_VALUES[eventId]()
+    benchmark(connectedClient.publish, eventId, value)
+
+
+@pytest.mark.parametrize("nrOfEvents", [10, 1000, 10000])
+def test_benchmarkSelfDescription(benchmark, nrOfEvents):
+    client = bench.createClient(nrOfEvents)
+    benchmark.pedantic(lambda: client.objectToJson(client.getSelfDescription()), rounds=3)
+
+
+def test_benchmarkDispatch(benchmark):
+    client = bench.createClient()
+    frame = bench.createFunctionCallFrame()
+    benchmark(client.on_message, None, frame)
+
+
+@pytest.mark.parametrize("compression", [True, False])
+def test_benchmarkCacheFlush(benchmark, mockServer, compression):
+    result = benchmark.pedantic(bench.benchCacheFlush, args=(mockServer, 1000, compression), rounds=3)
+    assert result["delivered"] == 1000
+
+
+def test_benchmarkReconnect(benchmark, mockServer):
+    benchmark.pedantic(bench.benchReconnect, args=(mockServer, 1), rounds=5)
+
+
+@pytest.mark.parametrize("generated", [True, False])
+def test_benchmarkSerializeNested(benchmark, generated):
+    client = bench.createClient()
+    client.addEvent("NESTED", "Nested", "Nested event", bench.createNestedDataFormat(), 0, False)
+    serialize = client.events["NESTED"].serializer if generated else client.objectToJson
+    benchmark(serialize, bench.createNestedValue())
+
+
+@pytest.mark.parametrize("validationEngine", ["compiled", "jsonschema"])
+def test_benchmarkValidateFlat(benchmark, validationEngine):
+    client = bench.createClient()
+    client.setValidationEngine(validationEngine)
+    client.addEvent("FLAT", "Flat", "Flat event", bench.createFlatDataFormat(), 0, False)
+    benchmark(client._validateEventValue, client.events["FLAT"], bench.createFlatValue())
+
+
+def test_benchmarkEncodeSmallEvents(benchmark):
+    benchmark.pedantic(bench.benchEncodeSmallEvents, args=(10000,), rounds=3)
+
+
+@pytest.mark.parametrize("compressionLevel", [None, 1, 6])
+@pytest.mark.parametrize("message", ["publish", "register"])
+def test_benchmarkDeflate(benchmark, mockServer, message, compressionLevel):
+    n = 1000 if message == "publish" else 2
+    result = benchmark.pedantic(bench.benchDeflate, args=(mockServer, message, compressionLevel, n), rounds=3)
+    benchmark.extra_info.update(bytes=result["bytes"], ratio=result["ratio"])
+
+
+def test_benchmarkRateLimitCheck(benchmark):
+    client = bench.createClient()
+    client.setRateLimit(1e9, 1e9, eventId="SIMPLE")
+    benchmark(client._admit, "SIMPLE", ("SIMPLE", 1, None, False, None, None, None, None))
+
+
+@pytest.mark.parametrize("sockJsFraming", [True, False])
+@pytest.mark.parametrize("microBatching", [False, True])
+def test_benchmarkMicroBatching(benchmark, mockServer, microBatching, sockJsFraming):
+    result = benchmark.pedantic(
+        bench.benchMicroBatching, args=(mockServer, microBatching, sockJsFraming, 2000), rounds=3
+    )
+    benchmark.extra_info.update(meanBatchSize=result["meanBatchSize"])
+    assert result["delivered"] == 2000
+
+
+def test_benchmarkScheduler(benchmark):
+    result = benchmark.pedantic(bench.benchScheduler, args=(1000, 0.5, 2.0), rounds=1)
+    benchmark.extra_info.update(lagP99Us=result["lagP99Us"], skipped=result["skipped"])
+
+
+@pytest.mark.parametrize("inputType", ["scalar", "list", "numpy"])
+def test_benchmarkAggregate(benchmark, inputType):
+    if inputType == "numpy":
+        pytest.importorskip("numpy")
+    result = benchmark.pedantic(bench.benchAggregate, args=(inputType, 100000), rounds=3)
+    assert result["windows"] == 10
+
+
+@pytest.mark.parametrize("keyframeEvery", [None, 10, 100])
+def test_benchmarkDelta(benchmark, mockServer, keyframeEvery):
+    result = benchmark.pedantic(bench.benchDelta, args=(mockServer, keyframeEvery, 1000), rounds=3)
+    benchmark.extra_info.update(bytesPerEvent=result["bytesPerEvent"])
@@ -6,6 +6,9 @@ Author: Daniel Stock
 mailto: daniel DOT stock AT ipa DOT fraunhofer DOT com
 See the file "LICENSE" for the full license governing this code.
 """
+import array
+import base64
+import dataclasses
 import datetime
 
 import pytest
@@ -14,18 +17,40 @@ import uuid
 import json
 
 import sys
+import statistics
+import time
+import threading
+
+from urllib.request import urlopen
 
 from msb_client.ComplexDataFormat import ComplexDataFormat
 from msb_client.DataType import DataType
+from msb_client.DeltaEncoding import DeltaDecoder, DeltaEncoder, applyPatch
+from msb_client.EndpointPool import EndpointPool
+from msb_client.EventCache import EventCache
+from msb_client.EventEnvelope import TimestampFormatter
+from msb_client.LogHelper import Preview
 from msb_client.Event import Event
 from msb_client.Function import Function
-from msb_client.MsbClient import MsbClient
+from msb_client.MicroBatcher import MicroBatcher
+from msb_client.MsbClient import MsbClient, checkRawDataObject, expandColumnar, validateValueForComplexDataformat
+from msb_client.MsbMockServer import MsbMockServer
+from msb_client.NumericArray import encodeNumericArray
+from msb_client.PerMessageDeflate import DeflateContext, PerMessageDeflate, parseExtension
+from msb_client.ProfilingHook import LatencyHistogramHook, ProfilingHook
+from msb_client.ValidatorCompiler import compileValidator
+from msb_client.WindowAggregator import WindowAggregator
 
 try:
     import unittest2 as unittest
 except ImportError:
     import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 FORMAT = "%(asctime)s %(levelname)s %(message)s"
 logging.basicConfig(format=FORMAT, level=logging.DEBUG)
 
@@ -2795,6 +2820,885 @@ class TestMSBClientEventCaching(unittest.TestCase):
                 eventFoundInCache = True
         self.assertEqual(eventFoundInCache, False)
 
+
+class TestMSBClientEndpointFailover(unittest.TestCase):
+    """
+    Test the selection of and failover between several msb endpoints
+    """
+
+    def test_setEndpointsViaConstructorAndCommaSeparatedString(self):
+        # 1. ARRANGE
+        endpoints_list = ["ws://msb1:8085", "ws://msb2:8085"]
+        endpoints_string = "ws://msb3:8085, ws://msb4:8085"
+
+        # 2. ACT
+        myMsbClient = MsbClient(
+            SERVICE_TYPE,
+            SO_UUID,
+            SO_NAME,
+            SO_DESCRIPTION,
+            SO_TOKEN,
+            msb_url=endpoints_list
+        )
+        myMsbClient2 = MsbClient()
+        myMsbClient2.setEndpoints(endpoints_string)
+
+        # 3. ASSERT
+        self.assertEqual(myMsbClient.endpoints.getUrls(), endpoints_list)
+        self.assertEqual(myMsbClient.msb_url, "ws://msb1:8085")
+        self.assertEqual(myMsbClient2.endpoints.getUrls(), ["ws://msb3:8085", "ws://msb4:8085"])
+
+    def test_selectFastestHealthyEndpoint(self):
+        # 1. ARRANGE
+        pool = EndpointPool(["ws://msb1:8085", "ws://msb2:8085", "ws://msb3:8085"], cooldown=60)
+
+        # 2. ACT
+        selected_first = pool.select()
+        pool.reportSuccess(0.5)
+        pool.endpoints[1].latency = 0.1
+        pool.endpoints[2].latency = 0.2
+        selected_fastest = pool.select()
+        pool.reportFailure()
+        selected_after_failure = pool.select()
+
+        # 3. ASSERT
+        self.assertEqual(selected_first, "ws://msb1:8085")
+        self.assertEqual(selected_fastest, "ws://msb2:8085")
+        self.assertEqual(selected_after_failure, "ws://msb3:8085")
+        self.assertEqual(pool.getStats()[1]["failures"], 1)
+        self.assertEqual(pool.getStats()[0]["connects"], 1)
+
+    def test_preferMeasuredEndpointOverUnmeasured(self):
+        # 1. ARRANGE
+        pool = EndpointPool(["ws://msb1:8085", "ws://msb2:8085", "ws://msb3:8085"], cooldown=60)
+        pool.endpoints[1].latency = 0.3
+
+        # 2. ACT
+        selected_measured = pool.select()
+        pool.reportFailure()
+        selected_unmeasured = pool.select()
+
+        # 3. ASSERT
+        self.assertEqual(selected_measured, "ws://msb2:8085")
+        self.assertEqual(selected_unmeasured, "ws://msb1:8085")
+
+    def test_failoverWithoutWaitingAndKeepCachedEvents(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient(msb_url=["ws://msb1:8085", "ws://msb2:8085"])
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.STRING, 0, False)
+        myMsbClient.publish("E1", "Cached value", cached=True)
+        myMsbClient.setReconnectInterval(60000)
+        reconnects = []
+        myMsbClient.connect = lambda msb_url=None: reconnects.append(myMsbClient.endpoints.select())
+        myMsbClient.endpoints.select()
+
+        # 2. ACT
+        start = datetime.datetime.now()
+        myMsbClient.on_close(None, 1006, "connection lost")
+        duration = (datetime.datetime.now() - start).total_seconds()
+
+        # 3. ASSERT
+        self.assertLess(duration, 5)
+        self.assertEqual(reconnects, ["ws://msb2:8085"])
+        self.assertEqual(len(myMsbClient.eventCache), 1)
+
+
+class TestMSBClientMetrics(unittest.TestCase):
+    """
+    Test the client metrics and their prometheus exposition
+    """
+
+    def test_recordPublishAndCacheMetrics(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.setEventCacheSize(1)
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.STRING, 0, False)
+
+        # 2. ACT
+        myMsbClient.publish("E1", "value 1", cached=True)
+        myMsbClient.publish("E1", 2, cached=True)
+        myMsbClient.publish("E1", "value 3", cached=False)
+        metrics = myMsbClient.getMetrics()
+
+        # 3. ASSERT
+        self.assertEqual(metrics["msb_events_published_total"]["samples"][0]["labels"], {"eventId": "E1"})
+        self.assertEqual(metrics["msb_events_published_total"]["samples"][0]["value"], 3)
+        self.assertEqual(metrics["msb_validation_failures_total"]["samples"][0]["value"], 1)
+        self.assertEqual(metrics["msb_events_cached_total"]["samples"][0]["value"], 2)
+        self.assertEqual(metrics["msb_event_cache_evictions_total"]["samples"][0]["value"], 1)
+        self.assertEqual(metrics["msb_event_cache_size"]["samples"][0]["value"], 1)
+        self.assertEqual(metrics["msb_events_discarded_total"]["samples"][0]["value"], 1)
+        self.assertEqual(metrics["msb_publish_seconds"]["samples"][0]["count"], 3)
+
+    def test_servePrometheusTextFormat(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.STRING, 0, False)
+        myMsbClient.publish("E1", "value 1", cached=True)
+
+        # 2. ACT
+        port = myMsbClient.startMetricsServer(0)
+        try:
+            text = urlopen("http://127.0.0.1:" + str(port) + "/metrics").read().decode("utf-8")
+        finally:
+            myMsbClient.stopMetricsServer()
+
+        # 3. ASSERT
+        self.assertIn("# TYPE msb_events_published_total counter", text)
+        self.assertIn('msb_events_published_total{eventId="E1"} 1', text)
+        self.assertIn('msb_publish_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn("msb_publish_seconds_count 1", text)
+
+
+class TestMSBClientProfilingHooks(unittest.TestCase):
+    """
+    Test the per-stage profiling hooks for publish and incoming function calls
+    """
+
+    def test_profilePublishStagesWithSampling(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.STRING, 0, False)
+        reports = []
+
+        class RecordingHook(ProfilingHook):
+            def onPublish(self, eventId, timings):
+                reports.append((eventId, timings))
+
+        # 2. ACT
+        myMsbClient.addProfilingHook(RecordingHook(), sampleEvery=2)
+        for i in range(4):
+            myMsbClient.publish("E1", "value " + str(i), cached=True)
+
+        # 3. ASSERT
+        self.assertEqual(len(reports), 2)
+        self.assertEqual(reports[0][0], "E1")
+        self.assertEqual([stage for stage, duration in reports[0][1]], ["build", "validate", "serialize", "cache"])
+        self.assertTrue(all(isinstance(duration, int) for stage, duration in reports[0][1]))
+
+    def test_aggregateFunctionCallLatencyHistograms(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        received = []
+        myMsbClient.addFunction("F1", "F1", "F1", DataType.STRING, received.append)
+        hook = LatencyHistogramHook(myMsbClient.metrics)
+        myMsbClient.addProfilingHook(hook)
+        message = 'a["C {\\"functionId\\":\\"F1\\",\\"functionParameters\\":{\\"dataObject\\":\\"x\\"}}"]'
+
+        # 2. ACT
+        myMsbClient.on_message(None, message)
+        myMsbClient.on_message(None, message)
+        summary = hook.getSummary()
+
+        # 3. ASSERT
+        self.assertEqual(len(received), 2)
+        self.assertEqual(
+            sorted(summary["message"]["F1"].keys()),
+            ["dispatch", "handler", "parse", "total", "unframe"]
+        )
+        self.assertEqual(summary["message"]["F1"]["total"]["count"], 2)
+        self.assertIn("msb_stage_seconds", myMsbClient.getMetrics())
+
+
+class TestMSBClientWithMockServer(unittest.TestCase):
+    """
+    Test the communication with the local mock msb server
+    """
+
+    def connectToMockServer(self, mockServer, sockJsFraming=True):
+        myMsbClient = MsbClient(SERVICE_TYPE, SO_UUID, SO_NAME, SO_DESCRIPTION, SO_TOKEN)
+        myMsbClient.disableSockJsFraming(not sockJsFraming)
+        myMsbClient.disableAutoReconnect(True)
+        myMsbClient.enableThreadAsDaemon(True)
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.STRING, 0, False)
+        myMsbClient.addFunction("F1", "F1", "F1", DataType.STRING, printMsg)
+        myMsbClient.connect(mockServer.url)
+        myMsbClient.register()
+        return myMsbClient
+
+    def waitFor(self, condition, timeout=5):
+        start = datetime.datetime.now()
+        while not condition() and (datetime.datetime.now() - start).total_seconds() < timeout:
+            time.sleep(0.01)
+        return condition()
+
+    def test_registerPublishAndReceiveFunctionCall(self):
+        for sockJsFraming in [True, False]:
+            with MsbMockServer() as mockServer:
+                # 1. ARRANGE
+                myMsbClient = self.connectToMockServer(mockServer, sockJsFraming)
+                self.assertTrue(self.waitFor(lambda: myMsbClient.registered))
+                received = []
+                myMsbClient.functions["F1"].implementation = received.append
+
+                # 2. ACT
+                myMsbClient.publish("E1", 'Hello "MSB"', correlationId="corr1")
+                mockServer.sendFunctionCall("F1", {"dataObject": "Hello Client"}, "corr2")
+
+                # 3. ASSERT
+                self.assertTrue(mockServer.waitForEvents(1))
+                self.assertEqual(mockServer.events[0]["dataObject"], 'Hello "MSB"')
+                self.assertEqual(mockServer.events[0]["correlationId"], "corr1")
+                self.assertEqual(mockServer.registrations[0]["uuid"], SO_UUID)
+                self.assertTrue(self.waitFor(lambda: len(received) == 1))
+                self.assertEqual(received[0], {"dataObject": "Hello Client", "correlationId": "corr2"})
+                myMsbClient.disconnect()
+
+    def test_simulateRegistrationErrorAndDroppedEvents(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            mockServer.failNextRegistrations(1, "NIO_UNAUTHORIZED_CONNECTION")
+            mockServer.dropRate = 1.0
+
+            # 2. ACT
+            myMsbClient = self.connectToMockServer(mockServer)
+            closed = self.waitFor(lambda: not myMsbClient.connected and myMsbClient.ws.sock is None)
+
+            # 3. ASSERT
+            self.assertTrue(closed)
+            self.assertFalse(myMsbClient.registered)
+            self.assertEqual(len(mockServer.registrations), 0)
+            self.assertEqual(len(mockServer.events), 0)
+
+
+class TestMSBClientNumericArrays(unittest.TestCase):
+    """
+    Test publishing and validation of numpy arrays, array.array and memoryview for array events
+    """
+
+    def test_validateArrayModuleArraysByTypecode(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("INT32_ARRAY", "E1", "E1", DataType.INT32, 0, True)
+        myMsbClient.addEvent("DOUBLE_ARRAY", "E2", "E2", DataType.DOUBLE, 0, True)
+        event_int32 = myMsbClient.events["INT32_ARRAY"]
+        event_double = myMsbClient.events["DOUBLE_ARRAY"]
+
+        # 2. ACT
+        valid_int32 = MsbClient.validateValueForDataFormat(
+            array.array("i", [1, 2, 3]), event_int32.df, event_int32.dataFormat, True)
+        invalid_int32 = MsbClient.validateValueForDataFormat(
+            array.array("q", [1, 2, 3]), event_int32.df, event_int32.dataFormat, True)
+        valid_double = MsbClient.validateValueForDataFormat(
+            memoryview(array.array("d", [1.5, 2.5])), event_double.df, event_double.dataFormat, True)
+        invalid_double = MsbClient.validateValueForDataFormat(
+            array.array("i", [1, 2]), event_double.df, event_double.dataFormat, True)
+
+        # 3. ASSERT
+        self.assertEqual(valid_int32, True)
+        self.assertEqual(invalid_int32, False)
+        self.assertEqual(valid_double, True)
+        self.assertEqual(invalid_double, False)
+
+    def test_publishArrayModuleArrayAndMemoryview(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("DOUBLE_ARRAY", "E1", "E1", DataType.DOUBLE, 0, True)
+        values = [0.1, 1.0 / 3, -2.5e-10, 12345.678]
+
+        # 2. ACT
+        myMsbClient.publish("DOUBLE_ARRAY", array.array("d", values), cached=True)
+        myMsbClient.publish("DOUBLE_ARRAY", memoryview(array.array("d", values)), cached=True)
+
+        # 3. ASSERT
+        self.assertEqual(json.loads(myMsbClient.eventCache[0])["dataObject"], values)
+        self.assertEqual(json.loads(myMsbClient.eventCache[1])["dataObject"], values)
+        self.assertEqual(json.loads(myMsbClient.eventCache[1])["eventId"], "DOUBLE_ARRAY")
+
+    @unittest.skipIf(numpy is None, "numpy not installed")
+    def test_validateAndPublishNumpyArrays(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("FLOAT_ARRAY", "E1", "E1", DataType.FLOAT, 0, True)
+        myMsbClient.addEvent("BOOL_ARRAY", "E2", "E2", DataType.BOOLEAN, 0, True)
+        event_float = myMsbClient.events["FLOAT_ARRAY"]
+        samples = numpy.linspace(0, 1, 10000, dtype=numpy.float32)
+
+        # 2. ACT
+        valid_float = MsbClient.validateValueForDataFormat(
+            samples, event_float.df, event_float.dataFormat, True)
+        invalid_float = MsbClient.validateValueForDataFormat(
+            samples.astype(numpy.float64), event_float.df, event_float.dataFormat, True)
+        invalid_shape = MsbClient.validateValueForDataFormat(
+            samples.reshape(100, 100), event_float.df, event_float.dataFormat, True)
+        myMsbClient.publish("FLOAT_ARRAY", samples, cached=True)
+        myMsbClient.publish("BOOL_ARRAY", numpy.array([True, False]), cached=True)
+
+        # 3. ASSERT
+        self.assertEqual(valid_float, True)
+        self.assertEqual(invalid_float, False)
+        self.assertEqual(invalid_shape, False)
+        published = numpy.array(json.loads(myMsbClient.eventCache[0])["dataObject"], dtype=numpy.float32)
+        self.assertTrue(numpy.array_equal(published, samples))
+        self.assertEqual(json.loads(myMsbClient.eventCache[1])["dataObject"], [True, False])
+
+    @unittest.skipIf(numpy is None, "numpy not installed")
+    def test_encodeNumpyArraysExactly(self):
+        # 1. ARRANGE
+        arrays = [numpy.array([numpy.iinfo(t).min, numpy.iinfo(t).max, 0], dtype=t) for t in ("i1", "i4", "i8", "u8")]
+        arrays += [numpy.array([-numpy.finfo(t).max, numpy.finfo(t).smallest_subnormal, 0.1], dtype=t)
+                   for t in ("f2", "f4", "f8")]
+
+        # 2. ACT
+        encoded = [encodeNumericArray(values) for values in arrays]
+
+        # 3. ASSERT
+        for values, text in zip(arrays, encoded):
+            self.assertTrue(numpy.array_equal(numpy.array(json.loads(text), dtype=values.dtype), values))
+        self.assertEqual(encodeNumericArray(numpy.arange(10)[::3]), "[0,3,6,9]")
+        self.assertEqual(encodeNumericArray(numpy.array([], dtype=numpy.float64)), "[]")
+        for invalid in (numpy.array([1.0, numpy.nan]), numpy.array([-numpy.inf]), array.array("d", [numpy.inf])):
+            with self.assertRaises(Exception):
+                encodeNumericArray(invalid)
+
+
+class TestMSBClientColumnarEvents(unittest.TestCase):
+    """
+    Test publishing blocks of time series samples as columnar events
+    """
+
+    def test_publishColumnarBlockAsSingleEvent(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addColumnarEvent("TEMPERATURES", "Temperatures", "Temperature samples", DataType.DOUBLE)
+        start = datetime.datetime(2024, 1, 1, 12, 0, 0)
+        timestamps = [start + datetime.timedelta(milliseconds=10 * i) for i in range(100)]
+        values = [20.0 + i / 10 for i in range(100)]
+
+        # 2. ACT
+        stats = myMsbClient.publishColumnar("TEMPERATURES", timestamps, values, cached=True)
+
+        # 3. ASSERT
+        self.assertEqual(len(myMsbClient.eventCache), 1)
+        event = json.loads(myMsbClient.eventCache[0])
+        samples = list(expandColumnar(event["dataObject"]))
+        self.assertEqual(len(samples), 100)
+        self.assertEqual(samples[1], ("2024-01-01T12:00:00.010Z", 20.1))
+        self.assertEqual(stats["samples"], 100)
+        self.assertGreater(stats["bytesSavedPerSample"], 100)
+        self.assertEqual(
+            MsbClient.validateValueForDataFormat(
+                event["dataObject"],
+                myMsbClient.events["TEMPERATURES"].df,
+                myMsbClient.events["TEMPERATURES"].dataFormat,
+                False
+            ),
+            True
+        )
+
+    def test_doNotPublishColumnarBlockWithDifferentLengths(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addColumnarEvent("COUNTS", "Counts", "Count samples", DataType.INT32)
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, True)
+        errorOnDifferentLengths = False
+        errorOnNonColumnarEvent = False
+
+        # 2. ACT
+        try:
+            myMsbClient.publishColumnar("COUNTS", [1700000000.0, 1700000001.0], [1], cached=True)
+        except Exception:
+            errorOnDifferentLengths = True
+        try:
+            myMsbClient.publishColumnar("E1", [1700000000.0], [1], cached=True)
+        except Exception:
+            errorOnNonColumnarEvent = True
+
+        # 3. ASSERT
+        self.assertEqual(errorOnDifferentLengths, True)
+        self.assertEqual(errorOnNonColumnarEvent, True)
+        self.assertEqual(len(myMsbClient.eventCache), 0)
+
+
+class TestMSBClientGeneratedSerializer(unittest.TestCase):
+    """
+    Test the serializers generated for complex data formats
+    """
+
+    def createClient(self):
+        myMsbClient = MsbClient()
+        myModule = ComplexDataFormat("SerializerModule")
+        myModule.addProperty("moduleName", DataType.STRING, False)
+        myModule.addProperty("moduleTemperature", DataType.DOUBLE, False)
+        myDevice = ComplexDataFormat("SerializerDevice")
+        myDevice.addProperty("deviceName", DataType.STRING, False)
+        myDevice.addProperty("deviceWeight", DataType.FLOAT, False)
+        myDevice.addProperty("deviceCounts", DataType.INT32, True)
+        myDevice.addProperty("online", DataType.BOOLEAN, False)
+        myDevice.addProperty("submodules", myModule, True)
+        myMsbClient.addEvent("DEVICE", "Device", "Device event", myDevice, 0, False)
+        myMsbClient.addEvent("DEVICES", "Devices", "Device array event", myDevice, 0, True)
+        return myMsbClient
+
+    def test_serializerMatchesObjectToJson(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+
+        @dataclasses.dataclass
+        class Device:
+            deviceName: str
+            deviceWeight: float
+            deviceCounts: list
+            online: bool
+            submodules: list
+
+        myModuleObj = myClass()
+        myModuleObj.moduleName = "Module \"2\""
+        myModuleObj.moduleTemperature = 22.5
+        myDeviceObj = {
+            "deviceName": "Device 1",
+            "deviceWeight": 1.3,
+            "deviceCounts": [1, 2, 3],
+            "online": True,
+            "submodules": [{"moduleName": "Module 1", "moduleTemperature": 20.0}, myModuleObj],
+        }
+        values = [
+            ("DEVICE", myDeviceObj),
+            ("DEVICE", Device("Device 2", float("nan"), [], None, [myModuleObj])),
+            ("DEVICE", dict(myDeviceObj, additionalProperty=datetime.date(2024, 1, 1).isoformat())),
+            ("DEVICE", {"deviceName": "Device 3"}),
+            ("DEVICES", [myDeviceObj, myDeviceObj]),
+        ]
+
+        for eventId, value in values:
+            # 2. ACT
+            serialized = myMsbClient.events[eventId].serializer(value)
+
+            # 3. ASSERT
+            self.assertEqual(
+                json.loads(serialized), json.loads(myMsbClient.objectToJson(value))
+            )
+
+    def test_publishUsesGeneratedSerializer(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+        myDeviceObj = {
+            "deviceName": "Device 1",
+            "deviceWeight": 1.3,
+            "deviceCounts": [1, 2, 3],
+            "online": True,
+            "submodules": [],
+        }
+
+        # 2. ACT
+        myMsbClient.publish("DEVICE", myDeviceObj, cached=True)
+
+        # 3. ASSERT
+        self.assertIsNotNone(myMsbClient.events["DEVICE"].serializer)
+        self.assertEqual(json.loads(myMsbClient.eventCache[0])["dataObject"], myDeviceObj)
+
+
+class TestMSBClientCompiledValidation(unittest.TestCase):
+    """
+    Test the compiled validation engine against the jsonschema engine
+    """
+
+    def createClient(self, validationEngine):
+        myMsbClient = MsbClient()
+        myMsbClient.setValidationEngine(validationEngine)
+        myModule = ComplexDataFormat("ValidatorModule")
+        myModule.addProperty("moduleName", DataType.STRING, False)
+        myModule.addProperty("moduleTemperature", DataType.DOUBLE, False)
+        myModule.addProperty("moduleData", DataType.BYTE, False)
+        myDevice = ComplexDataFormat("ValidatorDevice")
+        myDevice.addProperty("deviceName", DataType.STRING, False)
+        myDevice.addProperty("deviceCount", DataType.INT32, False)
+        myDevice.addProperty("online", DataType.BOOLEAN, False)
+        myDevice.addProperty("lastSeen", DataType.DATETIME, False)
+        myDevice.addProperty("submodules", myModule, True)
+        myMsbClient.addEvent("DEVICE", "Device", "Device event", myDevice, 0, False)
+        myMsbClient.addEvent("DEVICES", "Devices", "Device array event", myDevice, 0, True)
+        return myMsbClient
+
+    def getValues(self):
+        myDeviceObj = {
+            "deviceName": "Device 1",
+            "deviceCount": 3,
+            "online": True,
+            "lastSeen": "2024-01-01T12:00:00.000Z",
+            "submodules": [{"moduleName": "Module 1", "moduleTemperature": 20.5, "moduleData": "AAEC"}],
+        }
+        return [
+            ("DEVICE", myDeviceObj),
+            ("DEVICE", dict(myDeviceObj, deviceCount=3.0)),
+            ("DEVICE", dict(myDeviceObj, deviceCount=True)),
+            ("DEVICE", dict(myDeviceObj, deviceName=None)),
+            ("DEVICE", dict(myDeviceObj, submodules=[{"moduleTemperature": "hot"}])),
+            ("DEVICE", [myDeviceObj]),
+            ("DEVICES", [myDeviceObj, {"deviceName": "Device 2"}]),
+            ("DEVICES", [myDeviceObj, {"deviceName": 2}]),
+            ("DEVICES", myDeviceObj),
+        ]
+
+    def setUp(self):
+        # compare all error messages
+        MsbClient().setErrorLogRateLimit(0)
+
+    def tearDown(self):
+        MsbClient().setErrorLogRateLimit()
+
+    def validate(self, myMsbClient, eventId, value):
+        with self.assertLogs(level="DEBUG") as logs:
+            logging.debug("validating")
+            valid = myMsbClient._validateEventValue(myMsbClient.events[eventId], value)
+        return valid, [line for line in logs.output if "Error validating event" in line]
+
+    def test_compiledValidationParity(self):
+        # 1. ARRANGE
+        compiledMsbClient = self.createClient("compiled")
+        jsonschemaMsbClient = self.createClient("jsonschema")
+
+        for eventId, value in self.getValues():
+            # 2. ACT
+            compiledResult = self.validate(compiledMsbClient, eventId, value)
+            jsonschemaResult = self.validate(jsonschemaMsbClient, eventId, value)
+
+            # 3. ASSERT
+            self.assertIsNotNone(compiledMsbClient.events[eventId].validator)
+            self.assertEqual(compiledResult, jsonschemaResult, str(value))
+            if compiledMsbClient.events[eventId].validator(value):
+                self.assertEqual(jsonschemaResult[0], True)
+
+    def test_strictFormatsOnlyInCompiledEngine(self):
+        # 1. ARRANGE
+        compiledMsbClient = self.createClient("compiled")
+        jsonschemaMsbClient = self.createClient("jsonschema")
+        myDeviceObj = self.getValues()[0][1]
+        notBase64 = dict(myDeviceObj, submodules=[{"moduleData": "not base64!"}])
+        invalidDates = [dict(myDeviceObj, lastSeen=date) for date in ("yesterday", "2024-01-01T12:00:00")]
+
+        # 2. ACT
+        compiledResults = [self.validate(compiledMsbClient, "DEVICE", value) for value in [notBase64] + invalidDates]
+        jsonschemaResult = self.validate(jsonschemaMsbClient, "DEVICE", notBase64)
+
+        # 3. ASSERT
+        for valid, errors in compiledResults:
+            self.assertEqual(valid, False)
+            self.assertEqual(len(errors), 1)
+        # byte is no format of jsonschema, the jsonschema engine does not check it
+        self.assertEqual(jsonschemaResult, (True, []))
+        self.assertEqual(
+            validateValueForComplexDataformat(notBase64, compiledMsbClient.events["DEVICE"].dataFormat, False), True)
+
+    def test_compileValidatorForRequiredAndUnsupportedKeywords(self):
+        # 1. ARRANGE
+        sensorFormat = {
+            "Sensor": {
+                "type": "object",
+                "properties": {"id": {"type": "string"}, "value": {"type": "number"}},
+                "required": ["id"],
+            },
+            "dataObject": {"$ref": "#/definitions/Sensor", "type": "object"},
+        }
+        stateFormat = {
+            "State": {"type": "object", "properties": {"state": {"type": "string", "enum": ["ON", "OFF"]}}},
+            "dataObject": {"$ref": "#/definitions/State", "type": "object"},
+        }
+
+        # 2. ACT
+        validator = compileValidator(sensorFormat)
+
+        # 3. ASSERT
+        for value in ({"id": "S1", "value": 1}, {"id": "S1", "value": False}, {"value": 1}, {"id": 1}):
+            self.assertEqual(validator(value), validateValueForComplexDataformat(value, sensorFormat, False))
+        self.assertIsNone(compileValidator(stateFormat))
+        with self.assertRaises(Exception):
+            MsbClient().setValidationEngine("fastest")
+
+
+class TestMSBClientValidationModes(unittest.TestCase):
+    """
+    Test the full, sampled, trust and off validation modes
+    """
+
+    def createClient(self):
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False)
+        myMsbClient.addEvent("E2", "E2", "E2", DataType.INT32, 0, False)
+        return myMsbClient
+
+    def publish(self, myMsbClient, eventId, value, count=1):
+        for i in range(count):
+            myMsbClient.publish(eventId, value, cached=True)
+
+    def getDecisions(self, myMsbClient, eventId, decision):
+        return myMsbClient.metrics.validationDecisions.labels(eventId, decision).value
+
+    def getFailures(self, myMsbClient, eventId):
+        return myMsbClient.metrics.validationFailures.labels(eventId).value
+
+    def test_sampledValidation(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+        myMsbClient.setValidationMode("sampled", sampleEvery=3)
+
+        # 2. ACT
+        self.publish(myMsbClient, "E1", "invalid", 9)
+        self.publish(myMsbClient, "E2", "invalid", 2)
+
+        # 3. ASSERT
+        self.assertEqual(self.getFailures(myMsbClient, "E1"), 3)
+        self.assertEqual(self.getDecisions(myMsbClient, "E1", "validated"), 3)
+        self.assertEqual(self.getDecisions(myMsbClient, "E1", "skipped"), 6)
+        self.assertEqual(self.getFailures(myMsbClient, "E2"), 1)
+        self.assertEqual(len(myMsbClient.eventCache), 11)
+
+    def test_trustAfterConsecutivePasses(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+        myMsbClient.setValidationMode("trust", validateFirst=2, trustAfter=3)
+
+        # 2. ACT
+        self.publish(myMsbClient, "E1", 1, 2)
+        self.publish(myMsbClient, "E1", "invalid")
+        self.publish(myMsbClient, "E1", 1, 3)
+        trusted = myMsbClient.getValidationStats()["E1"]["trusted"]
+        self.publish(myMsbClient, "E1", "invalid")
+        failuresWhileTrusted = self.getFailures(myMsbClient, "E1")
+        # a rejected event resets the trust
+        myMsbClient.on_message(None, 'a["NIO_EVENT_FORWARDING_ERROR"]')
+        self.publish(myMsbClient, "E1", "invalid")
+
+        # 3. ASSERT
+        self.assertEqual(trusted, True)
+        self.assertEqual(failuresWhileTrusted, 1)
+        self.assertEqual(self.getFailures(myMsbClient, "E1"), 2)
+        self.assertEqual(self.getDecisions(myMsbClient, "E1", "skipped"), 1)
+        self.assertEqual(myMsbClient.getValidationStats()["E1"]["trusted"], False)
+
+    def test_eventValidationModeOverridesGlobalMode(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+        myMsbClient.setValidationMode("full", eventId="E2")
+        myMsbClient.setValidationMode("off")
+
+        # 2. ACT
+        self.publish(myMsbClient, "E1", "invalid", 2)
+        self.publish(myMsbClient, "E2", "invalid", 2)
+
+        # 3. ASSERT
+        self.assertEqual(self.getFailures(myMsbClient, "E1"), 0)
+        self.assertEqual(self.getDecisions(myMsbClient, "E1", "skipped"), 2)
+        self.assertEqual(self.getFailures(myMsbClient, "E2"), 2)
+        with self.assertRaises(Exception):
+            myMsbClient.setValidationMode("sometimes")
+        with self.assertRaises(Exception):
+            myMsbClient.setValidationMode("sampled")
+
+
+class TestMSBClientLogging(unittest.TestCase):
+    """
+    Test the lazy, truncated and rate limited log messages
+    """
+
+    def test_payloadPreviewIsLazyAndTruncated(self):
+        # 1. ARRANGE
+        conversions = []
+
+        class Payload:
+            def __str__(self):
+                conversions.append(1)
+                return "x" * 1000
+
+        preview = Preview(Payload(), 50)
+        bigList = list(range(100000))
+
+        # 2. ACT
+        logging.getLogger("msb_client").setLevel(logging.INFO)
+        try:
+            logging.getLogger("msb_client.MsbClient").debug("SENDING: %s", preview)
+        finally:
+            logging.getLogger("msb_client").setLevel(logging.NOTSET)
+
+        # 3. ASSERT
+        self.assertEqual(conversions, [])
+        self.assertEqual(str(preview), "x" * 50 + "... (1000 chars)")
+        self.assertEqual(len(conversions), 1)
+        self.assertLess(len(str(Preview(bigList))), 250)
+        self.assertTrue(str(Preview(bigList)).endswith("(100000 items)"))
+
+    def test_repeatedValidationErrorsAreRateLimited(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.setErrorLogRateLimit(3, 60)
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, True)
+
+        # 2. ACT
+        with self.assertLogs("msb_client", level="ERROR") as logs:
+            for i in range(10):
+                myMsbClient.publish("E1", ["invalid"] * 100000, cached=True)
+        myMsbClient.setErrorLogRateLimit()
+
+        # 3. ASSERT
+        self.assertEqual(len(logs.output), 3)
+        self.assertLess(max(len(line) for line in logs.output), 500)
+        self.assertEqual(myMsbClient.metrics.validationFailures.labels("E1").value, 10)
+
+
+class TestMSBClientPublishRaw(unittest.TestCase):
+    """
+    Test publishing already json encoded values
+    """
+
+    def createClient(self):
+        myMsbClient = MsbClient()
+        myModule = ComplexDataFormat("RawModule")
+        myModule.addProperty("moduleName", DataType.STRING, False)
+        myModule.addProperty("moduleTemperature", DataType.DOUBLE, False)
+        myMsbClient.addEvent("MODULE", "Module", "Module event", myModule, 0, False)
+        myMsbClient.addEvent("COUNTS", "Counts", "Counts event", DataType.INT32, 0, True)
+        myMsbClient.addEvent("COUNT", "Count", "Count event", DataType.INT32, 0, False)
+        return myMsbClient
+
+    def test_publishRawValues(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+
+        # 2. ACT
+        myMsbClient.publishRaw("MODULE", '{"moduleName": "Module 1", "moduleTemperature": 20.5}', cached=True)
+        myMsbClient.publishRaw("COUNTS", b"[1, 2, 3]", 2, True, None, "corr1", checkWellFormed=True)
+        myMsbClient.publishRaw("COUNT", bytearray(b" 42\n"), cached=True, checkWellFormed=True)
+
+        # 3. ASSERT
+        events = [json.loads(e) for e in myMsbClient.eventCache]
+        self.assertEqual(events[0]["dataObject"], {"moduleName": "Module 1", "moduleTemperature": 20.5})
+        self.assertEqual(events[1]["dataObject"], [1, 2, 3])
+        self.assertEqual(events[1]["priority"], 2)
+        self.assertEqual(events[1]["correlationId"], "corr1")
+        self.assertEqual(events[2]["dataObject"], 42)
+        self.assertEqual(events[2]["uuid"], myMsbClient.uuid)
+
+    def test_publishRawChecksAndValidation(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+        malformed = [("MODULE", '["Module 1"]'), ("COUNTS", "[1, 2"), ("COUNT", "true"), ("COUNT", "")]
+
+        # 2. ACT
+        for eventId, value in malformed:
+            with self.assertRaises(Exception):
+                myMsbClient.publishRaw(eventId, value, cached=True, checkWellFormed=True)
+        myMsbClient.publishRaw("COUNTS", '["a", "b"]', cached=True, validate=True)
+        myMsbClient.publishRaw("COUNTS", '["a", "b"]', cached=True)
+
+        # 3. ASSERT
+        self.assertEqual(len(myMsbClient.eventCache), 2)
+        self.assertEqual(myMsbClient.metrics.validationFailures.labels("COUNTS").value, 1)
+        self.assertIsNone(checkRawDataObject('{"moduleName": "x"}', myMsbClient.events["MODULE"].dataFormat))
+        self.assertIsNone(checkRawDataObject("-1.5e3", myMsbClient.events["COUNT"].dataFormat))
+
+
+class TestMSBClientEventEnvelope(unittest.TestCase):
+    """
+    Test the precomputed event envelopes and the timestamp formatter
+    """
+
+    def test_timestampFormatter(self):
+        # 1. ARRANGE
+        formatter = TimestampFormatter()
+
+        # 2. ACT
+        before = datetime.datetime.utcnow() - datetime.timedelta(milliseconds=1)
+        timestamps = [formatter.now() for i in range(1000)]
+        after = datetime.datetime.utcnow()
+
+        # 3. ASSERT
+        for timestamp in (timestamps[0], timestamps[-1]):
+            self.assertRegex(timestamp, r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z$")
+            parsed = datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
+            self.assertTrue(before <= parsed <= after)
+        self.assertEqual(sorted(timestamps), timestamps)
+
+    def test_envelopeFollowsPriorityAndUuid(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.STRING, 1, False)
+
+        # 2. ACT
+        myMsbClient.publish("E1", "first", cached=True)
+        myMsbClient.publish("E1", "second", 2, True, "2024-01-01T12:00:00.000Z", "corr1")
+        myMsbClient.uuid = "changed-uuid"
+        myMsbClient.publish("E1", 'quote " and line\nbreak', cached=True)
+
+        # 3. ASSERT
+        events = [json.loads(e) for e in myMsbClient.eventCache]
+        self.assertEqual(events[0]["priority"], 1)
+        self.assertEqual(events[1]["priority"], 2)
+        self.assertEqual(events[1]["postDate"], "2024-01-01T12:00:00.000Z")
+        self.assertEqual(events[1]["correlationId"], "corr1")
+        self.assertEqual(events[2]["priority"], 2)
+        self.assertEqual(events[2]["uuid"], "changed-uuid")
+        self.assertEqual(events[2]["dataObject"], 'quote " and line\nbreak')
+        frame = myMsbClient.frameMessage("E", myMsbClient.eventCache[2])
+        self.assertEqual(json.loads(json.loads(frame)[0][2:]), events[2])
+
+
+class TestMSBClientBinaryPayloads(unittest.TestCase):
+    """
+    Test publishing binary data for BYTE events and chunked blobs
+    """
+
+    def test_publishBytesLikeValues(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("SNAPSHOT", "Snapshot", "Camera snapshot", DataType.BYTE, 0, False)
+        myMsbClient.addEvent("SNAPSHOTS", "Snapshots", "Camera snapshots", DataType.BYTE, 0, True)
+        blob = bytes(range(256)) * 10
+
+        # 2. ACT
+        for value in (blob, bytearray(blob), memoryview(blob)):
+            myMsbClient.publish("SNAPSHOT", value, cached=True)
+        myMsbClient.publish("SNAPSHOTS", [blob[:10], bytearray(blob[10:20])], cached=True)
+
+        # 3. ASSERT
+        events = [json.loads(e) for e in myMsbClient.eventCache]
+        for event in events[:3]:
+            self.assertEqual(base64.b64decode(event["dataObject"]), blob)
+        self.assertEqual([base64.b64decode(v) for v in events[3]["dataObject"]], [blob[:10], blob[10:20]])
+        self.assertEqual(myMsbClient.metrics.validationFailures.labels("SNAPSHOT").value, 0)
+        self.assertEqual(myMsbClient.metrics.validationFailures.labels("SNAPSHOTS").value, 0)
+
+    def test_publishMemoryviewItemsAsBase64(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("SNAPSHOTS", "Snapshots", "Camera snapshots", DataType.BYTE, 0, True)
+
+        # 2. ACT
+        myMsbClient.publish("SNAPSHOTS", [b"ab", memoryview(b"ab"), bytearray(b"ab")], cached=True)
+
+        # 3. ASSERT
+        self.assertIn('"dataObject":["YWI=","YWI=","YWI="]', myMsbClient.eventCache[0])
+
+    def test_publishChunkedAndReassemble(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addChunkedEvent("WAVEFORM", "Waveform", "Waveform blob")
+        received = []
+        myMsbClient.addChunkedFunction("STORE_WAVEFORM", "Store waveform", "Store waveform blob", received.append)
+        blob = bytes(range(256)) * 100
+
+        # 2. ACT
+        correlationId = myMsbClient.publishChunked("WAVEFORM", blob, chunkSize=1000, cached=True)
+        chunks = [json.loads(e) for e in myMsbClient.eventCache]
+        for event in reversed(chunks):
+            call = {
+                "uuid": myMsbClient.uuid,
+                "functionId": "STORE_WAVEFORM",
+                "correlationId": event["correlationId"],
+                "functionParameters": {"dataObject": event["dataObject"]},
+            }
+            myMsbClient.on_message(None, "a" + json.dumps(["C " + json.dumps(call)]))
+
+        # 3. ASSERT
+        self.assertEqual(len(chunks), 26)
+        self.assertEqual({event["correlationId"] for event in chunks}, {correlationId})
+        self.assertEqual([event["dataObject"]["index"] for event in chunks], list(range(26)))
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]["dataObject"], blob)
+        self.assertEqual(received[0]["correlationId"], correlationId)
+        self.assertEqual(myMsbClient.chunkAssemblers["STORE_WAVEFORM"].getPending(), {})
+        self.assertIn("WAVEFORMChunk", myMsbClient.objectToJson(myMsbClient.getSelfDescription()))
+
+
 # define a sample function which will be passed to the function description
 
 
@@ -2805,3 +3709,1203 @@ def printMsg(msg):
 class myClass():
     def myNonStaticPrintMethod(self, msg):
         print(str(msg))
+
+
+class TestMSBClientMaxMessageSize(unittest.TestCase):
+    """
+    Test splitting oversized array events and checking the self-description size
+    """
+
+    def waitFor(self, condition, timeout=5):
+        start = datetime.datetime.now()
+        while not condition() and (datetime.datetime.now() - start).total_seconds() < timeout:
+            time.sleep(0.01)
+        return condition()
+
+    def test_splitOversizedArrayEvent(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.setMaxMessageSize(2000)
+        myMsbClient.addEvent("SAMPLES", "Samples", "Samples", DataType.INT32, 0, True)
+        values = list(range(1000))
+
+        # 2. ACT
+        myMsbClient.publish("SAMPLES", values, cached=True, postDate="2019-01-01T12:00:00.000Z")
+
+        # 3. ASSERT
+        events = [json.loads(e) for e in myMsbClient.eventCache]
+        self.assertGreater(len(events), 1)
+        for index, event in enumerate(events):
+            self.assertLessEqual(myMsbClient._frameSize(myMsbClient.eventCache[index]), 2000)
+            self.assertEqual(event["sequenceIndex"], index)
+            self.assertEqual(event["sequenceCount"], len(events))
+            self.assertEqual(event["correlationId"], events[0]["correlationId"])
+            self.assertEqual(event["postDate"], "2019-01-01T12:00:00.000Z")
+        self.assertEqual([v for event in events for v in event["dataObject"]], values)
+        self.assertEqual(myMsbClient.metrics.splitEvents.labels("SAMPLES").value, 1)
+
+    def test_smallEventsAreNotSplit(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.setMaxMessageSize(2000)
+        myMsbClient.addEvent("SAMPLES", "Samples", "Samples", DataType.INT32, 0, True)
+
+        # 2. ACT
+        myMsbClient.publish("SAMPLES", [1, 2, 3], cached=True, correlationId="c1")
+
+        # 3. ASSERT
+        event = json.loads(myMsbClient.eventCache[0])
+        self.assertNotIn("sequenceIndex", event)
+        self.assertEqual(event["correlationId"], "c1")
+
+    def test_oversizedSingleValueRaises(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.setMaxMessageSize(2000)
+        myMsbClient.addEvent("TEXT", "Text", "Text", DataType.STRING, 0, False)
+        myMsbClient.addEvent("TEXTS", "Texts", "Texts", DataType.STRING, 0, True)
+
+        # 2. ACT / 3. ASSERT
+        with self.assertRaises(Exception):
+            myMsbClient.publish("TEXT", "x" * 5000, cached=True)
+        with self.assertRaises(Exception):
+            myMsbClient.publish("TEXTS", ["x", "x" * 5000], cached=True)
+        myMsbClient.setMaxMessageSize(0)
+        myMsbClient.publish("TEXT", "x" * 5000, cached=True)
+        self.assertEqual(len(myMsbClient.eventCache), 1)
+
+    def test_frameSizeCountsEscapesAndUtf8Bytes(self):
+        for sockJsFraming in [True, False]:
+            # 1. ARRANGE
+            myMsbClient = MsbClient()
+            myMsbClient.disableSockJsFraming(not sockJsFraming)
+            myMsbClient.setMaxMessageSize(500)
+            myMsbClient.addEvent("TEXT", "Text", "Text", DataType.STRING, 0, False)
+            msg = '{"dataObject":"\u00e4\U0001F600 \u0001 \\ \""}'
+
+            # 2. ACT
+            size = myMsbClient._frameSize(msg)
+
+            # 3. ASSERT
+            self.assertEqual(size, len(myMsbClient.frameMessage("E", msg).encode("utf-8")))
+            # 200 characters are less than the max size, but their frame is larger
+            with self.assertRaises(Exception):
+                myMsbClient.publishRaw("TEXT", '"' + "\u00e4" * 200 + '"', cached=True)
+            self.assertEqual(len(myMsbClient.eventCache), 0)
+
+    def test_largeEventsAreFramedOnce(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            myMsbClient = MsbClient(SERVICE_TYPE, SO_UUID, SO_NAME, SO_DESCRIPTION, SO_TOKEN)
+            myMsbClient.disableAutoReconnect(True)
+            myMsbClient.enableThreadAsDaemon(True)
+            myMsbClient.setMaxMessageSize(100000)
+            myMsbClient.addEvent("TEXT", "Text", "Text", DataType.STRING, 0, False)
+            myMsbClient.connect(mockServer.url)
+            myMsbClient.register()
+            self.assertTrue(self.waitFor(lambda: myMsbClient.registered))
+            dumps = json.dumps
+            escaped = []
+
+            def countingDumps(obj, *args, **kwargs):
+                if isinstance(obj, str) and obj.startswith('{"uuid"'):
+                    escaped.append(obj)
+                return dumps(obj, *args, **kwargs)
+
+            # 2. ACT
+            json.dumps = countingDumps
+            try:
+                myMsbClient.publish("TEXT", "ä" * 10000)
+            finally:
+                json.dumps = dumps
+
+            # 3. ASSERT
+            self.assertTrue(mockServer.waitForEvents(1))
+            self.assertEqual(mockServer.events[0]["dataObject"], "ä" * 10000)
+            # the event is escaped once for the sockJs frame, which is measured and sent
+            self.assertEqual(len(escaped), 1)
+            myMsbClient.disconnect()
+
+    def test_oversizedSelfDescription(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("SMALL", "Small", "Small event", DataType.INT32, 0, False)
+        myMsbClient.addEvent("LARGE", "Large", "x" * 5000, DataType.INT32, 0, False)
+        myMsbClient.setMaxMessageSize(4000)
+
+        # 2. ACT
+        sizes = myMsbClient.getSelfDescriptionSize()
+
+        # 3. ASSERT
+        self.assertGreater(sizes["total"], 4000)
+        self.assertGreater(sizes["events"]["LARGE"], 5000)
+        self.assertLess(sizes["events"]["SMALL"], 1000)
+        with self.assertRaises(Exception) as context:
+            myMsbClient.register()
+        self.assertIn("event LARGE", str(context.exception))
+
+
+class TestMSBClientPermessageDeflate(unittest.TestCase):
+    """
+    Test the negotiation and the compression with the permessage-deflate extension
+    """
+
+    def waitFor(self, condition, timeout=5):
+        start = datetime.datetime.now()
+        while not condition() and (datetime.datetime.now() - start).total_seconds() < timeout:
+            time.sleep(0.01)
+        return condition()
+
+    def test_negotiateExtension(self):
+        # 1. ARRANGE
+        settings = PerMessageDeflate(windowBits=12, noContextTakeover=True)
+
+        # 2. ACT
+        offer = settings.offer()
+        context = settings.negotiate("permessage-deflate; client_max_window_bits=10; server_no_context_takeover")
+
+        # 3. ASSERT
+        self.assertEqual(
+            parseExtension(offer), {"client_max_window_bits": "12", "client_no_context_takeover": None}
+        )
+        self.assertEqual(context.windowBits, 10)
+        self.assertTrue(context.compressNoContextTakeover)
+        self.assertTrue(context.decompressNoContextTakeover)
+        self.assertIsNone(settings.negotiate(None))
+        self.assertIsNone(settings.negotiate("x-webkit-deflate-frame"))
+        with self.assertRaises(Exception):
+            PerMessageDeflate(windowBits=8)
+
+    def test_compressAndDecompressMessages(self):
+        # 1. ARRANGE
+        sender = DeflateContext(windowBits=10)
+        receiver = DeflateContext()
+        messages = [json.dumps({"eventId": "E" + str(i), "dataObject": list(range(50))}).encode() for i in range(10)]
+
+        # 2. ACT
+        compressed = [sender.compress(message) for message in messages]
+        first = compressed[0]
+        decompressed = [receiver.decompress(first[:5], False) + receiver.decompress(first[5:], True)]
+        decompressed += [receiver.decompress(message) for message in compressed[1:]]
+
+        # 3. ASSERT
+        self.assertEqual(decompressed, messages)
+        # later messages reuse the context of the former ones
+        self.assertLess(len(compressed[1]), len(compressed[0]) / 2)
+
+    def test_publishAndReceiveCompressed(self):
+        for sockJsFraming in [True, False]:
+            with MsbMockServer() as mockServer:
+                # 1. ARRANGE
+                myMsbClient = MsbClient(SERVICE_TYPE, SO_UUID, SO_NAME, SO_DESCRIPTION, SO_TOKEN)
+                myMsbClient.disableSockJsFraming(not sockJsFraming)
+                myMsbClient.disableAutoReconnect(True)
+                myMsbClient.enableThreadAsDaemon(True)
+                myMsbClient.enablePermessageDeflate(windowBits=11, minSize=200)
+                myMsbClient.addEvent("E1", "E1", "E1", DataType.STRING, 0, False)
+                myMsbClient.addFunction("F1", "F1", "F1", DataType.STRING, printMsg)
+                myMsbClient.connect(mockServer.url)
+                myMsbClient.register()
+                self.assertTrue(self.waitFor(lambda: myMsbClient.registered))
+                received = []
+                myMsbClient.functions["F1"].implementation = received.append
+
+                # 2. ACT
+                for i in range(10):
+                    myMsbClient.publish("E1", 'Hello "MSB" ' * 20)
+                myMsbClient.publish("E1", "short")
+                mockServer.sendFunctionCall("F1", {"dataObject": "Hello Client " * 20}, "corr1")
+
+                # 3. ASSERT
+                self.assertTrue(mockServer.waitForEvents(11))
+                self.assertEqual(mockServer.events[0]["dataObject"], 'Hello "MSB" ' * 20)
+                self.assertEqual(mockServer.events[10]["dataObject"], "short")
+                self.assertTrue(self.waitFor(lambda: len(received) == 1))
+                self.assertEqual(received[0], {"dataObject": "Hello Client " * 20, "correlationId": "corr1"})
+                stats = myMsbClient.getCompressionStats()
+                self.assertEqual(stats["messages"], 12)
+                self.assertEqual(stats["compressedMessages"], 11)
+                self.assertLess(stats["compressedBytes"], stats["uncompressedBytes"] / 2)
+                myMsbClient.disconnect()
+
+    def test_serverDeclinesExtension(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            mockServer.permessageDeflate = False
+            myMsbClient = MsbClient(SERVICE_TYPE, SO_UUID, SO_NAME, SO_DESCRIPTION, SO_TOKEN)
+            myMsbClient.disableAutoReconnect(True)
+            myMsbClient.enableThreadAsDaemon(True)
+            myMsbClient.enablePermessageDeflate()
+            myMsbClient.addEvent("E1", "E1", "E1", DataType.STRING, 0, False)
+
+            # 2. ACT
+            myMsbClient.connect(mockServer.url)
+            myMsbClient.register()
+            self.assertTrue(self.waitFor(lambda: myMsbClient.registered))
+            myMsbClient.publish("E1", "x" * 1000)
+
+            # 3. ASSERT
+            self.assertTrue(mockServer.waitForEvents(1))
+            self.assertIsNone(myMsbClient.getCompressionStats())
+            myMsbClient.disconnect()
+
+
+class TestMSBClientPublishAcknowledgements(unittest.TestCase):
+    """
+    Test tracking the acknowledgements of published events with futures
+    """
+
+    def waitFor(self, condition, timeout=5):
+        start = datetime.datetime.now()
+        while not condition() and (datetime.datetime.now() - start).total_seconds() < timeout:
+            time.sleep(0.01)
+        return condition()
+
+    def createClient(self, window=1000, timeout=30.0):
+        myMsbClient = MsbClient(SERVICE_TYPE, SO_UUID, SO_NAME, SO_DESCRIPTION, SO_TOKEN)
+        myMsbClient.disableAutoReconnect(True)
+        myMsbClient.enableThreadAsDaemon(True)
+        myMsbClient.enableAcknowledgements(window=window, timeout=timeout)
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False)
+        return myMsbClient
+
+    def connect(self, myMsbClient, mockServer):
+        myMsbClient.connect(mockServer.url)
+        myMsbClient.register()
+        self.assertTrue(self.waitFor(lambda: myMsbClient.registered))
+
+    def test_acknowledgementsCompleteFuturesInOrder(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            mockServer.acknowledgeEvents = False
+            myMsbClient = self.createClient()
+            self.connect(myMsbClient, mockServer)
+
+            # 2. ACT
+            futures = [myMsbClient.publish("E1", i) for i in range(3)]
+            self.assertTrue(mockServer.waitForEvents(3))
+            mockServer.broadcast("IO_PUBLISHED")
+            mockServer.broadcast("NIO_EVENT_FORWARDING_ERROR")
+            mockServer.broadcast("IO_PUBLISHED")
+
+            # 3. ASSERT
+            self.assertGreaterEqual(futures[0].result(5), 0)
+            with self.assertRaises(Exception) as context:
+                futures[1].result(5)
+            self.assertIn("NIO_EVENT_FORWARDING_ERROR", str(context.exception))
+            self.assertGreaterEqual(futures[2].result(5), 0)
+            self.assertEqual(myMsbClient.metrics.acks.labels("acknowledged").value, 2)
+            self.assertEqual(myMsbClient.metrics.acks.labels("rejected").value, 1)
+            self.assertEqual(myMsbClient.metrics.ackLatency.labels("E1").count, 2)
+            self.assertEqual(len(myMsbClient.ackTracker), 0)
+            myMsbClient.disconnect()
+
+    def test_cachedEventsAreFlushedWithinTheWindow(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            mockServer.acknowledgeEvents = False
+            myMsbClient = self.createClient(window=2)
+            futures = [myMsbClient.publish("E1", i, cached=True) for i in range(5)]
+
+            # 2. ACT
+            self.connect(myMsbClient, mockServer)
+            self.assertTrue(mockServer.waitForEvents(2))
+            time.sleep(0.1)
+            sentBeforeAcknowledgements = len(mockServer.events)
+            for i in range(5):
+                mockServer.broadcast("IO_PUBLISHED")
+                self.assertTrue(mockServer.waitForEvents(min(i + 3, 5)))
+
+            # 3. ASSERT
+            self.assertEqual(sentBeforeAcknowledgements, 2)
+            self.assertEqual([event["dataObject"] for event in mockServer.events], list(range(5)))
+            for future in futures:
+                self.assertIsNotNone(future.result(5))
+            self.assertEqual(myMsbClient.eventCache, [])
+            self.assertEqual(myMsbClient.getEventCacheStats()["bytes"], 0)
+            myMsbClient.disconnect()
+
+    def test_fullWindowWaitsUntilTimeout(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            mockServer.acknowledgeEvents = False
+            myMsbClient = self.createClient(window=1, timeout=0.2)
+            self.connect(myMsbClient, mockServer)
+
+            # 2. ACT
+            first = myMsbClient.publish("E1", 1)
+            start = time.monotonic()
+            second = myMsbClient.publish("E1", 2)
+            waited = time.monotonic() - start
+
+            # 3. ASSERT
+            self.assertGreaterEqual(waited, 0.15)
+            self.assertTrue(first.done)
+            self.assertIsNotNone(first.error)
+            self.assertFalse(second.done)
+            self.assertEqual(myMsbClient.metrics.acks.labels("expired").value, 1)
+            myMsbClient.disconnect()
+
+    def test_unacknowledgedEventsExpireWithoutFurtherPublishing(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            mockServer.acknowledgeEvents = False
+            myMsbClient = self.createClient(timeout=0.2)
+            self.connect(myMsbClient, mockServer)
+
+            # 2. ACT
+            future = myMsbClient.publish("E1", 1)
+
+            # 3. ASSERT
+            with self.assertRaises(Exception) as context:
+                future.result(2)
+            self.assertIn("not acknowledged within 0.2 s", str(context.exception))
+            self.assertEqual(len(myMsbClient.ackTracker), 0)
+            self.assertEqual(myMsbClient.metrics.acks.labels("expired").value, 1)
+            myMsbClient.disconnect()
+
+    def test_rawAndChunkedPublishesReturnFutures(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            mockServer.acknowledgeEvents = False
+            myMsbClient = self.createClient()
+            myMsbClient.addChunkedEvent("BLOB")
+            self.connect(myMsbClient, mockServer)
+
+            # 2. ACT
+            raw = myMsbClient.publishRaw("E1", "42")
+            chunked = myMsbClient.publishChunked("BLOB", b"x" * 2500, chunkSize=1000)
+            rejected = myMsbClient.publishChunked("BLOB", b"y" * 1500, chunkSize=1000)
+            self.assertTrue(mockServer.waitForEvents(6))
+            mockServer.broadcast("IO_PUBLISHED")
+            mockServer.broadcast("IO_PUBLISHED")
+            mockServer.broadcast("IO_PUBLISHED")
+            self.assertFalse(chunked.done)
+            mockServer.broadcast("IO_PUBLISHED")
+            mockServer.broadcast("NIO_EVENT_FORWARDING_ERROR")
+            mockServer.broadcast("IO_PUBLISHED")
+
+            # 3. ASSERT
+            self.assertGreaterEqual(raw.result(5), 0)
+            self.assertGreaterEqual(chunked.result(5), 0)
+            with self.assertRaises(Exception) as context:
+                rejected.result(5)
+            self.assertIn("NIO_EVENT_FORWARDING_ERROR", str(context.exception))
+            self.assertTrue(self.waitFor(lambda: len(myMsbClient.ackTracker) == 0))
+            myMsbClient.disconnect()
+
+    def test_closedConnectionAndDiscardedEventsFail(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            mockServer.acknowledgeEvents = False
+            myMsbClient = self.createClient()
+            discarded = myMsbClient.publish("E1", 1)
+            callbacks = []
+            self.connect(myMsbClient, mockServer)
+
+            # 2. ACT
+            inFlight = myMsbClient.publish("E1", 2)
+            inFlight.addDoneCallback(callbacks.append)
+            self.assertTrue(mockServer.waitForEvents(1))
+            myMsbClient.disconnect()
+
+            # 3. ASSERT
+            with self.assertRaises(Exception):
+                discarded.result(0)
+            with self.assertRaises(Exception):
+                inFlight.result(5)
+            # the callbacks run after the waiting threads were woken up
+            self.assertTrue(self.waitFor(lambda: callbacks == [inFlight]))
+            self.assertEqual(myMsbClient.metrics.acks.labels("lost").value, 1)
+
+
+class TestMSBClientAtLeastOnceDelivery(unittest.TestCase):
+    """
+    Test redelivering unacknowledged events after a connection loss
+    """
+
+    def waitFor(self, condition, timeout=5):
+        start = datetime.datetime.now()
+        while not condition() and (datetime.datetime.now() - start).total_seconds() < timeout:
+            time.sleep(0.01)
+        return condition()
+
+    def test_redeliverUnacknowledgedEventsAfterReconnect(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            mockServer.acknowledgeEvents = False
+            myMsbClient = MsbClient(SERVICE_TYPE, SO_UUID, SO_NAME, SO_DESCRIPTION, SO_TOKEN)
+            myMsbClient.disableAutoReconnect(True)
+            myMsbClient.enableThreadAsDaemon(True)
+            myMsbClient.enableAtLeastOnceDelivery(window=10)
+            myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False)
+            myMsbClient.connect(mockServer.url)
+            myMsbClient.register()
+            self.assertTrue(self.waitFor(lambda: myMsbClient.registered))
+            futures = [myMsbClient.publish("E1", i) for i in range(3)]
+            self.assertTrue(mockServer.waitForEvents(3))
+            mockServer.broadcast("IO_PUBLISHED")
+            self.assertTrue(self.waitFor(lambda: futures[0].done))
+
+            # 2. ACT
+            mockServer.closeConnections()
+            self.assertTrue(self.waitFor(lambda: not myMsbClient.connected))
+            cached = [json.loads(msg) for msg in myMsbClient.eventCache]
+            myMsbClient.connect(mockServer.url)
+            myMsbClient.register()
+            self.assertTrue(mockServer.waitForEvents(5))
+            mockServer.broadcast("IO_PUBLISHED")
+            mockServer.broadcast("IO_PUBLISHED")
+
+            # 3. ASSERT
+            self.assertEqual([event["dataObject"] for event in cached], [1, 2])
+            self.assertTrue(all(event["redelivered"] for event in cached))
+            self.assertEqual([event["dataObject"] for event in mockServer.events], [0, 1, 2, 1, 2])
+            self.assertNotIn("redelivered", mockServer.events[0])
+            self.assertTrue(mockServer.events[3]["redelivered"])
+            for future in futures:
+                self.assertIsNotNone(future.result(5))
+            self.assertEqual(myMsbClient.metrics.redelivered.labels().value, 2)
+            self.assertEqual(myMsbClient.metrics.acks.labels("lost").value, 0)
+            myMsbClient.disconnect()
+
+    def test_consumerDropsRedeliveredDuplicatesByDeliveryId(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            mockServer.acknowledgeEvents = False
+            myMsbClient = MsbClient(SERVICE_TYPE, SO_UUID, SO_NAME, SO_DESCRIPTION, SO_TOKEN)
+            myMsbClient.disableAutoReconnect(True)
+            myMsbClient.enableThreadAsDaemon(True)
+            myMsbClient.enableAtLeastOnceDelivery(window=10)
+            myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False)
+            myMsbClient.connect(mockServer.url)
+            myMsbClient.register()
+            self.assertTrue(self.waitFor(lambda: myMsbClient.registered))
+            for i in range(3):
+                myMsbClient.publish("E1", 7)
+            self.assertTrue(mockServer.waitForEvents(3))
+
+            # 2. ACT
+            mockServer.closeConnections()
+            self.assertTrue(self.waitFor(lambda: not myMsbClient.connected))
+            myMsbClient.connect(mockServer.url)
+            myMsbClient.register()
+            self.assertTrue(mockServer.waitForEvents(6))
+            received = {}
+            for event in mockServer.events:
+                if not (event.get("redelivered") and event["deliveryId"] in received):
+                    received[event["deliveryId"]] = event
+
+            # 3. ASSERT
+            originals = [event["deliveryId"] for event in mockServer.events[:3]]
+            self.assertEqual(len(set(originals)), 3)
+            self.assertEqual([event["deliveryId"] for event in mockServer.events[3:]], originals)
+            self.assertEqual(list(received), originals)
+            self.assertFalse(any(event.get("redelivered") for event in received.values()))
+            myMsbClient.disconnect()
+
+
+class TestMSBClientRateLimits(unittest.TestCase):
+    """
+    Test the per-event and client-wide token bucket rate limits
+    """
+
+    def cachedValues(self, myMsbClient):
+        return [json.loads(msg)["dataObject"] for msg in myMsbClient.eventCache]
+
+    def waitFor(self, condition, timeout=5):
+        start = datetime.datetime.now()
+        while not condition() and (datetime.datetime.now() - start).total_seconds() < timeout:
+            time.sleep(0.01)
+        return condition()
+
+    def test_dropEventsExceedingTheBurst(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False, rateLimit=1, burst=5)
+
+        # 2. ACT
+        for i in range(20):
+            myMsbClient.publish("E1", i, cached=True)
+
+        # 3. ASSERT
+        self.assertEqual(self.cachedValues(myMsbClient), [0, 1, 2, 3, 4])
+        self.assertEqual(myMsbClient.metrics.throttled.labels("E1", "drop").value, 15)
+        self.assertEqual(myMsbClient.getRateLimitStats()["E1"]["throttled"], 15)
+        self.assertNotIn("rateLimiter", json.dumps(myMsbClient.getSelfDescription()))
+
+    def test_conflateToTheLatestValue(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False)
+        myMsbClient.setRateLimit(20, 1, "conflate", eventId="E1")
+
+        # 2. ACT
+        for i in range(10):
+            myMsbClient.publish("E1", i, cached=True)
+
+        # 3. ASSERT
+        self.assertEqual(self.cachedValues(myMsbClient), [0])
+        self.assertTrue(self.waitFor(lambda: len(myMsbClient.eventCache) == 2))
+        self.assertEqual(self.cachedValues(myMsbClient), [0, 9])
+
+    def test_queueEventsInOrder(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False)
+        myMsbClient.addEvent("E2", "E2", "E2", DataType.INT32, 0, False)
+        myMsbClient.setRateLimit(100, 2, "queue", maxQueue=3)
+
+        # 2. ACT
+        for i in range(6):
+            myMsbClient.publish("E1" if i % 2 else "E2", i, cached=True)
+
+        # 3. ASSERT
+        self.assertEqual(self.cachedValues(myMsbClient), [0, 1])
+        self.assertTrue(self.waitFor(lambda: len(myMsbClient.eventCache) == 5))
+        # the oldest queued event was dropped from the full queue
+        self.assertEqual(self.cachedValues(myMsbClient), [0, 1, 3, 4, 5])
+        self.assertEqual(myMsbClient.getRateLimitStats()[None]["pending"], 0)
+
+    def test_raiseAndRemoveLimit(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False)
+        myMsbClient.setRateLimit(1, 1, "raise")
+
+        # 2. ACT
+        myMsbClient.publish("E1", 1, cached=True)
+        with self.assertRaises(Exception):
+            myMsbClient.publish("E1", 2, cached=True)
+        myMsbClient.setRateLimit(None)
+        myMsbClient.publish("E1", 3, cached=True)
+
+        # 3. ASSERT
+        self.assertEqual(self.cachedValues(myMsbClient), [1, 3])
+        self.assertFalse(myMsbClient.rateLimited)
+
+    def test_chunkedAndColumnarEventsAreLimited(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addChunkedEvent("BLOB")
+        myMsbClient.addColumnarEvent("COUNTS", "Counts", "Count samples", DataType.INT32)
+        myMsbClient.setRateLimit(1, 3, "drop")
+
+        # 2. ACT
+        myMsbClient.publishChunked("BLOB", b"x" * 500, chunkSize=100, cached=True)
+        stats = myMsbClient.publishColumnar("COUNTS", [1700000000.0], [1], cached=True)
+
+        # 3. ASSERT
+        self.assertEqual([chunk["index"] for chunk in self.cachedValues(myMsbClient)], [0, 1, 2])
+        self.assertIsNone(stats)
+        self.assertEqual(myMsbClient.getRateLimitStats()[None]["throttled"], 3)
+
+    def test_chunksAreNotConflated(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addChunkedEvent("BLOB")
+        myMsbClient.setRateLimit(50, 1, "conflate", eventId="BLOB")
+
+        # 2. ACT
+        myMsbClient.publishChunked("BLOB", b"x" * 500, chunkSize=100, cached=True)
+
+        # 3. ASSERT
+        self.assertTrue(self.waitFor(lambda: len(myMsbClient.eventCache) == 5))
+        self.assertEqual([chunk["index"] for chunk in self.cachedValues(myMsbClient)], [0, 1, 2, 3, 4])
+
+
+class TestMSBClientMicroBatching(unittest.TestCase):
+    """
+    Test the adaptive micro batching of sent events
+    """
+
+    def waitFor(self, condition, timeout=5):
+        start = datetime.datetime.now()
+        while not condition() and (datetime.datetime.now() - start).total_seconds() < timeout:
+            time.sleep(0.01)
+        return condition()
+
+    def test_lowRateIsSentWithoutDelay(self):
+        # 1. ARRANGE
+        batches = []
+        batcher = MicroBatcher(batches.append, latencyBudget={0: 1000})
+
+        # 2. ACT
+        for i in range(3):
+            batcher.submit(str(i))
+            # the batch was written by the publishing thread
+            self.assertEqual(batches[-1], [str(i)])
+            time.sleep(0.02)
+
+        # 3. ASSERT
+        self.assertEqual(batches, [["0"], ["1"], ["2"]])
+        self.assertIsNone(batcher.thread)
+
+    def test_highRateIsBatchedInOrder(self):
+        # 1. ARRANGE
+        batches = []
+        batcher = MicroBatcher(batches.append, maxBytes=100, latencyBudget={0: 50000})
+
+        # 2. ACT
+        for i in range(200):
+            batcher.submit("%03d" % i)
+        self.assertTrue(batcher.flush())
+        batcher.stop()
+
+        # 3. ASSERT
+        self.assertEqual([frame for batch in batches for frame in batch], ["%03d" % i for i in range(200)])
+        self.assertLess(len(batches), 100)
+        self.assertTrue(all(len(batch) <= 33 for batch in batches))
+
+    def test_batchedEventsReachTheMsb(self):
+        for sockJsFraming in (True, False):
+            with MsbMockServer() as mockServer:
+                # 1. ARRANGE
+                myMsbClient = MsbClient(SERVICE_TYPE, SO_UUID, SO_NAME, SO_DESCRIPTION, SO_TOKEN)
+                myMsbClient.disableSockJsFraming(not sockJsFraming)
+                myMsbClient.disableAutoReconnect(True)
+                myMsbClient.enableThreadAsDaemon(True)
+                myMsbClient.enableDataFormatValidation(False)
+                myMsbClient.enableMicroBatching(latencyBudget={"LOW": 20000})
+                myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False)
+                myMsbClient.connect(mockServer.url)
+                myMsbClient.register()
+                self.assertTrue(self.waitFor(lambda: myMsbClient.registered))
+
+                # 2. ACT
+                for i in range(300):
+                    myMsbClient.publish("E1", i)
+
+                # 3. ASSERT
+                self.assertTrue(mockServer.waitForEvents(300))
+                self.assertEqual([event["dataObject"] for event in mockServer.events], list(range(300)))
+                batchSize = myMsbClient.metrics.batchSize.labels()
+                # the batches are counted after they were written
+                self.assertTrue(self.waitFor(lambda: batchSize.sum == 300))
+                self.assertLess(batchSize.count, 300)
+                myMsbClient.disconnect()
+
+
+class TestMSBClientScheduler(unittest.TestCase):
+    """
+    Test the periodic publishing of events with the scheduler
+    """
+
+    def waitFor(self, condition, timeout=5):
+        start = datetime.datetime.now()
+        while not condition() and (datetime.datetime.now() - start).total_seconds() < timeout:
+            time.sleep(0.01)
+        return condition()
+
+    def test_scheduledEventsArePublishedWithoutDrift(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False)
+        values = iter(range(1000))
+        start = time.monotonic()
+
+        # 2. ACT
+        task = myMsbClient.schedule("E1", 0.02, lambda: next(values), cached=True)
+        self.assertTrue(self.waitFor(lambda: len(myMsbClient.eventCache) >= 10))
+        task.cancel()
+        elapsed = time.monotonic() - start
+        # a run in progress is completed
+        time.sleep(0.05)
+        runs = task.runs
+
+        # 3. ASSERT
+        self.assertEqual([json.loads(msg)["dataObject"] for msg in myMsbClient.eventCache][:10], list(range(10)))
+        # the runs stay in the phase of the start time
+        self.assertGreaterEqual(runs, int(elapsed / 0.02) - 2)
+        time.sleep(0.05)
+        self.assertEqual(task.runs, runs)
+        self.assertEqual(myMsbClient.getSchedulerStats()["tasks"], 0)
+        self.assertEqual(myMsbClient.metrics.scheduleLag.labels().count, runs)
+        myMsbClient.stopScheduler()
+
+    def test_overrunsAreSkippedOrCoalesced(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False)
+        myMsbClient.addEvent("E2", "E2", "E2", DataType.INT32, 0, False)
+        release = threading.Event()
+
+        def blockingSupplier():
+            release.wait(5)
+            return 1
+
+        # 2. ACT
+        skipping = myMsbClient.schedule("E1", 0.01, blockingSupplier, "skip", delay=0)
+        coalescing = myMsbClient.schedule("E2", 0.01, blockingSupplier, "coalesce", delay=0)
+        time.sleep(0.1)
+        release.set()
+        self.assertTrue(self.waitFor(lambda: skipping.runs >= 1 and coalescing.runs >= 2))
+        myMsbClient.stopScheduler()
+
+        # 3. ASSERT
+        self.assertGreater(skipping.skipped, 3)
+        self.assertGreater(coalescing.coalesced, 3)
+        with self.assertRaises(Exception):
+            myMsbClient.schedule("E1", 1, blockingSupplier, "queue")
+        with self.assertRaises(Exception):
+            myMsbClient.schedule("UNKNOWN", 1, blockingSupplier)
+
+    def test_supplierErrorsDoNotStopTheTask(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.INT32, 0, False)
+        calls = []
+
+        def failingSupplier():
+            calls.append(1)
+            if len(calls) == 1:
+                raise Exception("no value")
+            return None if len(calls) == 2 else len(calls)
+
+        # 2. ACT
+        task = myMsbClient.schedule("E1", 0.01, failingSupplier, cached=True, delay=0)
+        self.assertTrue(self.waitFor(lambda: len(myMsbClient.eventCache) >= 1))
+        myMsbClient.stopScheduler()
+
+        # 3. ASSERT
+        self.assertEqual(task.errors, 1)
+        self.assertEqual(json.loads(myMsbClient.eventCache[0])["dataObject"], 3)
+
+
+class TestMSBClientWindowAggregation(unittest.TestCase):
+    """
+    Test the windowed aggregation of numeric samples
+    """
+
+    def windowResults(self, myMsbClient):
+        return [json.loads(msg)["dataObject"] for msg in myMsbClient.eventCache]
+
+    def test_tumblingAndSlidingWindowsByCount(self):
+        # 1. ARRANGE
+        myMsbClient = MsbClient()
+        myMsbClient.addAggregatedEvent("TUMBLING", "T", "T", window=4, windowType="count", cached=True)
+        myMsbClient.addAggregatedEvent("SLIDING", "S", "S", window=4, slide=2, windowType="count", cached=True)
+        samples = [3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0, 6.0]
+
+        # 2. ACT
+        myMsbClient.aggregate("TUMBLING", samples[:3])
+        myMsbClient.aggregate("TUMBLING", array.array("d", samples[3:]))
+        for sample in samples:
+            myMsbClient.aggregate("SLIDING", sample)
+
+        # 3. ASSERT
+        results = self.windowResults(myMsbClient)
+        self.assertEqual(len(results), 5)
+        self.assertEqual([result["count"] for result in results], [4] * 5)
+        for result, window in zip(results, [samples[:4], samples[4:], samples[:4], samples[2:6], samples[4:]]):
+            self.assertEqual(result["min"], min(window))
+            self.assertEqual(result["max"], max(window))
+            self.assertAlmostEqual(result["mean"], statistics.mean(window))
+            self.assertAlmostEqual(result["stddev"], statistics.pstdev(window))
+        self.assertEqual(myMsbClient.getAggregationStats()["SLIDING"]["windows"], 3)
+        self.assertTrue(
+            validateValueForComplexDataformat(results[0], myMsbClient.events["TUMBLING"].dataFormat, False)
+        )
+        self.assertIn("TUMBLINGWindow", json.dumps(myMsbClient.getSelfDescription()))
+        with self.assertRaises(Exception):
+            myMsbClient.aggregate("UNKNOWN", 1.0)
+        with self.assertRaises(Exception):
+            myMsbClient.addAggregatedEvent("INVALID", "I", "I", window=5, slide=2, windowType="count")
+
+    @unittest.skipIf(numpy is None, "numpy not installed")
+    def test_numpyArraysSpanningWindows(self):
+        # 1. ARRANGE
+        aggregator = WindowAggregator(1000, windowType="count")
+        samples = numpy.random.default_rng(1).normal(100.0, 5.0, 2500)
+
+        # 2. ACT
+        results = aggregator.add(samples[:700]) + aggregator.add(samples[700:])
+
+        # 3. ASSERT
+        self.assertEqual(len(results), 2)
+        for result, window in zip(results, (samples[:1000], samples[1000:2000])):
+            self.assertEqual(result["count"], 1000)
+            self.assertAlmostEqual(result["mean"], float(window.mean()))
+            self.assertAlmostEqual(result["stddev"], float(window.std()))
+            self.assertEqual(result["max"], float(window.max()))
+        self.assertEqual(aggregator.current.count, 500)
+
+    def test_slidingWindowsByTime(self):
+        # 1. ARRANGE
+        now = [1000.0]
+        aggregator = WindowAggregator(2.0, 1.0, "time", clock=lambda: now[0])
+
+        # 2. ACT
+        results = []
+        for second in range(4):
+            aggregator.add([second, second + 10])
+            now[0] += 1.0
+            results.append(aggregator.tick())
+        now[0] += 1.0
+        results.append(aggregator.tick())
+        now[0] += 1.0
+        results.append(aggregator.tick())
+
+        # 3. ASSERT
+        self.assertEqual([result["count"] for result in results[:5]], [2, 4, 4, 4, 2])
+        self.assertEqual(results[2]["min"], 1.0)
+        self.assertEqual(results[2]["max"], 12.0)
+        self.assertEqual(results[2]["windowStart"], "1970-01-01T00:16:41.000Z")
+        self.assertEqual(results[2]["windowEnd"], "1970-01-01T00:16:43.000Z")
+        # windows without samples are not published
+        self.assertIsNone(results[5])
+
+
+class TestMSBClientDeltaEncoding(unittest.TestCase):
+    """
+    Test the delta encoding of complex event values
+    """
+
+    def createClient(self, keyframeEvery=3):
+        module = ComplexDataFormat("Module")
+        module.addProperty("moduleName", DataType.STRING, False)
+        device = ComplexDataFormat("Device")
+        device.addProperty("deviceName", DataType.STRING, False)
+        device.addProperty("deviceWeight", DataType.FLOAT, False)
+        device.addProperty("location", module, False)
+        device.addProperty("submodules", module, True)
+        myMsbClient = MsbClient()
+        myMsbClient.addEvent("DEVICE", "Device", "Device", device, 0, False)
+        myMsbClient.enableDeltaEncoding("DEVICE", keyframeEvery=keyframeEvery)
+        return myMsbClient
+
+    def test_onlyChangedPathsAreSent(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+        values = [
+            {"deviceName": "D1", "deviceWeight": 1.5, "location": {"moduleName": "M1"}, "submodules": []},
+            {"deviceName": "D1", "deviceWeight": 1.5, "location": {"moduleName": "M2"}, "submodules": []},
+            {"deviceName": "D1", "location": {"moduleName": "M2"}, "submodules": [{"moduleName": "S1"}]},
+            {"deviceName": "D2", "location": {"moduleName": "M2"}, "submodules": [{"moduleName": "S1"}]},
+        ]
+
+        # 2. ACT
+        for value in values:
+            myMsbClient.publish("DEVICE", value, cached=True)
+
+        # 3. ASSERT
+        events = [json.loads(msg) for msg in myMsbClient.eventCache]
+        self.assertEqual([event["deltaSequence"] for event in events], [1, 2, 3, 4])
+        self.assertEqual([event.get("delta", False) for event in events], [False, True, True, False])
+        self.assertEqual(events[1]["dataObject"], {"location": {"moduleName": "M2"}})
+        self.assertEqual(events[2]["dataObject"], {"deviceWeight": None, "submodules": [{"moduleName": "S1"}]})
+        # every third event is a keyframe
+        self.assertEqual(events[3]["dataObject"], values[3])
+        decoder = DeltaDecoder()
+        self.assertEqual([decoder.decode(event) for event in events], values)
+        stats = myMsbClient.getDeltaStats()["DEVICE"]
+        self.assertEqual((stats["keyframes"], stats["patches"]), (2, 2))
+        self.assertLess(stats["sentBytes"], stats["fullBytes"])
+        self.assertNotIn("deltaEncoder", json.dumps(myMsbClient.getSelfDescription()))
+
+    def test_decoderWaitsForKeyframeAfterMissedEvents(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient(keyframeEvery=100)
+        value = {"deviceName": "D1", "deviceWeight": 1.0, "location": {"moduleName": "M1"}, "submodules": []}
+        for weight in range(5):
+            value["deviceWeight"] = float(weight)
+            myMsbClient.publish("DEVICE", value, cached=True)
+        myMsbClient.events["DEVICE"].deltaEncoder.reset()
+        myMsbClient.publish("DEVICE", value, cached=True)
+        events = [json.loads(msg) for msg in myMsbClient.eventCache]
+        decoder = DeltaDecoder()
+
+        # 2. ACT
+        decoded = [decoder.decode(events[i]) for i in (0, 1, 3, 4, 1, 5)]
+        redelivered = dict(events[5], redelivered=True, dataObject={})
+
+        # 3. ASSERT
+        self.assertEqual([None if d is None else d["deviceWeight"] for d in decoded], [0.0, 1.0, None, None, None, 4.0])
+        self.assertEqual(decoder.gaps, 1)
+        self.assertIsNone(decoder.decode(redelivered))
+        self.assertEqual(applyPatch({"a": {"b": 1, "c": 2}}, {"a": {"b": None, "d": 3}}), {"a": {"c": 2, "d": 3}})
+        with self.assertRaises(Exception):
+            myMsbClient.addEvent("ARRAY", "A", "A", DataType.INT32, 0, True)
+            myMsbClient.enableDeltaEncoding("ARRAY")
+
+    def test_freeFormObjectsAndNullsRoundTrip(self):
+        # 1. ARRANGE
+        dataFormat = {
+            "dataObject": {
+                "type": "object",
+                "properties": {"m": {"type": "object"}, "n": {"type": ["integer", "null"]}},
+            }
+        }
+        encoder = DeltaEncoder(dataFormat)
+        decoder = DeltaDecoder()
+        values = [
+            {"m": {"x": 1, "y": 2}, "n": 1},
+            {"m": {"x": 1}, "n": None},
+            {"m": {"x": 1}, "n": 2},
+            {"m": {"x": 2, "z": {"a": 1}}, "n": 2},
+            {"m": {"x": 2, "z": {"a": 2, "b": [1]}}, "n": 2},
+            {"m": {"x": 2, "z": {"b": [1]}}},
+        ]
+
+        # 2. ACT
+        decoded = []
+        patches = []
+        for value in values:
+            raw, (sequence, isPatch) = encoder.encode(json.dumps(value))
+            patches.append(isPatch)
+            event = {"uuid": "u", "eventId": "E", "deltaSequence": sequence, "delta": isPatch,
+                     "dataObject": json.loads(raw)}
+            decoded.append(decoder.decode(event))
+
+        # 3. ASSERT
+        self.assertEqual(decoded, values)
+        # nulls and objects replacing other values are sent as keyframes
+        self.assertEqual(patches, [False, False, True, False, True, True])
+
+    def test_oversizedEventDoesNotAdvanceTheEncoder(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient(keyframeEvery=100)
+        myMsbClient.setMaxMessageSize(1000)
+        value = {"deviceName": "D1", "deviceWeight": 1.0, "location": {"moduleName": "M1"}, "submodules": []}
+        myMsbClient.publish("DEVICE", value, cached=True)
+
+        # 2. ACT
+        with self.assertRaises(Exception):
+            myMsbClient.publish("DEVICE", dict(value, deviceName="x" * 2000), cached=True)
+        myMsbClient.publish("DEVICE", dict(value, deviceWeight=2.0), cached=True)
+
+        # 3. ASSERT
+        events = [json.loads(msg) for msg in myMsbClient.eventCache]
+        decoder = DeltaDecoder()
+        self.assertEqual([decoder.decode(event) for event in events], [value, dict(value, deviceWeight=2.0)])
+
+
+class TestMSBClientEventCache(unittest.TestCase):
+    """
+    Test the compressed, byte-budgeted event cache
+    """
+
+    def waitFor(self, condition, timeout=5):
+        start = datetime.datetime.now()
+        while not condition() and (datetime.datetime.now() - start).total_seconds() < timeout:
+            time.sleep(0.01)
+        return condition()
+
+    def createClient(self):
+        myMsbClient = MsbClient(SERVICE_TYPE, SO_UUID, SO_NAME, SO_DESCRIPTION, SO_TOKEN)
+        myMsbClient.disableAutoReconnect(True)
+        myMsbClient.enableThreadAsDaemon(True)
+        myMsbClient.addEvent("E1", "E1", "E1", DataType.STRING, 0, False)
+        return myMsbClient
+
+    def test_cachedEventsAreCompressedInBlocks(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+        myMsbClient.enableEventCacheCompression(blockSize=4096)
+        uncompressed = EventCache(compression=False)
+
+        # 2. ACT
+        for i in range(500):
+            myMsbClient.publish("E1", "value " + str(i), cached=True)
+        for msg in myMsbClient.eventCache:
+            uncompressed.append(msg)
+
+        # 3. ASSERT
+        stats = myMsbClient.getEventCacheStats()
+        self.assertEqual(stats["events"], 500)
+        self.assertGreater(stats["blocks"], 1)
+        self.assertLess(stats["compressionRatio"], 0.5)
+        self.assertLess(stats["bytesPerEvent"], uncompressed.getStats()["bytesPerEvent"] / 2)
+        self.assertEqual([json.loads(msg)["dataObject"] for msg in myMsbClient.eventCache],
+                         ["value " + str(i) for i in range(500)])
+        self.assertEqual(json.loads(myMsbClient.eventCache[250])["dataObject"], "value 250")
+        self.assertEqual(myMsbClient.eventCache, uncompressed)
+        self.assertEqual(myMsbClient.metrics.cacheBytes.labels().value, stats["bytes"])
+
+    def test_oldestEventsAreDismissedByTheByteBudget(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+        myMsbClient.enableEventCacheCompression(False)
+        myMsbClient.setEventCacheBytes(20000)
+
+        # 2. ACT
+        for i in range(1000):
+            myMsbClient.publish("E1", str(i) * 10, cached=True)
+
+        # 3. ASSERT
+        stats = myMsbClient.getEventCacheStats()
+        self.assertLessEqual(stats["bytes"], 20000)
+        self.assertGreater(stats["events"], 0)
+        self.assertEqual(stats["evictions"], 1000 - stats["events"])
+        self.assertEqual(myMsbClient.metrics.cacheEvictions.labels().value, stats["evictions"])
+        self.assertEqual(json.loads(myMsbClient.eventCache[-1])["dataObject"], "999" * 10)
+
+    def test_compressedEventsAreDismissedOneByOneByTheByteBudget(self):
+        # 1. ARRANGE
+        cache = EventCache(maxEvents=100000, maxBytes=200000, blockSize=65536)
+        msgs = ['{"eventId":"E1","dataObject":"value ' + str(i) + '"}' for i in range(20000)]
+        evictions = []
+
+        # 2. ACT
+        for msg in msgs:
+            before = cache.evictions
+            cache.append(msg)
+            evictions.append(cache.evictions - before)
+            self.assertLessEqual(cache.bytes, 200000)
+
+        # 3. ASSERT
+        # only the share of a few compressed events is needed for a new event, not a whole decompressed block
+        self.assertLessEqual(max(evictions), 10)
+        self.assertGreater(cache.getStats()["blocks"], 1)
+        self.assertEqual(cache.evictions, 20000 - len(cache))
+        self.assertEqual(list(cache), msgs[cache.evictions:])
+        replayed = []
+        while cache.peek() is not None:
+            entry = cache.peek()
+            replayed.append(entry[0])
+            cache.remove(entry)
+        self.assertEqual(replayed, msgs[cache.evictions:])
+        self.assertEqual(cache.bytes, 0)
+
+    def test_replaySendsAllBlocksInOrder(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            myMsbClient = self.createClient()
+            myMsbClient.enableAcknowledgements(window=100)
+            myMsbClient.enableEventCacheCompression(blockSize=1024)
+            futures = [myMsbClient.publish("E1", str(i), cached=True) for i in range(300)]
+            self.assertGreater(myMsbClient.getEventCacheStats()["blocks"], 2)
+
+            # 2. ACT
+            myMsbClient.connect(mockServer.url)
+            myMsbClient.register()
+            self.assertTrue(mockServer.waitForEvents(300, 10))
+
+            # 3. ASSERT
+            self.assertEqual([event["dataObject"] for event in mockServer.events], [str(i) for i in range(300)])
+            for future in futures:
+                self.assertIsNotNone(future.result(5))
+            self.assertTrue(self.waitFor(lambda: len(myMsbClient.eventCache) == 0))
+            self.assertEqual(myMsbClient.getEventCacheStats()["bytes"], 0)
+            myMsbClient.disconnect()
+
+
+class TestMSBClientEventCacheExpiry(unittest.TestCase):
+    """
+    Test the time to live and the quotas of cached events
+    """
+
+    def waitFor(self, condition, timeout=5):
+        start = datetime.datetime.now()
+        while not condition() and (datetime.datetime.now() - start).total_seconds() < timeout:
+            time.sleep(0.01)
+        return condition()
+
+    def createClient(self):
+        myMsbClient = MsbClient(SERVICE_TYPE, SO_UUID, SO_NAME, SO_DESCRIPTION, SO_TOKEN)
+        myMsbClient.disableAutoReconnect(True)
+        myMsbClient.enableThreadAsDaemon(True)
+        myMsbClient.addEvent("LOW", "Low", "Low", DataType.INT32, "LOW", False)
+        myMsbClient.addEvent("HIGH", "High", "High", DataType.INT32, "HIGH", False)
+        # a controlled clock of the cache times
+        self.now = 0.0
+        myMsbClient.eventCache.clock = lambda: self.now
+        return myMsbClient
+
+    def cached(self, myMsbClient):
+        return [(event["eventId"], event["dataObject"]) for event in map(json.loads, myMsbClient.eventCache)]
+
+    def test_expiredEventsAreNotReplayed(self):
+        with MsbMockServer() as mockServer:
+            # 1. ARRANGE
+            myMsbClient = self.createClient()
+            myMsbClient.enableAcknowledgements()
+            myMsbClient.setEventCacheTimeToLive(10, "LOW", expiryInterval=60)
+            myMsbClient.enableEventCacheCompression(blockSize=64)
+            old = [myMsbClient.publish("LOW", i, cached=True) for i in range(20)]
+            self.now = 5.0
+            fresh = [myMsbClient.publish("LOW", i, cached=True) for i in range(20, 25)]
+            myMsbClient.publish("HIGH", 1, cached=True)
+            self.now = 12.0
+
+            # 2. ACT
+            myMsbClient.connect(mockServer.url)
+            myMsbClient.register()
+            self.assertTrue(mockServer.waitForEvents(6))
+
+            # 3. ASSERT
+            self.assertEqual([event["dataObject"] for event in mockServer.events], [20, 21, 22, 23, 24, 1])
+            for future in old:
+                with self.assertRaises(Exception):
+                    future.result(0)
+            for future in fresh:
+                self.assertIsNotNone(future.result(5))
+            self.assertEqual(myMsbClient.metrics.cacheExpirations.labels().value, 20)
+            self.assertEqual(myMsbClient.getEventCacheStats()["expirations"], 20)
+            myMsbClient.disconnect()
+            myMsbClient.stopScheduler()
+
+    def test_expiredEventsAreRemovedPeriodically(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+        myMsbClient.eventCache.clock = time.monotonic
+        myMsbClient.setEventCacheTimeToLive(0.1, expiryInterval=0.05)
+        for i in range(5):
+            myMsbClient.publish("LOW", i, cached=True)
+            myMsbClient.publish("HIGH", i, cached=True)
+
+        # 2. ACT
+        emptied = self.waitFor(lambda: len(myMsbClient.eventCache) == 0)
+        myMsbClient.stopScheduler()
+
+        # 3. ASSERT
+        self.assertTrue(emptied)
+        self.assertEqual(myMsbClient.getEventCacheStats()["expirations"], 10)
+        self.assertEqual(myMsbClient.metrics.cacheSize.labels().value, 0)
+
+    def test_quotaKeepsTheEventsOfOtherEvents(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+        myMsbClient.setEventCacheSize(10)
+        myMsbClient.setEventCacheQuota(3, eventId="HIGH")
+
+        # 2. ACT
+        myMsbClient.publish("LOW", 0, cached=True)
+        for i in range(20):
+            myMsbClient.publish("HIGH", i, cached=True)
+        myMsbClient.publish("LOW", 1, cached=True)
+
+        # 3. ASSERT
+        self.assertEqual(self.cached(myMsbClient), [("LOW", 0), ("HIGH", 17), ("HIGH", 18), ("HIGH", 19), ("LOW", 1)])
+        self.assertEqual(myMsbClient.getEventCacheStats()["eventsByEventId"], {"LOW": 2, "HIGH": 3})
+        self.assertEqual(myMsbClient.metrics.cacheEvictions.labels().value, 17)
+        with self.assertRaises(Exception):
+            myMsbClient.setEventCacheQuota(3)
+
+    def test_evictionPrefersExpiredAndLowPriorityEvents(self):
+        # 1. ARRANGE
+        myMsbClient = self.createClient()
+        myMsbClient.setEventCacheSize(4)
+        myMsbClient.setEventCacheTimeToLive(10, "HIGH", expiryInterval=60)
+        myMsbClient.setEventCacheQuota(2, priority="LOW")
+
+        # 2. ACT
+        myMsbClient.publish("HIGH", 0, cached=True)
+        self.now = 5.0
+        for i in range(3):
+            myMsbClient.publish("LOW", i, cached=True)
+        myMsbClient.publish("HIGH", 1, cached=True)
+        self.now = 11.0
+        # the cache is full, the expired event is dismissed
+        myMsbClient.publish("HIGH", 2, cached=True)
+        withoutExpired = self.cached(myMsbClient)
+        # then the oldest events of the lowest priority
+        myMsbClient.publish("HIGH", 3, cached=True)
+        myMsbClient.publish("HIGH", 4, cached=True)
+        myMsbClient.stopScheduler()
+
+        # 3. ASSERT
+        self.assertEqual(withoutExpired, [("LOW", 1), ("LOW", 2), ("HIGH", 1), ("HIGH", 2)])
+        self.assertEqual(self.cached(myMsbClient), [("HIGH", 1), ("HIGH", 2), ("HIGH", 3), ("HIGH", 4)])
+        stats = myMsbClient.getEventCacheStats()
+        self.assertEqual((stats["expirations"], stats["evictions"]), (1, 3))